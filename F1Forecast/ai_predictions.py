@@ -1,37 +1,98 @@
 import os
 import json
+import asyncio
+import hashlib
 import logging
-from google import genai
-from google.genai import types
-import requests
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import http_client
+import metrics
+from json_stream import ArrayItemParser
+from prompt_context import (
+    PROMPT_TOKEN_BUDGET, PromptBudgetExceeded, compact_race_context, count_tokens, estimate_tokens,
+)
+
+GEMINI_MODEL = "gemini-2.5-flash"
+GROQ_MODEL = "mixtral-8x7b-32768"
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+# Overrides the Gemini API endpoint, e.g. to point at a local stand-in for benchmarks
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
+PREDICTION_TEMPERATURE = 0.7
+FALLBACK_NOTE = "Fallback predictions - AI service temporarily unavailable"
+LLM_LATENCY_METRIC = "llm_request_duration_seconds"
+PROMPT_TOKENS_METRIC = "llm_prompt_tokens"
+RESPONSE_TOKENS_METRIC = "llm_response_tokens"
+
+# How Groq insights are combined with the Gemini prediction:
+#   deferred   - Groq comments on Gemini's predictions after they arrive, in the background
+#   sync       - as deferred, but the response waits for Groq
+#   concurrent - Groq runs alongside Gemini on the race data alone, so its insights are an
+#                independent take on the race rather than commentary on the predictions
+GROQ_ENRICHMENT_MODE = os.environ.get("GROQ_ENRICHMENT_MODE", "deferred")
+# How long to wait for Groq once Gemini has answered before deferring it
+GROQ_GRACE_SECONDS = float(os.environ.get("GROQ_GRACE_SECONDS", "0"))
+MAX_CACHED_CLIENTS = 8
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_groq_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("GROQ_WORKERS", "4")),
+    thread_name_prefix='f1-groq'
+)
 
 def get_gemini_client(api_key):
-    """Initialize Gemini client with API key"""
-    return genai.Client(api_key=api_key)
+    """Return a long-lived Gemini client for an API key, creating it on first use"""
+    key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from google import genai
+            from google.genai import types
+            http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+            client = genai.Client(api_key=api_key, http_options=http_options)
+            _clients[key] = client
+            while len(_clients) > MAX_CACHED_CLIENTS:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(key)
+        return client
+
+def _generate_config(**options):
+    """GenerateContentConfig for a Gemini call; the SDK is imported on first use to keep worker boot fast"""
+    from google.genai import types
+    return types.GenerateContentConfig(**options)
+
+def _groq_request(prompt, api_key):
+    """Headers and JSON body of a Groq chat completion request"""
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+    
+    data = {
+        'model': GROQ_MODEL,
+        'messages': [
+            {'role': 'user', 'content': prompt}
+        ],
+        'temperature': 0.7,
+        'max_tokens': 1000
+    }
+    return headers, data
 
 def get_groq_response(prompt, api_key):
     """Get response from Groq API"""
     try:
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            'model': 'mixtral-8x7b-32768',
-            'messages': [
-                {'role': 'user', 'content': prompt}
-            ],
-            'temperature': 0.7,
-            'max_tokens': 1000
-        }
-        
-        response = requests.post(
-            'https://api.groq.com/openai/v1/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        headers, data = _groq_request(prompt, api_key)
+        
+        with metrics.timed(LLM_LATENCY_METRIC, provider='groq', operation='insights'):
+            response = http_client.groq.post(
+                GROQ_API_URL,
+                endpoint='chat_completions',
+                headers=headers,
+                json=data,
+                timeout=30
+            )
         
         if response.status_code == 200:
             return response.json()['choices'][0]['message']['content']
@@ -43,48 +104,143 @@ def get_groq_response(prompt, api_key):
         logging.error(f"Error calling Groq API: {e}")
         return None
 
-def generate_race_predictions(race_data, gemini_api_key, groq_api_key=None):
-    """Generate AI-powered race predictions"""
+def _attach_groq_insights(predictions, groq_future, on_groq_insights):
+    """Add Groq insights if ready, otherwise hand them to the callback when they arrive.
+
+    The callback always runs once the call finishes: with None when Groq
+    failed or returned nothing, so the pending flag can be cleared.
+    """
+    try:
+        insights = groq_future.result(timeout=GROQ_GRACE_SECONDS)
+    except FutureTimeout:
+        if on_groq_insights:
+            predictions['groq_insights_pending'] = True
+
+            def deliver(future):
+                try:
+                    late_insights = future.result()
+                except Exception as e:
+                    logging.error(f"Deferred Groq insights failed: {e}")
+                    late_insights = None
+                try:
+                    on_groq_insights(late_insights or None)
+                except Exception as e:
+                    logging.error(f"Error attaching deferred Groq insights: {e}")
+
+            groq_future.add_done_callback(deliver)
+        return
+
+    if insights:
+        predictions['groq_insights'] = insights
+
+RACE_PREDICTION_PROMPT = """
+    Analyze the following Formula 1 race data and provide predictions for the upcoming race.
+    Race data is one header line then a table with one row per driver, ordered by grid:
+    drv=driver, team=constructor, grid=start position, fin=finish, status=non-finish reason,
+    form=finishes in previous rounds (latest first), pts=championship points before the race,
+    dpts=points gained in the previous round. Absent columns are unknown.
+    
+    Race Data:
+    {race_context}
+    
+    Please provide:
+    1. Top 5 predicted finishing positions with confidence scores
+    2. Key factors affecting the race outcome
+    3. Weather impact analysis
+    4. Tire strategy recommendations
+    5. Potential safety car scenarios
+    
+    Format the response as JSON with the following structure:
+    {{
+        "predictions": [
+            {{"driver": "Max Verstappen", "position": 1, "confidence": 0.85, "reasoning": "Strong qualifying pace and consistent performance"}},
+            {{"driver": "Lewis Hamilton", "position": 2, "confidence": 0.75, "reasoning": "Experienced racecraft and good tire management"}},
+            {{"driver": "Charles Leclerc", "position": 3, "confidence": 0.70, "reasoning": "Competitive car pace and strategic flexibility"}},
+            {{"driver": "George Russell", "position": 4, "confidence": 0.65, "reasoning": "Solid consistency and team support"}},
+            {{"driver": "Carlos Sainz", "position": 5, "confidence": 0.60, "reasoning": "Good race pace and strategic options"}}
+        ],
+        "key_factors": ["Track temperature", "Tire degradation", "DRS effectiveness", "Pit stop windows"],
+        "weather_impact": "Clear conditions expected, favoring aggressive strategies",
+        "tire_strategy": "Medium-Hard compound strategy recommended for optimal performance",
+        "safety_car_probability": 0.65
+    }}
+    """
+
+def build_race_prediction_prompt(race_data, token_budget=PROMPT_TOKEN_BUDGET):
+    """Build the Gemini prompt for race predictions, fitting the race context into token_budget"""
+    template = RACE_PREDICTION_PROMPT
+    context_budget = token_budget - estimate_tokens(template.format(race_context=''))
+    return template.format(race_context=compact_race_context(race_data, context_budget))
+
+def record_prompt_tokens(prompt, operation, client=None, enforce_budget=False):
+    """Count a prompt's tokens before sending it and record the size.
+
+    With enforce_budget, a prompt over PROMPT_TOKEN_BUDGET raises
+    PromptBudgetExceeded instead of being sent: with GEMINI_TOKEN_COUNT=api
+    the count comes from Gemini and catches what the local estimate missed.
+    """
+    tokens = count_tokens(prompt, client, GEMINI_MODEL)
+    metrics.observe(PROMPT_TOKENS_METRIC, tokens, metrics.TOKEN_BUCKETS, provider='gemini', operation=operation)
+    if tokens > PROMPT_TOKEN_BUDGET:
+        message = f"Prompt for {operation} is {tokens} tokens, over the {PROMPT_TOKEN_BUDGET} budget"
+        if enforce_budget:
+            raise PromptBudgetExceeded(message)
+        logging.warning(message)
+    return tokens
+
+def record_response_tokens(response, operation):
+    """Record the generated token count reported in a Gemini response's usage metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    tokens = getattr(usage, 'candidates_token_count', None) if usage else None
+    if tokens:
+        metrics.observe(RESPONSE_TOKENS_METRIC, tokens, metrics.TOKEN_BUCKETS, provider='gemini', operation=operation)
+
+def _start_concurrent_groq(race_data, groq_api_key):
+    """Start Groq on the race data alongside Gemini when running in concurrent mode"""
+    if not groq_api_key or GROQ_ENRICHMENT_MODE != 'concurrent':
+        return None
+    return _groq_executor.submit(get_groq_response, _groq_race_prompt(race_data), groq_api_key)
+
+def _groq_race_prompt(race_data):
+    return f"Provide additional strategic insights for this F1 race:\n{compact_race_context(race_data)}"
+
+def _enrich_with_groq(predictions, response_text, groq_api_key, groq_future, on_groq_insights):
+    """Add Groq insights to a parsed Gemini prediction according to GROQ_ENRICHMENT_MODE"""
+    groq_prompt = f"Provide additional strategic insights for this F1 race prediction: {response_text}"
+    if GROQ_ENRICHMENT_MODE == 'sync':
+        groq_analysis = get_groq_response(groq_prompt, groq_api_key)
+        if groq_analysis:
+            predictions['groq_insights'] = groq_analysis
+        return
+    if groq_future is None:
+        groq_future = _groq_executor.submit(get_groq_response, groq_prompt, groq_api_key)
+    _attach_groq_insights(predictions, groq_future, on_groq_insights)
+
+def generate_race_predictions(race_data, gemini_api_key, groq_api_key=None, on_groq_insights=None):
+    """Generate AI-powered race predictions
+
+    Unless GROQ_ENRICHMENT_MODE is 'sync', the response time is bounded by the
+    Gemini call: Groq insights that are not ready yet are passed to
+    on_groq_insights when they complete instead of being waited for.
+    """
     try:
+        groq_future = _start_concurrent_groq(race_data, groq_api_key)
         client = get_gemini_client(gemini_api_key)
         
         # Prepare prompt with race data
-        prompt = f"""
-        Analyze the following Formula 1 race data and provide predictions for the upcoming race:
-        
-        Race Data: {json.dumps(race_data, indent=2)}
-        
-        Please provide:
-        1. Top 5 predicted finishing positions with confidence scores
-        2. Key factors affecting the race outcome
-        3. Weather impact analysis
-        4. Tire strategy recommendations
-        5. Potential safety car scenarios
-        
-        Format the response as JSON with the following structure:
-        {{
-            "predictions": [
-                {{"driver": "Max Verstappen", "position": 1, "confidence": 0.85, "reasoning": "Strong qualifying pace and consistent performance"}},
-                {{"driver": "Lewis Hamilton", "position": 2, "confidence": 0.75, "reasoning": "Experienced racecraft and good tire management"}},
-                {{"driver": "Charles Leclerc", "position": 3, "confidence": 0.70, "reasoning": "Competitive car pace and strategic flexibility"}},
-                {{"driver": "George Russell", "position": 4, "confidence": 0.65, "reasoning": "Solid consistency and team support"}},
-                {{"driver": "Carlos Sainz", "position": 5, "confidence": 0.60, "reasoning": "Good race pace and strategic options"}}
-            ],
-            "key_factors": ["Track temperature", "Tire degradation", "DRS effectiveness", "Pit stop windows"],
-            "weather_impact": "Clear conditions expected, favoring aggressive strategies",
-            "tire_strategy": "Medium-Hard compound strategy recommended for optimal performance",
-            "safety_car_probability": 0.65
-        }}
-        """
+        prompt = build_race_prediction_prompt(race_data)
+        record_prompt_tokens(prompt, 'predictions', client, enforce_budget=True)
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0.7
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='predictions'):
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json",
+                    temperature=PREDICTION_TEMPERATURE
+                )
             )
-        )
+        record_response_tokens(response, 'predictions')
         
         if response.text:
             try:
@@ -92,10 +248,7 @@ def generate_race_predictions(race_data, gemini_api_key, groq_api_key=None):
                 
                 # Enhance with Groq analysis if available
                 if groq_api_key:
-                    groq_prompt = f"Provide additional strategic insights for this F1 race prediction: {response.text}"
-                    groq_analysis = get_groq_response(groq_prompt, groq_api_key)
-                    if groq_analysis:
-                        predictions['groq_insights'] = groq_analysis
+                    _enrich_with_groq(predictions, response.text, groq_api_key, groq_future, on_groq_insights)
                 
                 return predictions
             except json.JSONDecodeError as e:
@@ -109,6 +262,46 @@ def generate_race_predictions(race_data, gemini_api_key, groq_api_key=None):
         logging.error(f"Error generating predictions: {e}")
         return get_fallback_predictions()
 
+def stream_race_predictions(race_data, gemini_api_key, groq_api_key=None, on_groq_insights=None):
+    """Stream race predictions from Gemini as they are generated
+
+    Yields ('prediction', entry) for each predictions[] entry as soon as it is
+    complete, then ('complete', predictions) with the full payload (or the
+    fallback predictions if generation fails).
+    """
+    parser = ArrayItemParser('predictions')
+    
+    try:
+        groq_future = _start_concurrent_groq(race_data, groq_api_key)
+        client = get_gemini_client(gemini_api_key)
+        prompt = build_race_prediction_prompt(race_data)
+        record_prompt_tokens(prompt, 'predictions_stream', client, enforce_budget=True)
+        
+        chunk = None
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='predictions_stream'):
+            for chunk in client.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json",
+                    temperature=PREDICTION_TEMPERATURE
+                )
+            ):
+                if chunk.text:
+                    for entry in parser.feed(chunk.text):
+                        yield 'prediction', entry
+        # The final chunk carries the usage totals for the whole response
+        record_response_tokens(chunk, 'predictions_stream')
+        
+        predictions = json.loads(parser.text)
+        if groq_api_key:
+            _enrich_with_groq(predictions, parser.text, groq_api_key, groq_future, on_groq_insights)
+        yield 'complete', predictions
+        
+    except Exception as e:
+        logging.error(f"Error streaming predictions: {e}")
+        yield 'complete', get_fallback_predictions()
+
 def get_fallback_predictions():
     """Return fallback predictions when AI fails"""
     return {
@@ -123,42 +316,53 @@ def get_fallback_predictions():
         "weather_impact": "Clear conditions expected, favoring optimal race strategies",
         "tire_strategy": "Medium-Hard compound strategy recommended for race distance",
         "safety_car_probability": 0.6,
-        "note": "Fallback predictions - AI service temporarily unavailable"
+        "note": FALLBACK_NOTE
     }
 
+def is_fallback_prediction(predictions):
+    """Check whether a prediction payload came from get_fallback_predictions"""
+    return predictions.get('note') == FALLBACK_NOTE
+
+def build_driver_analysis_prompt(driver_name):
+    """Build the Gemini prompt for a driver performance analysis"""
+    return f"""
+    Analyze the performance of Formula 1 driver {driver_name} based on:
+    1. Recent race results and qualifying performances
+    2. Historical data and career statistics
+    3. Current season performance trends
+    4. Strengths and weaknesses
+    5. Comparison with teammates and competitors
+    
+    Provide a comprehensive analysis in JSON format:
+    {{
+        "driver_name": "{driver_name}",
+        "overall_rating": 8.5,
+        "strengths": ["strength1", "strength2"],
+        "weaknesses": ["weakness1", "weakness2"],
+        "recent_form": "analysis",
+        "career_highlights": ["highlight1", "highlight2"],
+        "comparison_to_peers": "analysis",
+        "season_prediction": "prediction"
+    }}
+    """
+
 def analyze_driver_performance(driver_name, gemini_api_key):
     """Analyze individual driver performance using AI"""
     try:
         client = get_gemini_client(gemini_api_key)
         
-        prompt = f"""
-        Analyze the performance of Formula 1 driver {driver_name} based on:
-        1. Recent race results and qualifying performances
-        2. Historical data and career statistics
-        3. Current season performance trends
-        4. Strengths and weaknesses
-        5. Comparison with teammates and competitors
-        
-        Provide a comprehensive analysis in JSON format:
-        {{
-            "driver_name": "{driver_name}",
-            "overall_rating": 8.5,
-            "strengths": ["strength1", "strength2"],
-            "weaknesses": ["weakness1", "weakness2"],
-            "recent_form": "analysis",
-            "career_highlights": ["highlight1", "highlight2"],
-            "comparison_to_peers": "analysis",
-            "season_prediction": "prediction"
-        }}
-        """
+        prompt = build_driver_analysis_prompt(driver_name)
+        record_prompt_tokens(prompt, 'driver_analysis', client)
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='driver_analysis'):
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json"
+                )
             )
-        )
+        record_response_tokens(response, 'driver_analysis')
         
         if response.text:
             return json.loads(response.text)
@@ -169,13 +373,48 @@ def analyze_driver_performance(driver_name, gemini_api_key):
         logging.error(f"Error analyzing driver performance: {e}")
         return {'error': f'Driver analysis failed: {str(e)}'}
 
+def stream_driver_analysis(driver_name, gemini_api_key):
+    """Stream a driver analysis from Gemini
+
+    Yields ('chunk', text) for each piece of generated text, then
+    ('complete', analysis) with the parsed JSON or an error dict.
+    """
+    try:
+        client = get_gemini_client(gemini_api_key)
+        text = ''
+        prompt = build_driver_analysis_prompt(driver_name)
+        record_prompt_tokens(prompt, 'driver_analysis_stream', client)
+        
+        chunk = None
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='driver_analysis_stream'):
+            for chunk in client.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json"
+                )
+            ):
+                if chunk.text:
+                    text += chunk.text
+                    yield 'chunk', chunk.text
+        record_response_tokens(chunk, 'driver_analysis_stream')
+        
+        if text:
+            yield 'complete', json.loads(text)
+        else:
+            yield 'complete', {'error': 'No analysis generated'}
+            
+    except Exception as e:
+        logging.error(f"Error streaming driver analysis: {e}")
+        yield 'complete', {'error': f'Driver analysis failed: {str(e)}'}
+
 def generate_strategy_recommendations(race_conditions, gemini_api_key):
     """Generate race strategy recommendations"""
     try:
         client = get_gemini_client(gemini_api_key)
         
         prompt = f"""
-        Based on these race conditions: {json.dumps(race_conditions, indent=2)}
+        Based on these race conditions: {json.dumps(race_conditions, separators=(',', ':'))}
         
         Generate optimal race strategy recommendations including:
         1. Pit stop timing and tire choices
@@ -186,14 +425,17 @@ def generate_strategy_recommendations(race_conditions, gemini_api_key):
         
         Format as JSON with detailed recommendations.
         """
+        record_prompt_tokens(prompt, 'strategy', client)
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='strategy'):
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json"
+                )
             )
-        )
+        record_response_tokens(response, 'strategy')
         
         if response.text:
             return json.loads(response.text)
@@ -203,3 +445,143 @@ def generate_strategy_recommendations(race_conditions, gemini_api_key):
     except Exception as e:
         logging.error(f"Error generating strategy: {e}")
         return {'error': f'Strategy generation failed: {str(e)}'}
+
+# Coroutine variants used by the ASGI serving mode (asgi.py). They share the
+# prompts, parsing and fallbacks above but await Gemini through client.aio and
+# Groq through the async HTTP client; blocking database work runs in threads.
+
+_background_tasks = set()
+
+def _run_in_background(coroutine):
+    # Keep a reference so the task is not garbage collected before it finishes
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def get_groq_response_async(prompt, api_key):
+    """Coroutine variant of get_groq_response"""
+    try:
+        headers, data = _groq_request(prompt, api_key)
+        
+        with metrics.timed(LLM_LATENCY_METRIC, provider='groq', operation='insights'):
+            response = await http_client.async_groq.post(
+                GROQ_API_URL,
+                endpoint='chat_completions',
+                headers=headers,
+                json=data,
+                timeout=30
+            )
+        
+        if response.status_code == 200:
+            return response.json()['choices'][0]['message']['content']
+        logging.error(f"Groq API error: {response.status_code}")
+        return None
+        
+    except Exception as e:
+        logging.error(f"Error calling Groq API: {e}")
+        return None
+
+async def _enrich_with_groq_async(predictions, response_text, groq_api_key, groq_task, on_groq_insights):
+    """Coroutine variant of _enrich_with_groq; on_groq_insights is awaited when given"""
+    groq_prompt = f"Provide additional strategic insights for this F1 race prediction: {response_text}"
+    if GROQ_ENRICHMENT_MODE == 'sync':
+        groq_analysis = await get_groq_response_async(groq_prompt, groq_api_key)
+        if groq_analysis:
+            predictions['groq_insights'] = groq_analysis
+        return
+    if groq_task is None:
+        groq_task = _run_in_background(get_groq_response_async(groq_prompt, groq_api_key))
+    
+    try:
+        insights = await asyncio.wait_for(asyncio.shield(groq_task), GROQ_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        if on_groq_insights:
+            predictions['groq_insights_pending'] = True
+            
+            async def deliver():
+                try:
+                    late_insights = await groq_task
+                except Exception as e:
+                    logging.error(f"Deferred Groq insights failed: {e}")
+                    late_insights = None
+                try:
+                    # None clears the pending flag when Groq failed or returned nothing
+                    await on_groq_insights(late_insights or None)
+                except Exception as e:
+                    logging.error(f"Error attaching deferred Groq insights: {e}")
+            
+            _run_in_background(deliver())
+        return
+    
+    if insights:
+        predictions['groq_insights'] = insights
+
+def _prediction_prompt(race_data, client):
+    prompt = build_race_prediction_prompt(race_data)
+    record_prompt_tokens(prompt, 'predictions', client, enforce_budget=True)
+    return prompt
+
+async def generate_race_predictions_async(race_data, gemini_api_key, groq_api_key=None, on_groq_insights=None):
+    """Coroutine variant of generate_race_predictions"""
+    try:
+        groq_task = None
+        if groq_api_key and GROQ_ENRICHMENT_MODE == 'concurrent':
+            groq_task = _run_in_background(get_groq_response_async(_groq_race_prompt(race_data), groq_api_key))
+        
+        client = get_gemini_client(gemini_api_key)
+        # Prompt building reads recent form from the database
+        prompt = await asyncio.to_thread(_prediction_prompt, race_data, client)
+        
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='predictions'):
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json",
+                    temperature=PREDICTION_TEMPERATURE
+                )
+            )
+        record_response_tokens(response, 'predictions')
+        
+        if not response.text:
+            return get_fallback_predictions()
+        try:
+            predictions = json.loads(response.text)
+        except json.JSONDecodeError as e:
+            logging.error(f"Error parsing Gemini response: {e}")
+            return get_fallback_predictions()
+        
+        if groq_api_key:
+            await _enrich_with_groq_async(predictions, response.text, groq_api_key, groq_task, on_groq_insights)
+        return predictions
+        
+    except Exception as e:
+        logging.error(f"Error generating predictions: {e}")
+        return get_fallback_predictions()
+
+async def analyze_driver_performance_async(driver_name, gemini_api_key):
+    """Coroutine variant of analyze_driver_performance"""
+    try:
+        client = get_gemini_client(gemini_api_key)
+        
+        prompt = build_driver_analysis_prompt(driver_name)
+        record_prompt_tokens(prompt, 'driver_analysis')
+        
+        with metrics.timed(LLM_LATENCY_METRIC, provider='gemini', operation='driver_analysis'):
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_generate_config(
+                    response_mime_type="application/json"
+                )
+            )
+        record_response_tokens(response, 'driver_analysis')
+        
+        if response.text:
+            return json.loads(response.text)
+        return {'error': 'No analysis generated'}
+        
+    except Exception as e:
+        logging.error(f"Error analyzing driver performance: {e}")
+        return {'error': f'Driver analysis failed: {str(e)}'}
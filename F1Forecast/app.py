@@ -5,33 +5,58 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# X-Forwarded-* headers trusted from the reverse proxy; also applied by asgi.py
+PROXY_FIX = {'x_proto': 1, 'x_host': 1}
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-f1-analytics")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///f1_analytics.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+def create_app():
+    """Build the Flask app.
 
-# Initialize the app with the extension
-db.init_app(app)
+    Only configures it, registers routes and maps the offline Ergast snapshot
+    if F1_SNAPSHOT_PATH is set: nothing touches the database, and the Gemini
+    SDK and analytics libraries are imported on first use. Create or update
+    the schema with `flask --app main init-db`.
+    """
+    logging.basicConfig(level=LOG_LEVEL)
 
-with app.app_context():
-    # Import models to ensure tables are created
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-f1-analytics")
+    app.wsgi_app = ProxyFix(app.wsgi_app, **PROXY_FIX)
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///f1_analytics.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    db.init_app(app)
+
+    # Register routes and CLI commands
+    import routes
+    import cli
+    app.register_blueprint(routes.bp)
+    cli.register_commands(app)
+
+    # Per-route, database and cache instrumentation for /metrics
+    import instrumentation
+    instrumentation.init_app(app)
+
+    import snapshot
+    snapshot.load_configured_snapshot()
+    return app
+
+
+def init_db():
+    """Create any missing tables and indexes; run inside an app context"""
     import models
     db.create_all()
-
-# Import and register routes
-from routes import *
+    # create_all only builds indexes along with new tables; add ones declared since
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
@@ -0,0 +1,220 @@
+"""ASGI entry point: `uvicorn asgi:application`.
+
+The upstream-bound routes below run as coroutines on the async HTTP and
+Gemini clients, so one worker can hold many Ergast, Gemini and Groq calls in
+flight. Every other route is served by the regular Flask app through a
+WSGI adapter. Requires the optional 'asgi' extra (asgiref, httpx, uvicorn).
+
+The views share their request handling with routes.py and only swap the
+blocking upstream call for its coroutine. Requests they serve get the same
+X-Forwarded-* handling (ProxyFix) as the WSGI app.
+"""
+import io
+import re
+import sys
+import asyncio
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app import create_app, PROXY_FIX
+from f1_data import (
+    get_current_season_data_async, get_driver_standings_async, get_constructor_standings_async,
+    get_race_results_async,
+)
+from ai_predictions import analyze_driver_performance_async
+from prediction_cache import get_or_generate_predictions_async
+from routes import race_data_not_modified, race_data_response, predictions_before_llm, llm_predictions_response
+from page_cache import render_analytics
+from settings_cache import get_api_settings
+import http_client
+
+app = create_app()
+wsgi_application = WsgiToAsgi(app)
+
+
+def _api_keys():
+    settings = get_api_settings()
+    if not settings or not settings.gemini_api_key:
+        return None, None
+    return settings.gemini_api_key, settings.groq_api_key
+
+
+async def analytics():
+    try:
+        # Fetch season schedule and standings concurrently
+        current_data, driver_standings, constructor_standings = await asyncio.gather(
+            get_current_season_data_async(),
+            get_driver_standings_async(),
+            get_constructor_standings_async(),
+        )
+
+        return render_analytics(current_data, driver_standings, constructor_standings)
+    except Exception as e:
+        logging.error(f"Error loading analytics: {e}")
+        return render_analytics(None, None, None, error="Failed to load F1 data")
+
+
+async def get_race_data(season, round_num):
+    try:
+        season, round_num = int(season), int(round_num)
+        not_modified, results_hash = await asyncio.to_thread(race_data_not_modified, season, round_num)
+        if not_modified is not None:
+            return not_modified
+        return race_data_response(await get_race_results_async(season, round_num), results_hash)
+    except Exception as e:
+        logging.error(f"Error fetching race data: {e}")
+        return jsonify({'error': 'Failed to fetch race data'}), 500
+
+
+async def get_predictions(race_id):
+    try:
+        # Tier checks, the local model and the auto-tier upgrade job read the database
+        response, pending = await asyncio.to_thread(predictions_before_llm, int(race_id))
+        if response is not None:
+            return response
+        stored_race_id, race_data, settings = pending
+
+        predictions, cache_status = await get_or_generate_predictions_async(
+            race_id=stored_race_id,
+            race_data=race_data,
+            gemini_api_key=settings.gemini_api_key,
+            groq_api_key=settings.groq_api_key
+        )
+        return llm_predictions_response(predictions, cache_status)
+
+    except Exception as e:
+        logging.error(f"Error generating predictions: {e}")
+        return jsonify({'error': f'Failed to generate predictions: {str(e)}'}), 500
+
+
+async def driver_analysis(driver_name):
+    try:
+        gemini_api_key, _ = await asyncio.to_thread(_api_keys)
+        if not gemini_api_key:
+            return jsonify({'error': 'API keys not configured'}), 400
+
+        analysis = await analyze_driver_performance_async(
+            driver_name=driver_name,
+            gemini_api_key=gemini_api_key
+        )
+
+        return jsonify(analysis)
+
+    except Exception as e:
+        logging.error(f"Error analyzing driver: {e}")
+        return jsonify({'error': 'Failed to analyze driver performance'}), 500
+
+
+ASYNC_ROUTES = [
+    (re.compile(r'^/analytics$'), analytics),
+    (re.compile(r'^/api/race-data/(?P<season>\d+)/(?P<round_num>\d+)$'), get_race_data),
+    (re.compile(r'^/api/predictions/(?P<race_id>\d+)$'), get_predictions),
+    (re.compile(r'^/api/driver-analysis/(?P<driver_name>[^/]+)$'), driver_analysis),
+]
+
+
+def _match(scope):
+    if scope['method'] not in ('GET', 'HEAD'):
+        return None, None
+    for pattern, view in ASYNC_ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+            return view, match.groupdict()
+    return None, None
+
+
+def _environ(scope, body):
+    """Build the WSGI environ Flask needs for a request context from an ASGI scope"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _ignore_response(environ, start_response):
+    return []
+
+
+# The WSGI app's ProxyFix never sees requests served here, so rewrite their environ the same way
+_proxy_fix = ProxyFix(_ignore_response, **PROXY_FIX)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _dispatch(view, params, scope, receive, send):
+    environ = _environ(scope, await _read_body(receive))
+    _proxy_fix(environ, None)
+    with app.request_context(environ):
+        try:
+            # Runs before_request hooks (request timing, profiling) as Flask's own dispatch does
+            response = app.preprocess_request()
+            if response is None:
+                response = await view(**params)
+            response = app.process_response(app.make_response(response))
+        except Exception as e:
+            logging.error(f"Unhandled error in async view {view.__name__}: {e}")
+            response = app.make_response((jsonify({'error': 'Internal server error'}), 500))
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                    for key, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await http_client.close_async_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'http':
+        view, params = _match(scope)
+        if view is not None:
+            return await _dispatch(view, params, scope, receive, send)
+    return await wsgi_application(scope, receive, send)
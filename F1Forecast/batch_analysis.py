@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy.orm import Session
+
+from app import db
+from models import DriverAnalysis, F1Data
+from ai_predictions import analyze_driver_performance, GEMINI_MODEL
+import metrics
+
+# Concurrent LLM calls per worker process for batch analysis
+BATCH_ANALYSIS_WORKERS = int(os.environ.get("BATCH_ANALYSIS_WORKERS", "4"))
+MAX_BATCH_DRIVERS = int(os.environ.get("MAX_BATCH_DRIVERS", "30"))
+# Requests per second and burst size allowed per LLM provider
+PROVIDER_RATE_LIMITS = {
+    'gemini': (float(os.environ.get("GEMINI_RATE_LIMIT", "2")), int(os.environ.get("GEMINI_RATE_BURST", "4"))),
+}
+RATE_LIMIT_WAIT_METRIC = "llm_rate_limit_wait_seconds"
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_ANALYSIS_WORKERS, thread_name_prefix='f1-batch')
+
+
+class RateLimiter:
+    """Token bucket shared by every thread calling one provider"""
+
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self._rate
+            time.sleep(delay)
+            waited += delay
+
+
+_limiters = {provider: RateLimiter(rate, burst) for provider, (rate, burst) in PROVIDER_RATE_LIMITS.items()}
+
+
+def analysis_data_version():
+    """Version of the data a driver analysis depends on: the model and the latest ingested round"""
+    latest = (F1Data.query
+              .filter(F1Data.results_hash.isnot(None))
+              .order_by(F1Data.season.desc(), F1Data.round_number.desc())
+              .first())
+    if latest is None:
+        return GEMINI_MODEL
+    return f"{GEMINI_MODEL}:{latest.season}-{latest.round_number}:{latest.results_hash[:12]}"
+
+
+def analysis_key(driver_name, data_version):
+    blob = json.dumps({'driver': driver_name.strip().lower(), 'version': data_version}, sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def normalize_drivers(drivers):
+    """Deduplicate a requested driver list, keeping order; raises ValueError if invalid"""
+    if not isinstance(drivers, list) or not drivers:
+        raise ValueError('drivers must be a non-empty list of names')
+    names = []
+    for driver in drivers:
+        if not isinstance(driver, str) or not driver.strip():
+            raise ValueError('driver names must be non-empty strings')
+        if driver.strip() not in names:
+            names.append(driver.strip())
+    if len(names) > MAX_BATCH_DRIVERS:
+        raise ValueError(f'at most {MAX_BATCH_DRIVERS} drivers per batch')
+    return names
+
+
+def _cached_analyses(keys):
+    rows = DriverAnalysis.query.filter(DriverAnalysis.cache_key.in_(list(keys))).all()
+    return {row.cache_key: json.loads(row.analysis) for row in rows}
+
+
+def _store_analysis(engine, key, driver_name, data_version, analysis):
+    try:
+        with Session(engine) as session:
+            if session.query(DriverAnalysis).filter_by(cache_key=key).first() is None:
+                session.add(DriverAnalysis(cache_key=key, driver_name=driver_name,
+                                           data_version=data_version, analysis=json.dumps(analysis)))
+                session.commit()
+    except Exception as e:
+        logging.error(f"Error storing analysis for {driver_name}: {e}")
+
+
+def _analyze(engine, key, driver_name, data_version, gemini_api_key):
+    waited = _limiters['gemini'].acquire()
+    metrics.observe(RATE_LIMIT_WAIT_METRIC, waited, provider='gemini')
+    analysis = analyze_driver_performance(driver_name=driver_name, gemini_api_key=gemini_api_key)
+    # Failed analyses are returned but not cached, so the next batch retries them
+    if 'error' not in analysis:
+        _store_analysis(engine, key, driver_name, data_version, analysis)
+    return analysis
+
+
+def iter_batch_analyses(drivers, gemini_api_key):
+    """Yield (driver_name, analysis, status) as each analysis of a batch becomes available.
+
+    Cached analyses for the current data version are yielded first with
+    status 'hit'; the rest run on a bounded pool behind the provider rate
+    limiter and are yielded as they finish with status 'miss'.
+    """
+    data_version = analysis_data_version()
+    keys = {driver: analysis_key(driver, data_version) for driver in drivers}
+    cached = _cached_analyses(keys.values())
+    engine = db.engine
+
+    misses = []
+    metrics.inc(metrics.CACHE_LOOKUPS_METRIC, len(cached), cache='driver_analysis', result='hit')
+    metrics.inc(metrics.CACHE_LOOKUPS_METRIC, len(drivers) - len(cached), cache='driver_analysis', result='miss')
+    for driver in drivers:
+        if keys[driver] in cached:
+            yield driver, cached[keys[driver]], 'hit'
+        else:
+            misses.append(driver)
+
+    futures = {
+        _executor.submit(_analyze, engine, keys[driver], driver, data_version, gemini_api_key): driver
+        for driver in misses
+    }
+    for future in as_completed(futures):
+        driver = futures[future]
+        try:
+            yield driver, future.result(), 'miss'
+        except Exception as e:
+            logging.error(f"Error analyzing driver {driver}: {e}")
+            yield driver, {'error': f'Driver analysis failed: {str(e)}'}, 'miss'
+
+
+def batch_analyses(drivers, gemini_api_key):
+    """Return {'analyses': {driver: analysis}, 'cache': {'hit': n, 'miss': n}} for a batch"""
+    analyses = {}
+    counts = {'hit': 0, 'miss': 0}
+    for driver, analysis, status in iter_batch_analyses(drivers, gemini_api_key):
+        analyses[driver] = analysis
+        counts[status] += 1
+    # Keep the requested order regardless of completion order
+    return {'analyses': {driver: analyses[driver] for driver in drivers}, 'cache': counts}
@@ -0,0 +1,138 @@
+"""Compare the sync (gunicorn) and async (uvicorn) serving modes under load.
+
+A stub Ergast server answers every request after a fixed delay, standing in
+for upstream latency. Each mode is started against it with a fresh database
+and hit with concurrent /api/race-data requests for distinct past rounds, so
+every request is a cache miss that waits on the upstream.
+
+    python benchmarks/asgi_vs_wsgi.py --concurrency 200 --requests 2000
+
+Requires gunicorn and the 'asgi' extra (uvicorn, asgiref, httpx).
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from stubs import StubErgast, free_port
+from load_mix import fetch, init_schema, percentile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(mode, port, workers, env):
+    init_schema(env)
+    if mode == 'wsgi':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--timeout', '120',
+                   '--bind', f'127.0.0.1:{port}', 'main:app']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--log-level', 'warning',
+                   '--host', '127.0.0.1', '--port', str(port), 'asgi:application']
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start on port {port}')
+
+
+async def run_load(port, paths, concurrency, timeout):
+    latencies, errors = [], 0
+    queue = list(paths)
+    started = time.perf_counter()
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, path, timeout)
+                if status != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def benchmark(mode, args, stub):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   ERGAST_BASE_URL=stub.base_url,
+                   ERGAST_RETRIES='0',
+                   SESSION_SECRET='benchmark')
+        process = start_server(mode, port, args.workers, env)
+        try:
+            # Distinct past rounds, so every request misses the cache and waits on the upstream
+            last_season = datetime.now().year - 1
+            rounds = [(season, round_number) for season in range(1950, last_season + 1) for round_number in range(1, 25)]
+            random.Random(mode).shuffle(rounds)
+            paths = [f'/api/race-data/{season}/{round_number}' for season, round_number in rounds[:args.requests]]
+
+            stub.reset()
+            latencies, errors, elapsed = asyncio.run(run_load(port, paths, args.concurrency, args.timeout))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    return {
+        'mode': mode,
+        'workers': args.workers,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'upstream_requests': stub.requests,
+        'peak_upstream_in_flight': stub.peak_in_flight,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--upstream-latency', type=float, default=0.25, help='stub Ergast delay in seconds')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    stub = StubErgast(latency=args.upstream_latency).start()
+
+    results = [benchmark(mode, args, stub) for mode in args.modes.split(',')]
+    stub.shutdown()
+
+    print(f"{'mode':<6}{'workers':>8}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}"
+          f"{'p95 ms':>9}{'p99 ms':>9}{'peak upstream':>15}")
+    for result in results:
+        print(f"{result['mode']:<6}{result['workers']:>8}{result['requests']:>7}{result['errors']:>8}"
+              f"{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}"
+              f"{result['p99_ms']:>9.0f}{result['peak_upstream_in_flight']:>15}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Measure application cold start: import, first request and worker memory.
+
+Every run is a fresh interpreter, as when gunicorn spawns or replaces a
+worker. It reports the time to import `main` (building the app), the time
+to serve the first request, the total process wall time, peak RSS and
+which heavy libraries were imported along the way.
+
+    python benchmarks/cold_start.py                      # this tree
+    python benchmarks/cold_start.py --ref HEAD~1         # also an earlier commit
+    python benchmarks/cold_start.py --server gunicorn    # spawn-to-first-response of a server
+
+With --ref the older tree is exported with `git archive` into a temporary
+directory and measured the same way, so the two can be compared.
+"""
+import os
+import sys
+import json
+import time
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+from stubs import free_port
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('google.genai', 'pandas', 'numpy', 'requests', 'sqlalchemy')
+FIELDS = ('import_ms', 'first_request_ms', 'wall_ms', 'ready_ms', 'max_rss_mb')
+
+PROBE = '''
+import sys, json, time, resource
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+status = main.app.test_client().get(sys.argv[1]).status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': status,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': [name for name in sys.argv[2].split(',') if name in sys.modules],
+}))
+'''
+
+
+def export_tree(ref, destination):
+    """Extract the app directory as of a git ref; returns its path"""
+    root = _git_root()
+    prefix = os.path.relpath(APP_DIR, root)
+    archive = subprocess.run(['git', 'archive', '--format=tar', ref, prefix], cwd=root,
+                             check=True, capture_output=True).stdout
+    archive_path = os.path.join(destination, 'tree.tar')
+    with open(archive_path, 'wb') as f:
+        f.write(archive)
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(destination)
+    return os.path.join(destination, prefix)
+
+
+def _git_root():
+    return subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=APP_DIR,
+                          check=True, capture_output=True, text=True).stdout.strip()
+
+
+def probe(app_dir, path, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', PROBE, path, ','.join(HEAVY_MODULES)],
+                            cwd=app_dir, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'probe failed in {app_dir}:\n{result.stderr[-2000:]}')
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), wall_ms=wall_ms)
+
+
+def time_to_ready(app_dir, server, path, env):
+    """Milliseconds from spawning a server until it answers `path`"""
+    port = free_port()
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', '1', '--bind', f'127.0.0.1:{port}', 'main:app']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'main', 'run', '--host', '127.0.0.1', '--port', str(port)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 60:
+            if process.poll() is not None:
+                raise RuntimeError(f'{server} exited with status {process.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=2):
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'{server} did not answer within 60s')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(label, runs):
+    print(f'\n{label}')
+    for field in FIELDS:
+        values = [run[field] for run in runs if field in run]
+        if values:
+            print(f'  {field:<18} median {statistics.median(values):8.1f}   min {min(values):8.1f}   '
+                  f'max {max(values):8.1f}')
+    modules = runs[0].get('modules')
+    if modules is not None:
+        print(f"  {'heavy imports':<18} {', '.join(modules) or 'none'}")
+    return {field: statistics.median([run[field] for run in runs]) for field in FIELDS if field in runs[0]}
+
+
+def measure(app_dir, args, env):
+    runs = []
+    for _ in range(args.repeat):
+        run = probe(app_dir, args.path, env) if args.server == 'none' else {
+            'ready_ms': time_to_ready(app_dir, args.server, args.path, env)}
+        runs.append(run)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--path', default='/', help='Request served after import')
+    parser.add_argument('--ref', help='Also measure this git ref for comparison')
+    parser.add_argument('--server', choices=('none', 'gunicorn', 'flask'), default='none',
+                        help='Time a spawned server until it answers instead of importing in-process')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'cold_start.db')}",
+                   LOG_LEVEL='WARNING')
+        results = {'current': summarize('current tree', measure(APP_DIR, args, env))}
+        if args.ref:
+            ref_dir = export_tree(args.ref, workdir)
+            results[args.ref] = summarize(args.ref, measure(ref_dir, args, env))
+            print()
+            for field, value in results['current'].items():
+                before = results[args.ref].get(field)
+                if before:
+                    print(f'  {field:<18} {before:8.1f} -> {value:8.1f}  ({(value - before) / before * 100:+.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""Drive realistic request mixes against the app with local upstream stand-ins.
+
+Each scenario simulates browser tabs that poll endpoints on fixed intervals
+(for example telemetry every 2 s and predictions every 30 s). The app runs
+in a subprocess pointed at stub Ergast, Gemini and Groq servers, so results
+do not depend on the network or API quotas.
+
+    python benchmarks/load_mix.py                       # every scenario
+    python benchmarks/load_mix.py --scenario dashboard --tabs 100 --duration 60
+    python benchmarks/load_mix.py --compare benchmarks/results/<earlier>.json
+
+Per scenario it reports throughput, latency percentiles per endpoint,
+upstream calls per stub and server memory, and writes everything to
+benchmarks/results/ so runs can be compared.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from stubs import StubErgast, StubLLM, free_port
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(APP_DIR, 'benchmarks', 'results')
+FIXTURES_DIR = os.path.join(APP_DIR, 'benchmarks', 'fixtures', 'ergast')
+
+# name -> (path template, seconds between requests per tab)
+ENDPOINTS = {
+    'telemetry': ('/api/telemetry-data', 2.0),
+    'predictions': ('/api/predictions/{race_id}', 30.0),
+    'race_data': ('/api/race-data/{season}/{round}', 10.0),
+    'analytics': ('/analytics', 60.0),
+    'driver_analysis': ('/api/driver-analysis/{driver}', 30.0),
+    'local_predictions': ('/api/predictions/{race_id}?tier=local', 5.0),
+}
+SCENARIOS = {
+    'dashboard': ['telemetry', 'predictions'],
+    'analytics': ['analytics', 'race_data', 'telemetry'],
+    'ai_heavy': ['predictions', 'driver_analysis'],
+    'local_model': ['local_predictions', 'telemetry'],
+}
+
+
+def init_schema(env):
+    """Create the tables in the benchmark database; the app no longer does it on import"""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'init-db'], cwd=APP_DIR, env=env,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_app(server, port, workers, env):
+    init_schema(env)
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', '8',
+                   '--timeout', '120', '--bind', f'127.0.0.1:{port}', 'main:app']
+    elif server == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--log-level', 'warning',
+                   '--host', '127.0.0.1', '--port', str(port), 'asgi:application']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'main', 'run', '--with-threads',
+                   '--host', '127.0.0.1', '--port', str(port)]
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{server} exited with status {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=2):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{server} did not start on port {port}')
+
+
+def process_tree_rss(pid):
+    """Resident memory in MB of a process and its children, read from /proc (Linux only)"""
+    pids, total = [pid], 0
+    try:
+        for line in open(f'/proc/{pid}/task/{pid}/children').read().split():
+            pids.append(int(line))
+    except OSError:
+        pass
+    for child in pids:
+        try:
+            with open(f'/proc/{child}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024 if total else None
+
+
+async def fetch(port, path, timeout):
+    """Minimal HTTP/1.1 GET; returns the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: gzip\r\n'
+                     f'Connection: close\r\n\r\n'.encode('ascii'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def run_tabs(port, endpoints, args, rng):
+    """Run args.tabs simulated tabs for args.duration seconds; returns per-endpoint samples"""
+    samples = {name: {'latencies': [], 'errors': 0} for name in endpoints}
+    deadline = time.monotonic() + args.duration
+    semaphore = asyncio.Semaphore(args.max_connections)
+
+    def render(template):
+        season = rng.randint(2015, 2023)
+        return template.format(race_id=rng.randint(1, args.races), season=season,
+                               round=rng.randint(1, 20), driver=urllib.parse.quote(rng.choice(args.drivers)))
+
+    async def poll(name):
+        template, interval = ENDPOINTS[name]
+        # Tabs are opened at random moments rather than all at once
+        await asyncio.sleep(rng.uniform(0, interval))
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    status = await fetch(port, render(template), args.timeout)
+                if status >= 400:
+                    samples[name]['errors'] += 1
+            except Exception:
+                samples[name]['errors'] += 1
+            samples[name]['latencies'].append(time.perf_counter() - started)
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    await asyncio.gather(*(poll(name) for _ in range(args.tabs) for name in endpoints))
+    return samples
+
+
+def run_scenario(name, args, ergast, llm):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   ERGAST_BASE_URL=ergast.base_url,
+                   GEMINI_BASE_URL=llm.gemini_base_url,
+                   GROQ_API_URL=llm.groq_url,
+                   F1_SETTINGS_SIGNAL_PATH=os.path.join(tmp, 'settings.signal'),
+                   SESSION_SECRET='benchmark')
+        process = start_app(args.server, port, args.workers, env)
+        try:
+            # Configure API keys so AI routes reach the stub LLM
+            form = urllib.parse.urlencode({'gemini_api_key': 'benchmark-key', 'groq_api_key': 'benchmark-key'})
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/settings', data=form.encode('ascii'), timeout=30)
+            ergast.reset()
+            llm.reset()
+
+            rss_samples = []
+            started = time.perf_counter()
+
+            async def main():
+                async def sample_memory():
+                    while True:
+                        rss_samples.append(process_tree_rss(process.pid))
+                        await asyncio.sleep(1.0)
+                sampler = asyncio.ensure_future(sample_memory())
+                try:
+                    return await run_tabs(port, SCENARIOS[name], args, random.Random(f'{args.seed}-{name}'))
+                finally:
+                    sampler.cancel()
+
+            samples = asyncio.run(main())
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    all_latencies = [latency for sample in samples.values() for latency in sample['latencies']]
+    rss = [value for value in rss_samples if value is not None]
+    return {
+        'scenario': name,
+        'endpoints': {endpoint: summarize(sample['latencies'], sample['errors'], elapsed)
+                      for endpoint, sample in samples.items()},
+        'overall': summarize(all_latencies, sum(sample['errors'] for sample in samples.values()), elapsed),
+        'upstream_calls': {'ergast': ergast.snapshot(), 'llm': llm.snapshot()},
+        'memory_mb': {'peak': round(max(rss), 1), 'end': round(rss[-1], 1)} if rss else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, baseline=None):
+    previous = {result['scenario']: result for result in (baseline or {}).get('results', [])}
+    print(f"{'scenario':<14}{'endpoint':<20}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50':>8}{'p95':>8}{'p99':>8}"
+          f"{'p99 Δ':>9}")
+    for result in results:
+        before = previous.get(result['scenario'], {}).get('endpoints', {})
+        for endpoint, stats in [*result['endpoints'].items(), ('(all)', result['overall'])]:
+            reference = before.get(endpoint) if endpoint != '(all)' else previous.get(result['scenario'], {}).get('overall')
+            delta = f"{stats['p99_ms'] - reference['p99_ms']:+.0f}" if reference else ''
+            print(f"{result['scenario']:<14}{endpoint:<20}{stats['requests']:>7}{stats['errors']:>5}"
+                  f"{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>8.0f}{stats['p95_ms']:>8.0f}"
+                  f"{stats['p99_ms']:>8.0f}{delta:>9}")
+        calls = result['upstream_calls']
+        memory = result['memory_mb'] or {}
+        print(f"{'':<14}upstream ergast={calls['ergast']} llm={calls['llm']} "
+              f"memory peak={memory.get('peak')}MB end={memory.get('end')}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable); defaults to all')
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--tabs', type=int, default=50, help='simulated browser tabs')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds per scenario')
+    parser.add_argument('--max-connections', type=int, default=500)
+    parser.add_argument('--races', type=int, default=5, help='distinct race ids requested')
+    parser.add_argument('--drivers', nargs='+', default=['verstappen', 'norris', 'leclerc', 'piastri'])
+    parser.add_argument('--ergast-latency', type=float, default=0.15)
+    parser.add_argument('--llm-latency', type=float, default=2.0)
+    parser.add_argument('--jitter', type=float, default=0.1, help='extra uniform delay in seconds on every stub')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='recorded Ergast JSON to replay')
+    parser.add_argument('--record-from', help='record missing fixtures from this Ergast base URL')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier result file to show p99 deltas against')
+    args = parser.parse_args()
+
+    ergast = StubErgast(fixtures_dir=args.fixtures, record_from=args.record_from,
+                        latency=args.ergast_latency, jitter=args.jitter, seed=args.seed).start()
+    llm = StubLLM(latency=args.llm_latency, jitter=args.jitter, seed=args.seed).start()
+    try:
+        results = [run_scenario(name, args, ergast, llm) for name in (args.scenario or sorted(SCENARIOS))]
+    finally:
+        ergast.shutdown()
+        llm.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'revision': git_revision(), 'created_at': datetime.now().isoformat(),
+                   'args': vars(args), 'results': results}, f, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""Local stand-ins for Ergast, Gemini and Groq used by the benchmarks.
+
+Each stub is a threaded HTTP server that waits `latency` seconds (plus up to
+`jitter` seconds of uniform noise) before answering, and counts the requests
+it served so a run can report how many upstream calls it caused.
+"""
+import os
+import json
+import time
+import random
+import socket
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_PREDICTIONS = {
+    'predictions': [
+        {'driver': 'Max Verstappen', 'position': 1, 'confidence': 0.85, 'reasoning': 'Benchmark stub'},
+        {'driver': 'Lando Norris', 'position': 2, 'confidence': 0.75, 'reasoning': 'Benchmark stub'},
+        {'driver': 'Charles Leclerc', 'position': 3, 'confidence': 0.7, 'reasoning': 'Benchmark stub'},
+        {'driver': 'Oscar Piastri', 'position': 4, 'confidence': 0.65, 'reasoning': 'Benchmark stub'},
+        {'driver': 'George Russell', 'position': 5, 'confidence': 0.6, 'reasoning': 'Benchmark stub'},
+    ],
+    'key_factors': ['Track temperature', 'Tire degradation'],
+    'weather_impact': 'Dry',
+    'tire_strategy': 'Medium-Hard',
+    'safety_car_probability': 0.4,
+}
+CANNED_ANALYSIS = {
+    'overall_rating': 8.5,
+    'strengths': ['Racecraft'],
+    'weaknesses': ['Qualifying'],
+    'recent_form': 'Benchmark stub',
+    'career_highlights': [],
+    'comparison_to_peers': 'Benchmark stub',
+    'season_prediction': 'Benchmark stub',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a configurable delay and per-kind request counters"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, handler, latency=0.0, jitter=0.0, port=None, seed=0):
+        super().__init__(('127.0.0.1', port or free_port()), handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def requests(self):
+        with self.lock:
+            return sum(self.counts.values())
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.peak_in_flight = 0
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts, peak_in_flight=self.peak_in_flight)
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(self.latency + extra)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle_request(self, kind, respond):
+        server = self.server
+        with server.lock:
+            server.counts[kind] = server.counts.get(kind, 0) + 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            server.delay()
+            respond()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def log_message(self, format, *args):
+        pass
+
+
+def synthetic_ergast(path):
+    """A canned Ergast response shaped after the endpoint in the request path"""
+    parts = [part for part in path.split('?')[0].strip('/').split('/') if part]
+    numbers = [part for part in parts if part.isdigit()]
+    season = numbers[0] if numbers else '2020'
+    round_number = numbers[1] if len(numbers) > 1 else '1'
+    endpoint = parts[-1].replace('.json', '') if parts else ''
+    drivers = [{'driverId': f'driver{n}', 'code': f'D{n:02d}', 'givenName': 'Driver', 'familyName': str(n)}
+               for n in range(1, 21)]
+
+    if endpoint in ('driverStandings', 'constructorStandings'):
+        key = 'DriverStandings' if endpoint == 'driverStandings' else 'ConstructorStandings'
+        entries = [{'position': str(n), 'points': str(400 - n * 15), 'wins': str(max(0, 5 - n)),
+                    'Driver': drivers[n - 1], 'Constructors': [{'constructorId': f'team{n % 10}', 'name': f'Team {n % 10}'}],
+                    'Constructor': {'constructorId': f'team{n}', 'name': f'Team {n}'}}
+                   for n in range(1, 21 if key == 'DriverStandings' else 11)]
+        return {'MRData': {'StandingsTable': {'season': season, 'StandingsLists': [
+            {'season': season, 'round': round_number, key: entries}]}}}
+
+    race = {
+        'season': season,
+        'round': round_number,
+        'raceName': f'Stub Grand Prix {round_number}',
+        'Circuit': {'circuitId': 'stub', 'circuitName': 'Stub Circuit',
+                    'Location': {'locality': 'Stub', 'country': 'Stub'}},
+        'date': f'{season}-06-01',
+    }
+    if endpoint == 'results':
+        race['Results'] = [{
+            'position': str(n), 'positionText': str(n), 'points': '0', 'grid': str(n), 'laps': '50',
+            'status': 'Finished', 'Driver': drivers[n - 1], 'Constructor': {'constructorId': f'team{n % 10}'},
+        } for n in range(1, 21)]
+        return {'MRData': {'RaceTable': {'Races': [race]}}}
+    if endpoint == 'qualifying':
+        race['QualifyingResults'] = [{'position': str(n), 'Driver': drivers[n - 1],
+                                      'Constructor': {'constructorId': f'team{n % 10}'}} for n in range(1, 21)]
+        return {'MRData': {'RaceTable': {'Races': [race]}}}
+    # Season schedule and anything else: a 24-round calendar
+    return {'MRData': {'RaceTable': {'season': season, 'Races': [
+        dict(race, round=str(n), raceName=f'Stub Grand Prix {n}', date=f'{season}-{3 + n // 3:02d}-{1 + n % 28:02d}')
+        for n in range(1, 25)]}}}
+
+
+class ErgastHandler(StubHandler):
+    """Replays recorded Ergast JSON from the fixtures directory, recording or synthesizing misses"""
+
+    def do_GET(self):
+        self.handle_request('ergast', lambda: self.send_json(self.server.payload(self.path)))
+
+
+class StubErgast(StubServer):
+    def __init__(self, fixtures_dir=None, record_from=None, **kwargs):
+        super().__init__(ErgastHandler, **kwargs)
+        self.fixtures_dir = fixtures_dir
+        self.record_from = record_from.rstrip('/') if record_from else None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}/api/f1'
+
+    def _fixture_path(self, path):
+        name = path.split('?')[0].replace('/api/f1/', '', 1).strip('/').replace('/', '_') or 'index.json'
+        return os.path.join(self.fixtures_dir, name)
+
+    def payload(self, path):
+        if not self.fixtures_dir:
+            return synthetic_ergast(path)
+        fixture = self._fixture_path(path)
+        if os.path.exists(fixture):
+            with open(fixture) as f:
+                return json.load(f)
+        if self.record_from:
+            upstream = self.record_from + path.replace('/api/f1', '', 1)
+            with urllib.request.urlopen(upstream, timeout=30) as response:
+                payload = json.load(response)
+            os.makedirs(self.fixtures_dir, exist_ok=True)
+            with open(fixture, 'w') as f:
+                json.dump(payload, f)
+            return payload
+        return synthetic_ergast(path)
+
+
+class LLMHandler(StubHandler):
+    """Answers Gemini generateContent/streamGenerateContent and Groq chat completions"""
+
+    def do_POST(self):
+        body = self.read_body()
+        if '/chat/completions' in self.path:
+            self.handle_request('groq', self._groq)
+        elif ':streamGenerateContent' in self.path:
+            self.handle_request('gemini_stream', lambda: self._gemini_stream(body))
+        elif ':countTokens' in self.path:
+            self.send_json({'totalTokens': len(body) // 4})
+        else:
+            self.handle_request('gemini', lambda: self._gemini(body))
+
+    def _gemini_text(self, body):
+        prompt = body.decode('utf-8', 'replace')
+        return json.dumps(CANNED_ANALYSIS if 'Analyze the performance' in prompt else CANNED_PREDICTIONS)
+
+    def _gemini_response(self, text):
+        return {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': 500, 'candidatesTokenCount': len(text) // 4},
+        }
+
+    def _gemini(self, body):
+        self.send_json(self._gemini_response(self._gemini_text(body)))
+
+    def _gemini_stream(self, body):
+        text = self._gemini_text(body)
+        chunks = [text[i:i + 200] for i in range(0, len(text), 200)]
+        events = ''.join(f"data: {json.dumps(self._gemini_response(chunk))}\r\n\r\n" for chunk in chunks)
+        encoded = events.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _groq(self):
+        self.send_json({'choices': [{'message': {'role': 'assistant', 'content': 'Benchmark stub insights'}}]})
+
+
+class StubLLM(StubServer):
+    def __init__(self, **kwargs):
+        super().__init__(LLMHandler, **kwargs)
+
+    @property
+    def gemini_base_url(self):
+        return f'http://127.0.0.1:{self.server_port}/'
+
+    @property
+    def groq_url(self):
+        return f'http://127.0.0.1:{self.server_port}/openai/v1/chat/completions'
@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select, func, or_
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, RaceResult, DriverCareerStats
+
+STAT_COLUMNS = ('total_races', 'wins', 'podiums', 'total_points')
+
+
+def results_frame(race_id=None):
+    """Load stored race results as a frame of driver_id, driver_name, position, points"""
+    query = (select(RaceResult.driver_id, RaceResult.driver_name, RaceResult.position, RaceResult.points)
+             .join(F1Data, RaceResult.race_id == F1Data.id))
+    if race_id is not None:
+        query = query.where(RaceResult.race_id == race_id)
+    with Session(db.engine) as session:
+        rows = session.execute(query).all()
+    return pd.DataFrame(rows, columns=['driver_id', 'driver_name', 'position', 'points'])
+
+
+def compute_career_stats(frame):
+    """Aggregate a results frame into per-driver career stats in one vectorized pass.
+
+    Expects one row per (driver, race) with numeric `position` (NaN when not
+    classified) and `points`. Returns a frame indexed by driver_id.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=['driver_name', *STAT_COLUMNS]).rename_axis('driver_id')
+
+    position = pd.to_numeric(frame['position'], errors='coerce').to_numpy(dtype=np.float64)
+    working = pd.DataFrame({
+        'driver_id': frame['driver_id'].to_numpy(),
+        'driver_name': frame['driver_name'].to_numpy() if 'driver_name' in frame else frame['driver_id'].to_numpy(),
+        'win': position == 1,
+        'podium': position <= 3,
+        'points': pd.to_numeric(frame['points'], errors='coerce').fillna(0).to_numpy(dtype=np.float64),
+    })
+    stats = working.groupby('driver_id', sort=False).agg(
+        driver_name=('driver_name', 'last'),
+        total_races=('win', 'size'),
+        wins=('win', 'sum'),
+        podiums=('podium', 'sum'),
+        total_points=('points', 'sum'),
+    )
+    return stats.astype({'total_races': np.int64, 'wins': np.int64, 'podiums': np.int64})
+
+
+def format_stats(total_races, wins, podiums, total_points):
+    """Build the public career stats dict returned by get_driver_career_stats"""
+    return {
+        'total_races': int(total_races),
+        'wins': int(wins),
+        'podiums': int(podiums),
+        'total_points': float(total_points),
+        'win_percentage': (wins / total_races * 100) if total_races > 0 else 0,
+        'podium_percentage': (podiums / total_races * 100) if total_races > 0 else 0
+    }
+
+
+def _stat_rows(stats):
+    now = datetime.utcnow()
+    return [{
+        'driver_id': driver_id,
+        'driver_name': row.driver_name,
+        'total_races': int(row.total_races),
+        'wins': int(row.wins),
+        'podiums': int(row.podiums),
+        'total_points': float(row.total_points),
+        'updated_at': now,
+    } for driver_id, row in stats.iterrows()]
+
+
+def rebuild_career_stats():
+    """Recompute the precomputed stats table for every driver from stored results"""
+    stats = compute_career_stats(results_frame())
+    with Session(db.engine) as session:
+        session.execute(delete(DriverCareerStats))
+        if not stats.empty:
+            session.execute(insert(DriverCareerStats), _stat_rows(stats))
+        session.commit()
+    return len(stats)
+
+
+def apply_round(race_id):
+    """Add one newly ingested round's results to the precomputed stats"""
+    deltas = compute_career_stats(results_frame(race_id))
+    if deltas.empty:
+        return
+    with Session(db.engine) as session:
+        existing = {row.driver_id: row for row in
+                    session.query(DriverCareerStats).filter(DriverCareerStats.driver_id.in_(deltas.index)).all()}
+        for driver_id, delta in deltas.iterrows():
+            row = existing.get(driver_id)
+            if row is None:
+                row = DriverCareerStats(driver_id=driver_id, total_races=0, wins=0, podiums=0, total_points=0)
+                session.add(row)
+            row.driver_name = delta.driver_name
+            row.total_races += int(delta.total_races)
+            row.wins += int(delta.wins)
+            row.podiums += int(delta.podiums)
+            row.total_points += float(delta.total_points)
+        session.commit()
+
+
+def on_round_synced(race_id, first_sync):
+    """Keep the stats table current after ingestion of a round.
+
+    A first sync is applied incrementally; a re-synced round (corrected
+    results) triggers a full rebuild so nothing is double counted.
+    """
+    try:
+        if first_sync:
+            apply_round(race_id)
+        else:
+            rebuild_career_stats()
+    except Exception as e:
+        logging.error(f"Error updating career stats for race {race_id}: {e}")
+
+
+def seasons_ingested(seasons):
+    """Whether every round of these seasons held so far has been ingested.
+
+    The stats table only covers what is in the warehouse, so it can stand
+    for a driver's whole career only when all of the driver's seasons are.
+    """
+    seasons = set(seasons)
+    query = (select(F1Data.season, func.count(F1Data.id), func.count(F1Data.results_hash))
+             .where(F1Data.season.in_(seasons),
+                    or_(F1Data.race_date.is_(None), F1Data.race_date <= datetime.utcnow()))
+             .group_by(F1Data.season))
+    with Session(db.engine) as session:
+        rows = session.execute(query).all()
+    complete = {season for season, rounds, synced in rows if rounds and synced == rounds}
+    return seasons <= complete
+
+
+def lookup(driver_id):
+    """Return precomputed career stats for a driver, or None if not stored"""
+    with Session(db.engine) as session:
+        row = session.query(DriverCareerStats).filter_by(driver_id=driver_id).first()
+        if not row:
+            return None
+        return format_stats(row.total_races, row.wins, row.podiums, row.total_points)
+
+
+def leaderboard(order_by='total_points', limit=50):
+    """Return precomputed stats for all drivers, best first"""
+    column = getattr(DriverCareerStats, order_by, DriverCareerStats.total_points)
+    with Session(db.engine) as session:
+        rows = session.query(DriverCareerStats).order_by(column.desc()).limit(limit).all()
+        return [dict(driver_id=row.driver_id, driver_name=row.driver_name,
+                     **format_stats(row.total_races, row.wins, row.podiums, row.total_points))
+                for row in rows]
@@ -0,0 +1,70 @@
+import click
+
+from app import init_db
+
+
+@click.command('init-db')
+def init_db_command():
+    """Create the database tables that do not exist yet."""
+    init_db()
+    click.echo("Database schema is up to date")
+
+
+@click.command('rebuild-career-stats')
+def rebuild_career_stats_command():
+    """Recompute career statistics for all drivers from stored results."""
+    import career_stats
+    click.echo(f"Rebuilt career stats for {career_stats.rebuild_career_stats()} drivers")
+
+
+@click.command('sync-season')
+@click.argument('seasons', nargs=-1, type=int, required=True)
+@click.option('--force', is_flag=True, help='Re-ingest rounds even if unchanged.')
+@click.option('--no-laps', is_flag=True, help='Skip lap time ingestion.')
+def sync_season_command(seasons, force, no_laps):
+    """Ingest whole seasons from Ergast into the local database."""
+    from ingest import sync_season
+    for season in seasons:
+        summary = sync_season(season, force=force, include_laps=not no_laps)
+        if summary.get('error'):
+            click.echo(summary['error'], err=True)
+            continue
+        click.echo(f"{season}: synced {len(summary['rounds_synced'])}, "
+                   f"unchanged {len(summary['rounds_unchanged'])}, "
+                   f"skipped {len(summary['rounds_skipped'])}, "
+                   f"failed {len(summary['rounds_failed'])}")
+
+
+@click.command('export-snapshot')
+@click.argument('path', type=click.Path(file_okay=False))
+@click.argument('seasons', nargs=-1, type=int, required=True)
+@click.option('--no-laps', is_flag=True, help='Skip lap times.')
+def export_snapshot_command(path, seasons, no_laps):
+    """Pack whole seasons into an offline snapshot directory."""
+    from snapshot import export_snapshot
+    manifest = export_snapshot(path, seasons, include_laps=not no_laps)
+    rows = ', '.join(f"{count} {table}" for table, count in manifest['rows'].items())
+    click.echo(f"Exported seasons {manifest['seasons']} to {path}: {rows}")
+
+
+@click.command('import-snapshot')
+@click.argument('path', type=click.Path(exists=True, file_okay=False))
+@click.option('--force', is_flag=True, help='Re-ingest rounds even if unchanged.')
+@click.option('--no-laps', is_flag=True, help='Skip lap time ingestion.')
+def import_snapshot_command(path, force, no_laps):
+    """Ingest every season of a snapshot into the local database without calling Ergast."""
+    from snapshot import load_snapshot
+    from ingest import sync_season
+    for season in load_snapshot(path, mode='offline').manifest['seasons']:
+        summary = sync_season(season, force=force, include_laps=not no_laps)
+        click.echo(f"{season}: synced {len(summary['rounds_synced'])}, "
+                   f"unchanged {len(summary['rounds_unchanged'])}, "
+                   f"skipped {len(summary['rounds_skipped'])}, "
+                   f"failed {len(summary['rounds_failed'])}")
+
+
+def register_commands(app):
+    """Add the maintenance commands to `flask --app main`; their modules load only when run"""
+    for command in (init_db_command, rebuild_career_stats_command, sync_season_command,
+                    export_snapshot_command, import_snapshot_command):
+        app.cli.add_command(command)
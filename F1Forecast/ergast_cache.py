@@ -0,0 +1,333 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlparse
+
+from flask import current_app, has_app_context
+from sqlalchemy.orm import Session
+
+from app import db
+import http_client
+import snapshot
+
+# Maximum number of Ergast responses kept in the in-process LRU
+MEMORY_MAX_ENTRIES = int(os.environ.get("ERGAST_CACHE_MAX_ENTRIES", "512"))
+
+# Freshness (seconds) per Ergast endpoint kind for the current season.
+# Past seasons never change and are treated as immutable.
+FRESHNESS_RULES = {
+    'schedule': 6 * 3600,
+    'driverStandings': 300,
+    'constructorStandings': 300,
+    'results': 600,
+    'qualifying': 600,
+    'laps': 600,
+    'circuits': 7 * 86400,
+    'driver_results': 86400,
+    'driver_seasons': 86400,
+}
+DEFAULT_FRESHNESS = 600
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'memory_hits': 0,
+    'persistent_hits': 0,
+    'misses': 0,
+    'stale_served': 0,
+    'refreshes': 0,
+    'refresh_failures': 0,
+    'upstream_errors': 0,
+    'served_age_total': 0.0,
+    'served_age_max': 0.0,
+    'served_count': 0,
+    'snapshot_served': 0,
+}
+_kind_stats = {}
+
+
+def endpoint_kind(url):
+    """Classify an Ergast URL into the endpoint kind used by the freshness rules"""
+    path = urlparse(url).path
+    if '/f1/' in path:
+        path = path.split('/f1/', 1)[1]
+    segments = [segment for segment in path.strip('/').split('/') if segment]
+    if segments:
+        segments[-1] = segments[-1].rsplit('.json', 1)[0]
+
+    if not segments:
+        return 'unknown'
+    if segments[0] == 'circuits':
+        return 'circuits'
+    if segments[0] == 'drivers' and segments[-1] == 'results':
+        return 'driver_results'
+    if segments[0] == 'drivers' and segments[-1] == 'seasons':
+        return 'driver_seasons'
+    if len(segments) == 1 and segments[0].isdigit():
+        return 'schedule'
+    if 'laps' in segments:
+        return 'laps'
+    return segments[-1]
+
+
+def _url_season(url):
+    path = urlparse(url).path
+    if '/f1/' in path:
+        path = path.split('/f1/', 1)[1]
+    first = path.strip('/').split('/')[0].rsplit('.json', 1)[0]
+    return int(first) if first.isdigit() else None
+
+
+def freshness_for(url):
+    """Return the freshness window in seconds for a URL, or None if immutable"""
+    season = _url_season(url)
+    if season is not None and season < datetime.utcnow().year:
+        return None
+    return FRESHNESS_RULES.get(endpoint_kind(url), DEFAULT_FRESHNESS)
+
+
+def _record(counter, url=None, age=None):
+    with _stats_lock:
+        _stats[counter] += 1
+        if url is not None:
+            kind = _kind_stats.setdefault(endpoint_kind(url), {'hits': 0, 'misses': 0, 'stale': 0})
+            if counter == 'misses':
+                kind['misses'] += 1
+            elif counter == 'stale_served':
+                kind['stale'] += 1
+            else:
+                kind['hits'] += 1
+        if age is not None:
+            _stats['served_count'] += 1
+            _stats['served_age_total'] += age
+            _stats['served_age_max'] = max(_stats['served_age_max'], age)
+
+
+def _memory_get(key):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+        return entry
+
+
+def _memory_put(key, data, fetched_at):
+    with _memory_lock:
+        _memory[key] = (data, fetched_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _load_persistent(key):
+    if not has_app_context():
+        return None
+    from models import ErgastCacheEntry
+    try:
+        with Session(db.engine) as session:
+            row = session.query(ErgastCacheEntry).filter_by(cache_key=key).first()
+            if row:
+                fetched_at = (row.fetched_at - datetime(1970, 1, 1)).total_seconds()
+                return json.loads(row.payload), fetched_at
+    except Exception as e:
+        logging.warning(f"Ergast cache lookup failed for {key}: {e}")
+    return None
+
+
+def _store_persistent(key, data, fetched_at):
+    if not has_app_context():
+        return
+    from models import ErgastCacheEntry
+    try:
+        with Session(db.engine) as session:
+            row = session.query(ErgastCacheEntry).filter_by(cache_key=key).first()
+            if not row:
+                row = ErgastCacheEntry(cache_key=key)
+                session.add(row)
+            row.payload = json.dumps(data, separators=(',', ':'))
+            row.fetched_at = datetime.utcfromtimestamp(fetched_at)
+            session.commit()
+    except Exception as e:
+        logging.warning(f"Ergast cache store failed for {key}: {e}")
+
+
+def _fetch_upstream(url, timeout):
+    if snapshot.offline():
+        return None
+    try:
+        response = http_client.ergast.get(url, endpoint=endpoint_kind(url), timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Ergast request failed with {response.status_code}: {url}")
+    except http_client.CircuitOpenError:
+        logging.warning(f"Ergast circuit open, skipping request: {url}")
+    except Exception as e:
+        logging.error(f"Ergast request error for {url}: {e}")
+    _record('upstream_errors')
+    return None
+
+
+async def _fetch_upstream_async(url, timeout):
+    if snapshot.offline():
+        return None
+    try:
+        response = await http_client.async_ergast.get(url, endpoint=endpoint_kind(url), timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        logging.error(f"Ergast request failed with {response.status_code}: {url}")
+    except http_client.CircuitOpenError:
+        logging.warning(f"Ergast circuit open, skipping request: {url}")
+    except Exception as e:
+        logging.error(f"Ergast request error for {url}: {e}")
+    _record('upstream_errors')
+    return None
+
+
+def _from_snapshot(url):
+    """Serve a miss from the offline snapshot; not cached, so Ergast is retried next time"""
+    data = snapshot.snapshot_payload(url)
+    if data is not None:
+        _record('snapshot_served')
+    return data
+
+
+def _refresh(url, timeout, app):
+    try:
+        data = _fetch_upstream(url, timeout)
+        if data is None:
+            _record('refresh_failures')
+            return
+        fetched_at = time.time()
+        _memory_put(url, data, fetched_at)
+        if app is not None:
+            with app.app_context():
+                _store_persistent(url, data, fetched_at)
+        _record('refreshes')
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(url)
+
+
+def _schedule_refresh(url, timeout):
+    with _refreshing_lock:
+        if url in _refreshing:
+            return
+        _refreshing.add(url)
+    app = current_app._get_current_object() if has_app_context() else None
+    threading.Thread(target=_refresh, args=(url, timeout, app), daemon=True).start()
+
+
+def get_json(url, timeout=10):
+    """Return the parsed Ergast response for a URL, served from cache when possible.
+
+    Fresh entries are returned directly; stale entries are returned immediately
+    while a background refresh fetches a new copy. Misses the upstream cannot
+    serve fall back to the offline snapshot, if one is loaded; returns None
+    when that has no answer either.
+    """
+    entry = _memory_get(url)
+    from_memory = entry is not None
+    if entry is None:
+        entry = _load_persistent(url)
+        if entry is not None:
+            _memory_put(url, *entry)
+
+    if entry is not None:
+        return _serve_cached(url, entry, from_memory, timeout)
+
+    _record('misses', url)
+    data = _fetch_upstream(url, timeout)
+    if data is not None:
+        _store_fetched(url, data)
+        return data
+    return _from_snapshot(url)
+
+
+async def get_json_async(url, timeout=10):
+    """Coroutine variant of get_json for the ASGI serving mode.
+
+    Misses are fetched on the async HTTP client; database reads and writes
+    run in worker threads so the event loop is never blocked on them.
+    """
+    entry = _memory_get(url)
+    from_memory = entry is not None
+    if entry is None:
+        entry = await asyncio.to_thread(_load_persistent, url)
+        if entry is not None:
+            _memory_put(url, *entry)
+
+    if entry is not None:
+        return _serve_cached(url, entry, from_memory, timeout)
+
+    _record('misses', url)
+    data = await _fetch_upstream_async(url, timeout)
+    if data is not None:
+        await asyncio.to_thread(_store_fetched, url, data)
+        return data
+    return _from_snapshot(url)
+
+
+def _serve_cached(url, entry, from_memory, timeout):
+    data, fetched_at = entry
+    age = time.time() - fetched_at
+    ttl = freshness_for(url)
+    if ttl is None or age < ttl:
+        _record('memory_hits' if from_memory else 'persistent_hits', url, age)
+    else:
+        _record('stale_served', url, age)
+        _schedule_refresh(url, timeout)
+    return data
+
+
+def _store_fetched(url, data):
+    fetched_at = time.time()
+    _memory_put(url, data, fetched_at)
+    _store_persistent(url, data, fetched_at)
+
+
+def cache_stats():
+    """Return hit/miss/age counters for the Ergast cache"""
+    with _stats_lock:
+        stats = dict(_stats)
+        by_kind = {kind: dict(counts) for kind, counts in _kind_stats.items()}
+    with _memory_lock:
+        ages = [time.time() - fetched_at for _, fetched_at in _memory.values()]
+
+    served = stats['memory_hits'] + stats['persistent_hits'] + stats['stale_served']
+    lookups = served + stats['misses']
+    return {
+        'hits': {
+            'memory': stats['memory_hits'],
+            'persistent': stats['persistent_hits'],
+            'stale': stats['stale_served'],
+        },
+        'misses': stats['misses'],
+        'hit_ratio': (served / lookups) if lookups else 0.0,
+        'refreshes': stats['refreshes'],
+        'refresh_failures': stats['refresh_failures'],
+        'upstream_errors': stats['upstream_errors'],
+        'snapshot_served': stats['snapshot_served'],
+        'snapshot': snapshot.snapshot_status(),
+        'served_age_seconds': {
+            'mean': (stats['served_age_total'] / stats['served_count']) if stats['served_count'] else 0.0,
+            'max': stats['served_age_max'],
+        },
+        'memory_entries': len(ages),
+        'memory_oldest_age_seconds': max(ages) if ages else 0.0,
+        'by_endpoint': by_kind,
+    }
+
+
+def clear_memory():
+    """Drop all in-process entries (the persistent store is left untouched)"""
+    with _memory_lock:
+        _memory.clear()
@@ -1,76 +1,108 @@
-import requests
-import json
+import os
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from flask import has_app_context
+
+import ergast_cache
+
+ERGAST_BASE_URL = os.environ.get("ERGAST_BASE_URL", "http://ergast.com/api/f1")
+# Ergast caps `limit` per request, so long result sets are fetched in pages
+ERGAST_PAGE_SIZE = int(os.environ.get("ERGAST_PAGE_SIZE", "100"))
 
 def get_current_season_data():
     """Fetch current F1 season data from Ergast API"""
     try:
         current_year = datetime.now().year
-        url = f"http://ergast.com/api/f1/{current_year}.json"
+        url = f"{ERGAST_BASE_URL}/{current_year}.json"
         
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
             return data['MRData']['RaceTable']['Races']
         else:
-            logging.error(f"Failed to fetch season data: {response.status_code}")
+            logging.error("Failed to fetch season data")
             return []
             
     except Exception as e:
         logging.error(f"Error fetching current season data: {e}")
         return []
 
-def get_driver_standings(year=None):
-    """Fetch current driver standings"""
+def get_season_schedule(year):
+    """Fetch the race schedule for a season"""
     try:
-        if not year:
-            year = datetime.now().year
-            
-        url = f"http://ergast.com/api/f1/{year}/driverStandings.json"
+        url = f"{ERGAST_BASE_URL}/{year}.json"
         
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            standings_list = data['MRData']['StandingsTable']['StandingsLists']
-            if standings_list:
-                return standings_list[0]['DriverStandings']
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
+            return data['MRData']['RaceTable']['Races']
         
         return []
         
     except Exception as e:
-        logging.error(f"Error fetching driver standings: {e}")
+        logging.error(f"Error fetching season schedule: {e}")
         return []
 
-def get_constructor_standings(year=None):
-    """Fetch current constructor standings"""
+def _standings_url(kind, year=None, round_number=None):
+    if not year:
+        year = datetime.now().year
+    if round_number:
+        return f"{ERGAST_BASE_URL}/{year}/{round_number}/{kind}.json"
+    return f"{ERGAST_BASE_URL}/{year}/{kind}.json"
+
+def _first_standings(data, key):
+    if data:
+        standings_list = data['MRData']['StandingsTable']['StandingsLists']
+        if standings_list:
+            return standings_list[0][key]
+    return []
+
+def get_driver_standings(year=None, round_number=None):
+    """Fetch driver standings, optionally as they stood after a given round"""
     try:
-        if not year:
-            year = datetime.now().year
-            
-        url = f"http://ergast.com/api/f1/{year}/constructorStandings.json"
-        
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            standings_list = data['MRData']['StandingsTable']['StandingsLists']
-            if standings_list:
-                return standings_list[0]['ConstructorStandings']
+        url = _standings_url('driverStandings', year, round_number)
+        data = ergast_cache.get_json(url, timeout=10)
+        return _first_standings(data, 'DriverStandings')
         
+    except Exception as e:
+        logging.error(f"Error fetching driver standings: {e}")
         return []
+
+def get_constructor_standings(year=None, round_number=None):
+    """Fetch constructor standings, optionally as they stood after a given round"""
+    try:
+        url = _standings_url('constructorStandings', year, round_number)
+        data = ergast_cache.get_json(url, timeout=10)
+        return _first_standings(data, 'ConstructorStandings')
         
     except Exception as e:
         logging.error(f"Error fetching constructor standings: {e}")
         return []
 
-def get_race_results(year, round_number):
-    """Fetch race results for a specific race"""
+def _stored_race_results(year, round_number):
+    """Return race results ingested into the local warehouse, if present"""
+    if not has_app_context():
+        return None
+    from models import F1Data
+    race = F1Data.query.filter_by(season=year, round_number=round_number).first()
+    if race and race.data_json:
+        race_data = race.data_json
+        if race_data.get('Results'):
+            return race_data
+    return None
+
+def get_race_results(year, round_number, prefer_local=True):
+    """Fetch race results for a specific race, from the local warehouse when ingested"""
     try:
-        url = f"http://ergast.com/api/f1/{year}/{round_number}/results.json"
+        if prefer_local:
+            stored = _stored_race_results(year, round_number)
+            if stored:
+                return stored
+        
+        url = f"{ERGAST_BASE_URL}/{year}/{round_number}/results.json"
         
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
             races = data['MRData']['RaceTable']['Races']
             if races:
                 return races[0]
@@ -81,14 +113,79 @@ def get_race_results(year, round_number):
         logging.error(f"Error fetching race results: {e}")
         return None
 
+async def get_current_season_data_async():
+    """Coroutine variant of get_current_season_data"""
+    try:
+        data = await ergast_cache.get_json_async(f"{ERGAST_BASE_URL}/{datetime.now().year}.json", timeout=10)
+        if data:
+            return data['MRData']['RaceTable']['Races']
+        logging.error("Failed to fetch season data")
+        return []
+    except Exception as e:
+        logging.error(f"Error fetching current season data: {e}")
+        return []
+
+async def get_driver_standings_async(year=None, round_number=None):
+    """Coroutine variant of get_driver_standings"""
+    try:
+        data = await ergast_cache.get_json_async(_standings_url('driverStandings', year, round_number), timeout=10)
+        return _first_standings(data, 'DriverStandings')
+    except Exception as e:
+        logging.error(f"Error fetching driver standings: {e}")
+        return []
+
+async def get_constructor_standings_async(year=None, round_number=None):
+    """Coroutine variant of get_constructor_standings"""
+    try:
+        data = await ergast_cache.get_json_async(_standings_url('constructorStandings', year, round_number), timeout=10)
+        return _first_standings(data, 'ConstructorStandings')
+    except Exception as e:
+        logging.error(f"Error fetching constructor standings: {e}")
+        return []
+
+async def get_race_results_async(year, round_number):
+    """Coroutine variant of get_race_results"""
+    try:
+        stored = await asyncio.to_thread(_stored_race_results, year, round_number)
+        if stored:
+            return stored
+        data = await ergast_cache.get_json_async(f"{ERGAST_BASE_URL}/{year}/{round_number}/results.json", timeout=10)
+        if data:
+            races = data['MRData']['RaceTable']['Races']
+            if races:
+                return races[0]
+        return None
+    except Exception as e:
+        logging.error(f"Error fetching race results: {e}")
+        return None
+
+def race_results_columns(race_data):
+    """Convert a race results payload to one array per field instead of one object per driver"""
+    results = race_data.get('Results', [])
+    race = {key: value for key, value in race_data.items() if key != 'Results'}
+    return {
+        'race': race,
+        'columns': {
+            'driver_id': [r['Driver']['driverId'] for r in results],
+            'driver_code': [r['Driver'].get('code') for r in results],
+            'constructor_id': [r.get('Constructor', {}).get('constructorId') for r in results],
+            'grid': [int(r['grid']) if r.get('grid', '').isdigit() else None for r in results],
+            'position': [int(r['position']) if r.get('position', '').isdigit() else None for r in results],
+            'position_text': [r.get('positionText') for r in results],
+            'points': [float(r.get('points', 0)) for r in results],
+            'laps': [int(r['laps']) if r.get('laps', '').isdigit() else None for r in results],
+            'status': [r.get('status') for r in results],
+            'time_millis': [int(r['Time']['millis']) if 'Time' in r else None for r in results],
+        }
+    }
+
 def get_qualifying_results(year, round_number):
     """Fetch qualifying results for a specific race"""
     try:
-        url = f"http://ergast.com/api/f1/{year}/{round_number}/qualifying.json"
+        url = f"{ERGAST_BASE_URL}/{year}/{round_number}/qualifying.json"
         
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
             races = data['MRData']['RaceTable']['Races']
             if races:
                 return races[0]
@@ -102,11 +199,10 @@ def get_qualifying_results(year, round_number):
 def get_circuit_info(circuit_id):
     """Fetch circuit information"""
     try:
-        url = f"http://ergast.com/api/f1/circuits/{circuit_id}.json"
+        url = f"{ERGAST_BASE_URL}/circuits/{circuit_id}.json"
         
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
             circuits = data['MRData']['CircuitTable']['Circuits']
             if circuits:
                 return circuits[0]
@@ -118,85 +214,134 @@ def get_circuit_info(circuit_id):
         return None
 
 def get_driver_career_stats(driver_id):
-    """Fetch career statistics for a driver"""
+    """Fetch career statistics for a driver
+
+    Served from the precomputed career stats table when every season the
+    driver raced in has been fully ingested; otherwise every page of the
+    driver's results is fetched from Ergast and aggregated in one vectorized
+    pass.
+    """
+    # Imported on first use: pandas is slow to import and most workers never need it
+    import pandas as pd
+    import career_stats
     try:
-        # Get all races for the driver
-        url = f"http://ergast.com/api/f1/drivers/{driver_id}/results.json?limit=1000"
+        if has_app_context():
+            seasons = get_driver_seasons(driver_id)
+            if seasons and career_stats.seasons_ingested(seasons):
+                stored = career_stats.lookup(driver_id)
+                if stored:
+                    return stored
         
-        response = requests.get(url, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
-            races = data['MRData']['RaceTable']['Races']
-            
-            if not races:
-                return None
-            
-            # Calculate statistics
-            total_races = len(races)
-            wins = sum(1 for race in races for result in race['Results'] if result['position'] == '1')
-            podiums = sum(1 for race in races for result in race['Results'] if result['position'] in ['1', '2', '3'])
-            points = sum(float(result['points']) for race in races for result in race['Results'])
-            
-            return {
-                'total_races': total_races,
-                'wins': wins,
-                'podiums': podiums,
-                'total_points': points,
-                'win_percentage': (wins / total_races * 100) if total_races > 0 else 0,
-                'podium_percentage': (podiums / total_races * 100) if total_races > 0 else 0
-            }
+        rows = []
+        for page in iter_ergast_pages(f"{ERGAST_BASE_URL}/drivers/{driver_id}/results.json"):
+            for race in page['MRData']['RaceTable']['Races']:
+                for result in race['Results']:
+                    rows.append((driver_id, result['position'], result['points']))
         
-        return None
+        if not rows:
+            return None
+        
+        stats = career_stats.compute_career_stats(
+            pd.DataFrame(rows, columns=['driver_id', 'position', 'points'])
+        ).iloc[0]
+        return career_stats.format_stats(stats.total_races, stats.wins, stats.podiums, stats.total_points)
         
     except Exception as e:
         logging.error(f"Error fetching driver career stats: {e}")
         return None
 
-def get_lap_times(year, round_number, lap_number=None):
-    """Fetch lap times for a specific race"""
+def get_driver_seasons(driver_id):
+    """Return the seasons a driver has raced in, or None if unavailable"""
     try:
-        if lap_number:
-            url = f"http://ergast.com/api/f1/{year}/{round_number}/laps/{lap_number}.json"
-        else:
-            url = f"http://ergast.com/api/f1/{year}/{round_number}/laps.json?limit=2000"
+        url = f"{ERGAST_BASE_URL}/drivers/{driver_id}/seasons.json?limit=100"
+        data = ergast_cache.get_json(url, timeout=10)
+        if data:
+            return [int(season['season']) for season in data['MRData']['SeasonTable']['Seasons']]
+        return None
         
-        response = requests.get(url, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
-            races = data['MRData']['RaceTable']['Races']
-            if races:
-                return races[0]['Laps'] if 'Laps' in races[0] else []
+    except Exception as e:
+        logging.error(f"Error fetching driver seasons: {e}")
+        return None
+
+class IncompleteDataError(Exception):
+    """A page of a paginated Ergast endpoint could not be fetched"""
+
+def iter_ergast_pages(url, timeout=15, page_size=None):
+    """Yield every page of a paginated Ergast endpoint, following MRData.total
+
+    Raises IncompleteDataError when a page cannot be fetched, so callers
+    never persist or cache a partial result as if it were complete.
+    """
+    page_size = page_size or ERGAST_PAGE_SIZE
+    separator = '&' if '?' in url else '?'
+    offset = 0
+    while True:
+        data = ergast_cache.get_json(f"{url}{separator}limit={page_size}&offset={offset}", timeout=timeout)
+        if not data:
+            raise IncompleteDataError(f"Failed to fetch page at offset {offset}: {url}")
+        yield data
         
-        return []
+        offset += page_size
+        if offset >= int(data['MRData'].get('total', 0)):
+            return
+
+def parse_lap_time(text):
+    """Convert an Ergast lap time such as '1:32.456' to milliseconds"""
+    if not text:
+        return None
+    try:
+        minutes, _, seconds = text.rpartition(':')
+        return int(round((int(minutes or 0) * 60 + float(seconds)) * 1000))
+    except ValueError:
+        return None
+
+def format_lap_time(milliseconds):
+    """Convert milliseconds back to Ergast's 'm:ss.fff' lap time format"""
+    if milliseconds is None:
+        return None
+    minutes, remainder = divmod(int(milliseconds), 60000)
+    return f"{minutes}:{remainder / 1000:06.3f}"
+
+def iter_lap_timings(year, round_number, lap_number=None):
+    """Yield (driver_id, lap, position, milliseconds) for every lap timing of a race, page by page"""
+    if lap_number:
+        url = f"{ERGAST_BASE_URL}/{year}/{round_number}/laps/{lap_number}.json"
+    else:
+        url = f"{ERGAST_BASE_URL}/{year}/{round_number}/laps.json"
+    
+    for page in iter_ergast_pages(url):
+        races = page['MRData']['RaceTable']['Races']
+        if not races:
+            return
+        for lap in races[0].get('Laps', []):
+            number = int(lap['number'])
+            for timing in lap.get('Timings', []):
+                position = timing.get('position')
+                yield (timing['driverId'], number,
+                       int(position) if position else None,
+                       parse_lap_time(timing.get('time')))
+
+def get_lap_times(year, round_number, lap_number=None):
+    """Fetch lap times for a specific race, merging laps split across pages"""
+    try:
+        laps = {}
+        for driver_id, number, position, millis in iter_lap_timings(year, round_number, lap_number):
+            lap = laps.setdefault(number, {'number': str(number), 'Timings': []})
+            lap['Timings'].append({
+                'driverId': driver_id,
+                'position': str(position) if position is not None else None,
+                'time': format_lap_time(millis),
+                'milliseconds': millis,
+            })
+        
+        return [laps[number] for number in sorted(laps)]
         
     except Exception as e:
         logging.error(f"Error fetching lap times: {e}")
         return []
 
-def generate_sample_telemetry():
-    """Generate sample telemetry data for dashboard visualization"""
-    import random
-    import math
-    
-    # Simulate realistic F1 telemetry data
-    telemetry = {
-        'timestamp': datetime.now().isoformat(),
-        'speed': random.uniform(100, 320),  # km/h
-        'rpm': random.uniform(8000, 15000),  # RPM
-        'gear': random.randint(1, 8),
-        'throttle': random.uniform(0, 100),  # percentage
-        'brake': random.uniform(0, 100),  # percentage
-        'drs_open': random.choice([True, False]),
-        'tire_temp': {
-            'front_left': random.uniform(80, 120),
-            'front_right': random.uniform(80, 120),
-            'rear_left': random.uniform(80, 120),
-            'rear_right': random.uniform(80, 120)
-        },
-        'g_force': {
-            'lateral': random.uniform(-5, 5),
-            'longitudinal': random.uniform(-5, 5)
-        }
-    }
-    
-    return telemetry
+def generate_sample_telemetry(car=0):
+    """Return the latest simulated telemetry sample of one car for dashboard visualization"""
+    # Imported on first use: it loads NumPy and starts the simulation
+    import telemetry_engine
+    return telemetry_engine.car_sample(car)
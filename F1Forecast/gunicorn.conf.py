@@ -0,0 +1,17 @@
+"""gunicorn settings, picked up automatically by `gunicorn main:app` from this directory.
+
+Server-Sent Event routes (/api/telemetry-stream, /api/jobs/<id>/stream and
+the prediction streams) hold their connection open. On the default sync
+worker each one would occupy a whole worker process, so a few open
+dashboard tabs could starve the app; threaded workers give each stream a
+thread instead.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+# Concurrent requests per worker, open streams included
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+keepalive = 5
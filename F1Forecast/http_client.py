@@ -0,0 +1,308 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app, has_app_context
+
+import metrics
+
+try:
+    import httpx
+except ImportError:  # optional: only the ASGI serving mode needs it
+    httpx = None
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+UPSTREAM_LATENCY_METRIC = "upstream_request_duration_seconds"
+UPSTREAM_REQUESTS_METRIC = "upstream_requests_total"
+UPSTREAM_ERRORS_METRIC = "upstream_errors_total"
+UPSTREAM_RESPONSE_BYTES_METRIC = "upstream_response_bytes"
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream's circuit breaker is rejecting calls"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures, probing again after a cooldown"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Return True if a call may proceed; only one probe is let through when half-open"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """Give back a half-open probe that ended without an outcome, so a later call probes again"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logging.warning(f"Circuit opened for {self.name} after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+def record_call(upstream, endpoint, started, response=None):
+    """Record duration, outcome and body size of one upstream call; response is None on errors"""
+    labels = dict(upstream=upstream, endpoint=endpoint or 'other')
+    metrics.observe(UPSTREAM_LATENCY_METRIC, time.perf_counter() - started, **labels)
+    status = str(response.status_code) if response is not None else 'error'
+    metrics.inc(UPSTREAM_REQUESTS_METRIC, status=status, **labels)
+    if response is None or response.status_code >= 400:
+        metrics.inc(UPSTREAM_ERRORS_METRIC, **labels)
+    if response is not None:
+        metrics.observe(UPSTREAM_RESPONSE_BYTES_METRIC, len(response.content), metrics.SIZE_BUCKETS, **labels)
+
+
+class UpstreamClient:
+    """Pooled keep-alive HTTP session for one upstream, with retries and a circuit breaker.
+
+    With retry_reads=False a request whose response did not arrive (read
+    timeout or dropped connection) is not re-sent: the upstream may already
+    have acted on it. Connection errors and 429/5xx responses still retry.
+    """
+
+    def __init__(self, name, pool_size=10, retries=3, backoff_factor=0.3,
+                 backoff_jitter=0.2, failure_threshold=5, reset_timeout=30.0, retry_reads=True):
+        self.name = name
+        self.retry_reads = retry_reads
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.session = requests.Session()
+
+        retry_options = dict(
+            total=retries,
+            connect=retries,
+            read=retries if retry_reads else 0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        try:
+            retry = Retry(backoff_jitter=backoff_jitter, **retry_options)
+        except TypeError:
+            # urllib3 < 2 has no jitter support
+            retry = Retry(**retry_options)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, endpoint=None, **kwargs):
+        """Send a request through the pooled session.
+
+        Raises CircuitOpenError without touching the network while the circuit
+        is open. Connection errors and 5xx/429 responses count as failures.
+        `endpoint` labels the call in the upstream metrics.
+        """
+        if not self.breaker.allow():
+            metrics.inc(UPSTREAM_REQUESTS_METRIC, upstream=self.name, endpoint=endpoint or 'other', status='circuit_open')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            record_call(self.name, endpoint, started)
+            raise
+        except BaseException:
+            # Not an upstream failure (bad arguments, interrupted), but the probe must not stay claimed
+            self.breaker.release_probe()
+            raise
+        record_call(self.name, endpoint, started, response)
+
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+ergast = UpstreamClient(
+    'ergast',
+    pool_size=int(os.environ.get("ERGAST_POOL_SIZE", "10")),
+    retries=int(os.environ.get("ERGAST_RETRIES", "2")),
+)
+groq = UpstreamClient(
+    'groq',
+    pool_size=int(os.environ.get("GROQ_POOL_SIZE", "10")),
+    retries=int(os.environ.get("GROQ_RETRIES", "2")),
+    backoff_factor=0.5,
+    # Chat completions are paid and not idempotent: never re-send one that may have been processed
+    retry_reads=False,
+)
+
+
+class AsyncUpstreamClient:
+    """Coroutine counterpart of UpstreamClient on a pooled httpx.AsyncClient.
+
+    Shares the circuit breaker of the synchronous client for the same
+    upstream, so failures seen in either serving mode open the circuit for
+    both. Retries 429/5xx and transport errors with jittered backoff; read
+    errors only when the synchronous client retries reads.
+    """
+
+    def __init__(self, sync_client, pool_size=100, retries=3, backoff_factor=0.3, backoff_jitter=0.2):
+        self.name = sync_client.name
+        self.breaker = sync_client.breaker
+        self.retry_reads = sync_client.retry_reads
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self._client = None
+        self._loop = None
+
+    def _session(self):
+        if httpx is None:
+            raise RuntimeError("httpx is required for async upstream calls (install the 'asgi' extra)")
+        loop = asyncio.get_running_loop()
+        # An AsyncClient is bound to the event loop it was first used on
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._client = httpx.AsyncClient(limits=limits)
+            self._loop = loop
+        return self._client
+
+    async def request(self, method, url, endpoint=None, **kwargs):
+        """Send a request on the shared async pool; raises CircuitOpenError while the circuit is open"""
+        if not self.breaker.allow():
+            metrics.inc(UPSTREAM_REQUESTS_METRIC, upstream=self.name, endpoint=endpoint or 'other', status='circuit_open')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            return await self._send(method, url, endpoint, **kwargs)
+        except BaseException:
+            # A call cancelled when its client goes away (or failing before it reaches the
+            # upstream) records no outcome; give back the half-open probe so the circuit can close
+            self.breaker.release_probe()
+            raise
+
+    async def _send(self, method, url, endpoint, **kwargs):
+        session = self._session()
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await session.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                # Without retry_reads only errors raised before the request was sent are retried
+                unsent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if attempt == self.retries or not (self.retry_reads or unsent):
+                    self.breaker.record_failure()
+                    record_call(self.name, endpoint, started)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    break
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_jitter))
+
+        record_call(self.name, endpoint, started, response)
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async_ergast = AsyncUpstreamClient(
+    ergast,
+    pool_size=int(os.environ.get("ERGAST_ASYNC_POOL_SIZE", "100")),
+    retries=int(os.environ.get("ERGAST_RETRIES", "2")),
+)
+async_groq = AsyncUpstreamClient(
+    groq,
+    pool_size=int(os.environ.get("GROQ_ASYNC_POOL_SIZE", "50")),
+    retries=int(os.environ.get("GROQ_RETRIES", "2")),
+    backoff_factor=0.5,
+)
+
+
+async def close_async_clients():
+    for client in (async_ergast, async_groq):
+        await client.aclose()
+
+
+def upstream_status():
+    """Return the circuit breaker state of every upstream client"""
+    return {client.name: client.breaker.state for client in (ergast, groq)}
+
+
+_fan_out_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FAN_OUT_WORKERS", "8")),
+    thread_name_prefix='f1-fan-out'
+)
+
+
+def fan_out(calls):
+    """Run independent callables concurrently and return their results by name.
+
+    `calls` maps a name to a zero-argument callable. The current Flask app
+    context, if any, is pushed in each worker so database-backed caches work.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run(fn):
+        if app is None:
+            return fn()
+        with app.app_context():
+            return fn()
+
+    futures = {name: _fan_out_executor.submit(run, fn) for name, fn in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
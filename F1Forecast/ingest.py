@@ -0,0 +1,222 @@
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, func
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, RaceResult, QualifyingResult, DriverStanding, ConstructorStanding, LapTime
+from f1_data import (
+    get_season_schedule, get_race_results, get_qualifying_results,
+    get_driver_standings, get_constructor_standings,
+)
+import lap_data
+import career_stats
+import season_progression
+from jobs import job_handler
+
+# Rounds last synced at least this long after race day are considered final and not re-fetched
+SETTLE_DAYS = 7
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _payload_hash(payload):
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def _upsert_race(session, season, race):
+    round_number = int(race['round'])
+    row = session.query(F1Data).filter_by(season=season, round_number=round_number).first()
+    if not row:
+        row = F1Data(season=season, round_number=round_number)
+        session.add(row)
+    row.race_name = race['raceName']
+    row.circuit_id = race['Circuit'].get('circuitId')
+    row.circuit_name = race['Circuit']['circuitName']
+    row.race_date = datetime.strptime(race['date'], '%Y-%m-%d') if race.get('date') else None
+    if not row.data_json:
+        row.data_json = race
+    return row
+
+
+def _result_rows(race_id, results):
+    rows = []
+    for result in results.get('Results', []):
+        driver = result['Driver']
+        rows.append({
+            'race_id': race_id,
+            'driver_id': driver['driverId'],
+            'driver_code': driver.get('code'),
+            'driver_name': f"{driver.get('givenName', '')} {driver.get('familyName', '')}".strip(),
+            'constructor_id': result.get('Constructor', {}).get('constructorId'),
+            'grid': _int(result.get('grid')),
+            'position': _int(result.get('position')) if result.get('positionText', '').isdigit() else None,
+            'position_text': result.get('positionText'),
+            'points': _float(result.get('points')),
+            'laps': _int(result.get('laps')),
+            'status': result.get('status'),
+            'time_millis': _int(result.get('Time', {}).get('millis')),
+        })
+    return rows
+
+
+def _qualifying_rows(race_id, qualifying):
+    return [{
+        'race_id': race_id,
+        'driver_id': entry['Driver']['driverId'],
+        'constructor_id': entry.get('Constructor', {}).get('constructorId'),
+        'position': _int(entry.get('position')),
+        'q1': entry.get('Q1'),
+        'q2': entry.get('Q2'),
+        'q3': entry.get('Q3'),
+    } for entry in (qualifying or {}).get('QualifyingResults', [])]
+
+
+def _driver_standing_rows(season, round_number, standings):
+    return [{
+        'season': season,
+        'round_number': round_number,
+        'driver_id': entry['Driver']['driverId'],
+        'constructor_id': (entry.get('Constructors') or [{}])[-1].get('constructorId'),
+        'position': _int(entry.get('position')),
+        'points': _float(entry.get('points')),
+        'wins': _int(entry.get('wins')) or 0,
+    } for entry in standings]
+
+
+def _constructor_standing_rows(season, round_number, standings):
+    return [{
+        'season': season,
+        'round_number': round_number,
+        'constructor_id': entry['Constructor']['constructorId'],
+        'position': _int(entry.get('position')),
+        'points': _float(entry.get('points')),
+        'wins': _int(entry.get('wins')) or 0,
+    } for entry in standings]
+
+
+def _replace_rows(session, model, rows, *criteria):
+    session.execute(delete(model).where(*criteria))
+    if rows:
+        session.execute(insert(model), rows)
+
+
+def _is_settled(race):
+    # A round synced on race day may still change (penalties, disqualifications), so
+    # only a sync made after the settle window counts as final
+    return bool(race.results_hash and race.race_date and race.synced_at and
+                race.synced_at >= race.race_date + timedelta(days=SETTLE_DAYS))
+
+
+def sync_round(session, race, include_laps=True, force=False):
+    """Ingest one round; returns True if anything changed"""
+    season, round_number = race.season, race.round_number
+    results = get_race_results(season, round_number, prefer_local=False)
+    if not results or not results.get('Results'):
+        return False
+
+    results_hash = _payload_hash(results)
+    if results_hash == race.results_hash and not force:
+        # Record the check so an unchanged round settles once the window has passed
+        race.synced_at = datetime.utcnow()
+        session.commit()
+        return False
+    first_sync = race.results_hash is None
+
+    # Fetch everything before writing so no write transaction is held across upstream calls
+    qualifying = get_qualifying_results(season, round_number)
+    driver_standings = get_driver_standings(season, round_number)
+    constructor_standings = get_constructor_standings(season, round_number)
+    laps = lap_data.fetch_lap_columns(season, round_number) if include_laps else None
+
+    _replace_rows(session, RaceResult, _result_rows(race.id, results), RaceResult.race_id == race.id)
+    _replace_rows(session, QualifyingResult, _qualifying_rows(race.id, qualifying),
+                  QualifyingResult.race_id == race.id)
+    _replace_rows(session, DriverStanding, _driver_standing_rows(season, round_number, driver_standings),
+                  DriverStanding.season == season, DriverStanding.round_number == round_number)
+    _replace_rows(session, ConstructorStanding,
+                  _constructor_standing_rows(season, round_number, constructor_standings),
+                  ConstructorStanding.season == season, ConstructorStanding.round_number == round_number)
+    if laps is not None:
+        _replace_rows(session, LapTime, lap_data.lap_rows(race.id, laps), LapTime.race_id == race.id)
+
+    race.data_json = results
+    race.results_hash = results_hash
+    race.synced_at = datetime.utcnow()
+    session.commit()
+    lap_data.invalidate(season, round_number)
+    career_stats.on_round_synced(race.id, first_sync)
+    season_progression.on_round_synced(season)
+    return True
+
+
+def sync_season(season, force=False, include_laps=True):
+    """Bulk-load a season into the warehouse, only re-fetching rounds that may have changed"""
+    summary = {'season': season, 'rounds_synced': [], 'rounds_unchanged': [], 'rounds_skipped': [],
+               'rounds_failed': []}
+    schedule = get_season_schedule(season)
+    if not schedule:
+        summary['error'] = f'No schedule available for {season}'
+        return summary
+
+    today = datetime.utcnow()
+    with Session(db.engine) as session:
+        races = [_upsert_race(session, season, race) for race in schedule]
+        session.commit()
+
+        for race in races:
+            if race.race_date and race.race_date > today:
+                continue
+            if _is_settled(race) and not force:
+                summary['rounds_skipped'].append(race.round_number)
+                continue
+            try:
+                if sync_round(session, race, include_laps=include_laps, force=force):
+                    summary['rounds_synced'].append(race.round_number)
+                else:
+                    summary['rounds_unchanged'].append(race.round_number)
+            except Exception as e:
+                # Nothing of the round is written, so the next sync retries it in full
+                session.rollback()
+                summary['rounds_failed'].append(race.round_number)
+                logging.error(f"Error syncing {season} round {race.round_number}: {e}")
+
+    return summary
+
+
+def warehouse_status():
+    """Return per-season counts of stored and synced rounds"""
+    with Session(db.engine) as session:
+        rows = (session.query(F1Data.season, func.count(F1Data.id), func.count(F1Data.synced_at),
+                              func.max(F1Data.synced_at))
+                .group_by(F1Data.season)
+                .order_by(F1Data.season)
+                .all())
+    return [{
+        'season': season,
+        'rounds': rounds,
+        'rounds_synced': synced,
+        'last_synced_at': last_synced.isoformat() if last_synced else None,
+    } for season, rounds, synced, last_synced in rows]
+
+
+@job_handler('sync_season')
+def run_sync_season_job(season, force=False, include_laps=True):
+    return sync_season(season, force=force, include_laps=include_laps)
+
@@ -0,0 +1,118 @@
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+import ergast_cache
+from page_cache import page_cache_stats
+from settings_cache import settings_cache_stats
+from profiler import profiler
+
+REQUEST_LATENCY_METRIC = "http_request_duration_seconds"
+REQUESTS_METRIC = "http_requests_total"
+DB_QUERY_METRIC = "db_query_duration_seconds"
+DB_ERRORS_METRIC = "db_query_errors_total"
+
+
+def _route_label():
+    # The URL rule keeps the label set bounded: /api/predictions/<int:race_id>, not every race id
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.profile_token = profiler.start_request()
+
+
+def _record_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    route = _route_label()
+    status = g.pop('response_status', 500)
+    metrics.observe(REQUEST_LATENCY_METRIC, duration, metrics.REQUEST_BUCKETS, route=route, method=request.method)
+    metrics.inc(REQUESTS_METRIC, route=route, method=request.method, status=str(status))
+    profiler.finish_request(g.pop('profile_token', None), duration, route=route, method=request.method,
+                            path=request.full_path.rstrip('?'), status=status)
+
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_started')
+    if starts:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        metrics.observe(DB_QUERY_METRIC, time.perf_counter() - starts.pop(), metrics.DB_BUCKETS, operation=operation)
+
+
+def _query_failed(context):
+    starts = context.connection.info.get('query_started') if context.connection is not None else None
+    if starts:
+        starts.pop()
+    metrics.inc(DB_ERRORS_METRIC)
+
+
+def cache_samples():
+    """Lookup counters and hit ratios of every cache, as collector samples"""
+    ergast = ergast_cache.cache_stats()
+    page = page_cache_stats()
+    settings = settings_cache_stats()
+    lookups = {
+        ('ergast', 'memory_hit'): ergast['hits']['memory'],
+        ('ergast', 'persistent_hit'): ergast['hits']['persistent'],
+        ('ergast', 'stale_hit'): ergast['hits']['stale'],
+        ('ergast', 'miss'): ergast['misses'],
+        ('page', 'hit'): page['hits'],
+        ('page', 'not_modified'): page['not_modified'],
+        ('page', 'miss'): page['misses'],
+        ('settings', 'hit'): settings['hits'],
+        ('settings', 'miss'): settings['loads'],
+    }
+    # Prediction and driver analysis lookups are counted directly in the metrics registry
+    counted = {(dict(labels)['cache'], dict(labels)['result']): value
+               for labels, value in metrics.counter_values(metrics.CACHE_LOOKUPS_METRIC).items()}
+
+    samples = [(metrics.CACHE_LOOKUPS_METRIC, 'counter', {'cache': cache, 'result': result}, value)
+               for (cache, result), value in lookups.items()]
+    totals = {}
+    for (cache, result), value in list(lookups.items()) + list(counted.items()):
+        hits, total = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result != 'miss' else 0), total + value)
+    samples.extend(('cache_hit_ratio', 'gauge', {'cache': cache}, hits / total if total else 0.0)
+                   for cache, (hits, total) in sorted(totals.items()))
+    return samples
+
+
+_listening = False
+
+
+def init_app(app):
+    """Time every request and database query and expose cache stats to the metrics registry.
+
+    Safe to call for several apps, or twice for one: the request hooks are
+    added once per app, and the process-wide query listeners and cache
+    collector only once.
+    """
+    global _listening
+    if 'f1_instrumentation' not in app.extensions:
+        app.extensions['f1_instrumentation'] = True
+        app.before_request(_start_request)
+        app.after_request(_record_status)
+        app.teardown_request(_finish_request)
+    if _listening:
+        return
+    _listening = True
+    event.listen(Engine, 'before_cursor_execute', _query_started)
+    event.listen(Engine, 'after_cursor_execute', _query_finished)
+    event.listen(Engine, 'handle_error', _query_failed)
+    metrics.register_collector(cache_samples)
@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import uuid
+import logging
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Job
+from sse import format_event
+from ai_predictions import analyze_driver_performance, generate_strategy_recommendations
+from prediction_cache import load_race_data, get_or_generate_predictions
+from settings_cache import get_api_settings
+
+MAX_WORKERS = int(os.environ.get("F1_JOB_WORKERS", "4"))
+JOB_TIMEOUT = int(os.environ.get("F1_JOB_TIMEOUT", "600"))  # seconds
+JOB_RETENTION = int(os.environ.get("F1_JOB_RETENTION", "86400"))  # seconds
+# Job event streams close after this long; the dashboard then polls /api/jobs/<id>/result
+JOB_STREAM_MAX_SECONDS = int(os.environ.get("F1_JOB_STREAM_MAX_SECONDS", "60"))
+# Jobs still queued after this long (their worker may have restarted) are taken over by another
+JOB_REQUEUE_AFTER = int(os.environ.get("F1_JOB_REQUEUE_AFTER", "120"))  # seconds
+FINISHED_STATUSES = ('succeeded', 'failed')
+# Job kinds whose handler is registered by a module imported on first use (ingest loads
+# pandas), so any worker can run a requeued job of that kind
+HANDLER_MODULES = {'sync_season': 'ingest'}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='f1-job')
+_handlers = {}
+_events = {}
+_events_lock = threading.Lock()
+_pending = set()  # Job ids queued on this process's pool and not started yet
+_pending_lock = threading.Lock()
+# Deduplication key -> id of this process's unfinished job submitted under it, or an Event
+# while a thread is submitting that job
+_keyed = {}
+_keyed_lock = threading.Lock()
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind"""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def _handler(kind):
+    """Return the handler for a job kind, importing the module that registers it; None if unknown"""
+    if kind not in _handlers and kind in HANDLER_MODULES:
+        importlib.import_module(HANDLER_MODULES[kind])
+    return _handlers.get(kind)
+
+
+def _event_for(job_id):
+    with _events_lock:
+        return _events.setdefault(job_id, threading.Event())
+
+
+def _notify(job_id):
+    with _events_lock:
+        event = _events.pop(job_id, None)
+    if event:
+        event.set()
+
+
+def _update_job(job_id, **fields):
+    with Session(db.engine) as session:
+        job = session.get(Job, job_id)
+        if job:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            session.commit()
+
+
+def _run_job(app, job_id):
+    with _pending_lock:
+        _pending.discard(job_id)
+    with app.app_context():
+        try:
+            with Session(db.engine) as session:
+                job = session.get(Job, job_id)
+                if job is None or job.status != 'queued':
+                    return
+                handler = _handler(job.kind)
+                if handler is None:
+                    logging.error(f"No handler for job kind {job.kind}; leaving job {job_id} queued")
+                    return
+                params = json.loads(job.params or '{}')
+                # Claim the job atomically: a requeued job may also sit on another worker's pool
+                claimed = session.execute(
+                    update(Job).where(Job.id == job_id, Job.status == 'queued')
+                    .values(status='running', started_at=datetime.utcnow())
+                ).rowcount
+                session.commit()
+                if not claimed:
+                    return
+            _notify(job_id)
+
+            result = handler(**params)
+            if isinstance(result, dict) and result.get('error'):
+                _update_job(job_id, status='failed', error=result['error'],
+                            finished_at=datetime.utcnow())
+            else:
+                _update_job(job_id, status='succeeded', result=json.dumps(result),
+                            finished_at=datetime.utcnow())
+            _forget_keyed(job_id)
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            _update_job(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+            _forget_keyed(job_id)
+        finally:
+            _notify(job_id)
+
+
+def prune_jobs():
+    """Delete finished jobs older than the retention window"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_RETENTION)
+    try:
+        with Session(db.engine) as session:
+            session.query(Job).filter(Job.created_at < cutoff,
+                                      Job.status.in_(FINISHED_STATUSES)).delete()
+            session.commit()
+    except Exception as e:
+        logging.warning(f"Error pruning jobs: {e}")
+
+
+def _enqueue(app, job_id):
+    with _pending_lock:
+        if job_id in _pending:
+            return
+        _pending.add(job_id)
+    _executor.submit(_run_job, app, job_id)
+
+
+def requeue_stale_jobs():
+    """Take over jobs left queued by a worker that went away.
+
+    Jobs queued for longer than JOB_REQUEUE_AFTER are put on this process's
+    pool (whichever worker claims one first runs it); those queued for
+    longer than JOB_TIMEOUT are failed instead.
+    """
+    now = datetime.utcnow()
+    try:
+        with Session(db.engine) as session:
+            session.query(Job).filter(
+                Job.status == 'queued', Job.created_at < now - timedelta(seconds=JOB_TIMEOUT)
+            ).update({'status': 'failed', 'error': 'Job was never started', 'finished_at': now},
+                     synchronize_session=False)
+            stale = [job_id for (job_id,) in session.query(Job.id).filter(
+                Job.status == 'queued', Job.created_at < now - timedelta(seconds=JOB_REQUEUE_AFTER))]
+            session.commit()
+    except Exception as e:
+        logging.warning(f"Error requeueing stale jobs: {e}")
+        return
+    app = current_app._get_current_object()
+    for job_id in stale:
+        logging.info(f"Requeueing stale job {job_id}")
+        _enqueue(app, job_id)
+
+
+def submit_job(kind, **params):
+    """Persist a job and queue it on the worker pool; returns the job id"""
+    if _handler(kind) is None:
+        raise ValueError(f"Unknown job kind: {kind}")
+    prune_jobs()
+    requeue_stale_jobs()
+
+    job_id = uuid.uuid4().hex
+    with Session(db.engine) as session:
+        session.add(Job(id=job_id, kind=kind, status='queued', params=json.dumps(params)))
+        session.commit()
+
+    _event_for(job_id)
+    _enqueue(current_app._get_current_object(), job_id)
+    return job_id
+
+
+def _is_stale(job):
+    return job.status == 'queued' and job.created_at is not None and \
+        datetime.utcnow() - job.created_at > timedelta(seconds=JOB_REQUEUE_AFTER)
+
+
+def submit_job_once(kind, key, **params):
+    """submit_job, reusing this process's unfinished job submitted under the same key"""
+    while True:
+        with _keyed_lock:
+            entry = _keyed.get(key)
+            if entry is None:
+                submitting = _keyed[key] = threading.Event()
+                break
+        if isinstance(entry, threading.Event):
+            # Another thread is submitting the job for this key; use it once it exists
+            entry.wait()
+            continue
+        job = get_job(entry)
+        if job is not None and job['status'] not in FINISHED_STATUSES:
+            return entry
+        with _keyed_lock:
+            if _keyed.get(key) == entry:
+                del _keyed[key]
+
+    # The database work happens outside the lock; concurrent callers for this key wait on the Event
+    job_id = None
+    try:
+        job_id = submit_job(kind, **params)
+        return job_id
+    finally:
+        with _keyed_lock:
+            if job_id is None:
+                del _keyed[key]
+            else:
+                _keyed[key] = job_id
+        submitting.set()
+
+
+def _forget_keyed(job_id):
+    with _keyed_lock:
+        for key in [key for key, entry in _keyed.items() if entry == job_id]:
+            del _keyed[key]
+
+
+def _serialize(job):
+    status, error = job.status, job.error
+    if status == 'running' and job.started_at and \
+            datetime.utcnow() - job.started_at > timedelta(seconds=JOB_TIMEOUT):
+        status, error = 'failed', 'Job timed out'
+    elif status == 'queued' and job.created_at and \
+            datetime.utcnow() - job.created_at > timedelta(seconds=JOB_TIMEOUT):
+        status, error = 'failed', 'Job was never started'
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': status,
+        'error': error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def get_job(job_id, include_result=False):
+    """Return a job's status as a dict, or None if it does not exist"""
+    with Session(db.engine) as session:
+        job = session.get(Job, job_id)
+        if not job:
+            return None
+        stale = _is_stale(job)
+        data = _serialize(job)
+        if include_result and job.result:
+            data['result'] = json.loads(job.result)
+    if stale:
+        requeue_stale_jobs()
+    return data
+
+
+def stream_job_events(job_id, keepalive=15):
+    """Yield Server-Sent Events for a job until it finishes.
+
+    Jobs running in this process wake the stream as soon as they change state;
+    jobs owned by another worker are picked up by polling the job table. The
+    stream ends after JOB_STREAM_MAX_SECONDS so it does not hold a server
+    thread for the whole job; clients fall back to the result endpoint.
+    """
+    last_status = None
+    deadline = time.monotonic() + min(JOB_STREAM_MAX_SECONDS, JOB_TIMEOUT)
+    last_sent = time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            job = get_job(job_id, include_result=True)
+            if job is None:
+                yield format_event('error', {'error': 'Job not found'})
+                return
+
+            if job['status'] != last_status:
+                last_status = job['status']
+                status = {key: value for key, value in job.items() if key != 'result'}
+                yield format_event('status', status)
+                last_sent = time.monotonic()
+
+            if job['status'] in FINISHED_STATUSES:
+                if job['status'] == 'succeeded':
+                    yield format_event('result', job.get('result'))
+                else:
+                    yield format_event('error', {'error': job['error']})
+                return
+
+            _event_for(job_id).wait(timeout=1.0)
+            if time.monotonic() - last_sent >= keepalive:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        # Also when the stream times out on a job run by another worker, which never notifies here
+        with _events_lock:
+            _events.pop(job_id, None)
+
+
+def _api_settings():
+    settings = get_api_settings()
+    if not settings or not settings.gemini_api_key:
+        return None
+    return settings
+
+
+@job_handler('predictions')
+def run_predictions_job(race_id):
+    settings = _api_settings()
+    if not settings:
+        return {'error': 'API keys not configured'}
+    race, race_data = load_race_data(race_id)
+    predictions, _ = get_or_generate_predictions(
+        race_id=race.id if race else None,
+        race_data=race_data,
+        gemini_api_key=settings.gemini_api_key,
+        groq_api_key=settings.groq_api_key
+    )
+    return predictions
+
+
+@job_handler('driver_analysis')
+def run_driver_analysis_job(driver_name):
+    settings = _api_settings()
+    if not settings:
+        return {'error': 'API keys not configured'}
+    return analyze_driver_performance(
+        driver_name=driver_name,
+        gemini_api_key=settings.gemini_api_key
+    )
+
+
+@job_handler('strategy')
+def run_strategy_job(race_conditions):
+    settings = _api_settings()
+    if not settings:
+        return {'error': 'API keys not configured'}
+    return generate_strategy_recommendations(
+        race_conditions=race_conditions,
+        gemini_api_key=settings.gemini_api_key
+    )
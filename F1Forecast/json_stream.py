@@ -0,0 +1,78 @@
+import re
+import json
+import logging
+
+
+class ArrayItemParser:
+    """Incrementally extract complete objects from a named JSON array.
+
+    Feed text chunks as they arrive from a streaming model response; each call
+    returns the array items that became complete with that chunk, so callers
+    can forward them before the whole document has been generated.
+    """
+
+    def __init__(self, key):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ''
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._item_start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """Add a chunk of text and return the list of newly completed items"""
+        self._buffer += text
+        items = []
+        if self._done:
+            return items
+
+        if not self._in_array:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return items
+            self._in_array = True
+            self._pos = match.end()
+
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._item_start = pos
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # Closing bracket of the target array
+                    self._done = True
+                    pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    raw = buffer[self._item_start:pos + 1]
+                    self._item_start = None
+                    try:
+                        items.append(json.loads(raw))
+                    except json.JSONDecodeError as e:
+                        logging.warning(f"Skipping malformed streamed item: {e}")
+            pos += 1
+
+        self._pos = pos
+        return items
+
+    @property
+    def text(self):
+        """All text fed so far"""
+        return self._buffer
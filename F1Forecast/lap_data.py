@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, LapTime
+from f1_data import iter_lap_timings, get_season_schedule
+
+LAP_COLUMNS = ('driver_id', 'lap', 'position', 'milliseconds')
+MAX_CACHED_FRAMES = 64
+
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+
+
+def empty_lap_frame():
+    return pd.DataFrame({
+        'driver_id': pd.Categorical([]),
+        'lap': np.array([], dtype=np.int16),
+        'position': np.array([], dtype=np.int8),
+        'milliseconds': np.array([], dtype=np.int32),
+    })
+
+
+def _compact(frame):
+    """Downcast lap columns to their compact dtypes"""
+    return pd.DataFrame({
+        'driver_id': pd.Categorical(frame['driver_id']),
+        'lap': frame['lap'].to_numpy(dtype=np.int16),
+        'position': frame['position'].fillna(0).to_numpy(dtype=np.int8),
+        'milliseconds': frame['milliseconds'].fillna(-1).to_numpy(dtype=np.int32),
+    })
+
+
+def fetch_lap_columns(season, round_number):
+    """Stream every lap timing page of a race into columnar NumPy arrays.
+
+    Missing positions are stored as 0 and missing times as -1.
+    """
+    drivers, laps, positions, millis = [], [], [], []
+    for driver_id, lap, position, milliseconds in iter_lap_timings(season, round_number):
+        drivers.append(driver_id)
+        laps.append(lap)
+        positions.append(position or 0)
+        millis.append(milliseconds if milliseconds is not None else -1)
+
+    return pd.DataFrame({
+        'driver_id': pd.Categorical(drivers),
+        'lap': np.asarray(laps, dtype=np.int16),
+        'position': np.asarray(positions, dtype=np.int8),
+        'milliseconds': np.asarray(millis, dtype=np.int32),
+    })
+
+
+def _race_row(session, season, round_number, create=False):
+    race = session.query(F1Data).filter_by(season=season, round_number=round_number).first()
+    if race or not create:
+        return race
+    for entry in get_season_schedule(season):
+        if int(entry['round']) == round_number:
+            race = F1Data(season=season, round_number=round_number,
+                          race_name=entry['raceName'],
+                          circuit_id=entry['Circuit'].get('circuitId'),
+                          circuit_name=entry['Circuit']['circuitName'])
+            session.add(race)
+            session.flush()
+            return race
+    return None
+
+
+def lap_rows(race_id, frame):
+    """Convert a lap frame into LapTime row mappings for bulk insert"""
+    return [{
+        'race_id': race_id,
+        'driver_id': driver_id,
+        'lap': int(lap),
+        'position': int(position) or None,
+        'milliseconds': int(milliseconds) if milliseconds >= 0 else None,
+    } for driver_id, lap, position, milliseconds in zip(
+        frame['driver_id'].astype(str), frame['lap'], frame['position'], frame['milliseconds'])]
+
+
+def load_stored_laps(season, round_number):
+    """Read a race's lap times from the LapTime table as a compact frame (empty if none)"""
+    with Session(db.engine) as session:
+        race = _race_row(session, season, round_number)
+        if not race:
+            return empty_lap_frame()
+        rows = session.execute(
+            select(LapTime.driver_id, LapTime.lap, LapTime.position, LapTime.milliseconds)
+            .where(LapTime.race_id == race.id)
+            .order_by(LapTime.lap, LapTime.position)
+        ).all()
+    if not rows:
+        return empty_lap_frame()
+    return _compact(pd.DataFrame(rows, columns=LAP_COLUMNS))
+
+
+def store_laps(season, round_number, frame):
+    """Replace a race's rows in the LapTime table with the given frame"""
+    with Session(db.engine) as session:
+        race = _race_row(session, season, round_number, create=True)
+        if not race:
+            logging.error(f"Cannot store laps for unknown race {season} round {round_number}")
+            return
+        session.execute(delete(LapTime).where(LapTime.race_id == race.id))
+        if len(frame):
+            session.execute(insert(LapTime), lap_rows(race.id, frame))
+        session.commit()
+
+
+def lap_frame(season, round_number):
+    """Return all lap times of a race as a compact columnar DataFrame.
+
+    Served from memory, then the LapTime table; only on a miss are the Ergast
+    pages streamed, normalized and persisted.
+    """
+    key = (season, round_number)
+    with _frames_lock:
+        frame = _frames.get(key)
+        if frame is not None:
+            _frames.move_to_end(key)
+            return frame
+
+    frame = load_stored_laps(season, round_number)
+    if frame.empty:
+        frame = fetch_lap_columns(season, round_number)
+        if not frame.empty:
+            store_laps(season, round_number, frame)
+
+    if not frame.empty:
+        with _frames_lock:
+            _frames[key] = frame
+            while len(_frames) > MAX_CACHED_FRAMES:
+                _frames.popitem(last=False)
+    return frame
+
+
+def multi_race_lap_frame(races):
+    """Concatenate lap frames for several (season, round_number) pairs"""
+    frames = []
+    for season, round_number in races:
+        frame = lap_frame(season, round_number)
+        if not frame.empty:
+            frames.append(frame.assign(season=np.int16(season), round_number=np.int8(round_number)))
+    if not frames:
+        return empty_lap_frame()
+    combined = pd.concat(frames, ignore_index=True)
+    combined['driver_id'] = combined['driver_id'].astype('category')
+    return combined
+
+
+def invalidate(season, round_number):
+    """Drop a race's frame from memory after it has been re-ingested"""
+    with _frames_lock:
+        _frames.pop((season, round_number), None)
+
+
+def frame_etag(frame):
+    """Hash a lap frame's column buffers, for conditional requests"""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(frame['driver_id'].cat.categories, dtype=str).tobytes())
+    digest.update(frame['driver_id'].cat.codes.to_numpy().tobytes())
+    for column in LAP_COLUMNS[1:]:
+        digest.update(np.ascontiguousarray(frame[column].to_numpy()).tobytes())
+    return digest.hexdigest()
+
+
+def frame_to_columns(frame):
+    """Convert a lap frame to plain column lists for JSON responses"""
+    return {
+        'driver_id': frame['driver_id'].astype(str).tolist(),
+        'lap': frame['lap'].tolist(),
+        'position': frame['position'].tolist(),
+        'milliseconds': frame['milliseconds'].tolist(),
+    }
@@ -0,0 +1,282 @@
+import os
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, RaceResult
+from prompt_context import driver_rows
+
+LOCAL_MODEL_NAME = "local-elo"
+ELO_BASE = 1500.0
+ELO_SCALE = 400.0
+ELO_K = float(os.environ.get("LOCAL_MODEL_K", "32"))
+# Share of the constructor's rating added to a driver's strength
+TEAM_WEIGHT = 0.5
+# Rating points per grid slot ahead of the middle of the field
+GRID_POINTS = 12.0
+PREDICTED_POSITIONS = 5
+# Result statuses counted as race incidents for the safety car estimate
+INCIDENT_STATUS_PATTERN = r'Accident|Collision|Spun off|Damage|Debris|Puncture'
+DEFAULT_SAFETY_CAR_PROBABILITY = 0.5
+
+RESULT_COLUMNS = ('season', 'round_number', 'circuit_id', 'driver_id', 'driver_name',
+                  'constructor_id', 'grid', 'position', 'laps', 'status')
+
+_model = None
+_model_version = None
+_model_lock = threading.Lock()
+
+
+def results_history():
+    """Load every stored race result in race order as a frame of RESULT_COLUMNS"""
+    query = (select(F1Data.season, F1Data.round_number, F1Data.circuit_id, RaceResult.driver_id,
+                    RaceResult.driver_name, RaceResult.constructor_id, RaceResult.grid,
+                    RaceResult.position, RaceResult.laps, RaceResult.status)
+             .join(F1Data, RaceResult.race_id == F1Data.id)
+             .order_by(F1Data.season, F1Data.round_number))
+    with Session(db.engine) as session:
+        rows = session.execute(query).all()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def _race_key(season, round_number):
+    return int(season) * 1000 + int(round_number)
+
+
+def _finish_order(position, laps):
+    """Sort key per finisher: classified by position, then the rest by laps completed"""
+    laps = np.nan_to_num(laps.astype(np.float64), nan=0.0)
+    return np.where(np.isnan(position), 1000.0 - laps, position)
+
+
+def _expected_scores(strength):
+    """Matrix of P(row driver finishes ahead of column driver) under the Elo/Bradley-Terry model"""
+    return 1.0 / (1.0 + 10.0 ** ((strength[None, :] - strength[:, None]) / ELO_SCALE))
+
+
+class RatingModel:
+    """Driver and constructor Elo ratings after every stored race.
+
+    Each race is treated as all pairwise duels between its finishers and
+    updated in one vectorized step. Rating snapshots are kept per race so a
+    race can be predicted from the ratings held before it was run.
+    """
+
+    def __init__(self, frame):
+        self.drivers = {driver_id: i for i, driver_id in enumerate(pd.unique(frame['driver_id']))}
+        teams = pd.unique(frame['constructor_id'].fillna('unknown'))
+        self.teams = {team: i for i, team in enumerate(teams)}
+        self.names = dict(zip(frame['driver_id'], frame['driver_name']))
+        self.last_team = dict(zip(frame['driver_id'], frame['constructor_id']))
+        self._train(frame)
+        self._fit_incidents(frame)
+
+    def _train(self, frame):
+        driver_ratings = np.full(len(self.drivers), ELO_BASE)
+        team_ratings = np.full(len(self.teams), ELO_BASE)
+        race_keys, driver_history, team_history = [], [driver_ratings.copy()], [team_ratings.copy()]
+
+        driver_codes = frame['driver_id'].map(self.drivers).to_numpy()
+        team_codes = frame['constructor_id'].fillna('unknown').map(self.teams).to_numpy()
+        position = pd.to_numeric(frame['position'], errors='coerce').to_numpy(dtype=np.float64)
+        laps = pd.to_numeric(frame['laps'], errors='coerce').to_numpy(dtype=np.float64)
+        keys = (frame['season'].to_numpy(dtype=np.int64) * 1000 + frame['round_number'].to_numpy(dtype=np.int64))
+
+        # Rows are ordered by race, so each race is one contiguous slice
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for race in np.split(np.arange(len(frame)), boundaries):
+            if len(race) < 2:
+                continue
+            drivers, teams = driver_codes[race], team_codes[race]
+            strength = driver_ratings[drivers] + TEAM_WEIGHT * (team_ratings[teams] - ELO_BASE)
+            order = _finish_order(position[race], laps[race])
+            actual = (order[:, None] < order[None, :]) + 0.5 * (order[:, None] == order[None, :])
+            delta = ELO_K / (len(race) - 1) * (actual - _expected_scores(strength)).sum(axis=1)
+
+            driver_ratings[drivers] += delta
+            team_delta = np.bincount(teams, weights=delta, minlength=len(team_ratings))
+            team_count = np.bincount(teams, minlength=len(team_ratings))
+            team_ratings += np.divide(team_delta, team_count, out=np.zeros_like(team_delta), where=team_count > 0)
+
+            race_keys.append(keys[race[0]])
+            driver_history.append(driver_ratings.copy())
+            team_history.append(team_ratings.copy())
+
+        self.race_keys = np.asarray(race_keys, dtype=np.int64)
+        self.driver_history = np.vstack(driver_history)
+        self.team_history = np.vstack(team_history)
+
+    def _fit_incidents(self, frame):
+        if frame.empty:
+            self.incident_rate, self.circuit_incident_rate = DEFAULT_SAFETY_CAR_PROBABILITY, {}
+            return
+        incident = frame['status'].fillna('').str.contains(INCIDENT_STATUS_PATTERN, regex=True)
+        races = (frame.assign(incident=incident)
+                 .groupby(['season', 'round_number'])
+                 .agg(circuit_id=('circuit_id', 'first'), incident=('incident', 'any')))
+        self.incident_rate = float(races['incident'].mean())
+        self.circuit_incident_rate = races.groupby('circuit_id')['incident'].mean().to_dict()
+
+    def ratings_before(self, race_key=None):
+        """(driver ratings, team ratings) before a race, or after the latest one"""
+        index = len(self.race_keys) if race_key is None else int(np.searchsorted(self.race_keys, race_key))
+        return self.driver_history[index], self.team_history[index]
+
+
+def _data_version():
+    with Session(db.engine) as session:
+        return session.execute(
+            select(func.count(RaceResult.id), func.max(F1Data.synced_at))
+            .join(F1Data, RaceResult.race_id == F1Data.id)
+        ).one()
+
+
+def get_model():
+    """Return the rating model for the stored results, retraining only when they changed"""
+    global _model, _model_version
+    version = tuple(_data_version())
+    with _model_lock:
+        if _model is None or version != _model_version:
+            _model = RatingModel(results_history())
+            _model_version = version
+        return _model
+
+
+def _grid(row):
+    try:
+        grid = int(row.get('grid'))
+    except (TypeError, ValueError):
+        return None
+    return grid if grid > 0 else None
+
+
+def _circuit_id(race_data):
+    circuit = race_data.get('Circuit') or race_data.get('circuit') or {}
+    return circuit.get('circuitId') if isinstance(circuit, dict) else None
+
+
+def payload_names(race_data):
+    """Full driver names given in a race payload, by driver id"""
+    drivers = [entry.get('Driver', {}) for entry in race_data.get('Results') or race_data.get('QualifyingResults') or []]
+    drivers += [driver for driver in race_data.get('drivers', []) if isinstance(driver, dict)]
+    return {driver.get('driverId'): f"{driver.get('givenName', '')} {driver.get('familyName', '')}".strip()
+            for driver in drivers if driver.get('familyName')}
+
+
+def field_strengths(race_data, model=None):
+    """Rate every driver entered in a race, before the race was run.
+
+    Returns a frame with one row per driver: driver_id, name, team, rating,
+    team_rating, grid (NaN when unknown) and the combined strength used to
+    rank them. Empty when the payload names no drivers.
+    """
+    model = model or get_model()
+    rows = [row for row in driver_rows(race_data) if row.get('id') or row.get('drv')]
+    if not rows:
+        return pd.DataFrame(columns=['driver_id', 'name', 'team', 'rating', 'team_rating', 'grid', 'strength'])
+
+    try:
+        race_key = _race_key(race_data['season'], race_data['round'])
+    except (KeyError, TypeError, ValueError):
+        race_key = None
+    driver_ratings, team_ratings = model.ratings_before(race_key)
+
+    ratings, team_values, teams = [], [], []
+    for row in rows:
+        index = model.drivers.get(row.get('id'))
+        ratings.append(driver_ratings[index] if index is not None else ELO_BASE)
+        team = row.get('team') or model.last_team.get(row.get('id'))
+        team_index = model.teams.get(team)
+        team_values.append(team_ratings[team_index] if team_index is not None else ELO_BASE)
+        teams.append(team)
+    ratings, team_values = np.asarray(ratings), np.asarray(team_values)
+    strength = ratings + TEAM_WEIGHT * (team_values - ELO_BASE)
+
+    grids = np.asarray([_grid(row) or np.nan for row in rows], dtype=np.float64)
+    if not np.isnan(grids).all():
+        # Drivers without a grid slot start behind the known ones
+        starts = np.where(np.isnan(grids), np.nanmax(grids) + 1, grids)
+        strength = strength + GRID_POINTS * (np.median(starts) - starts)
+
+    given_names = payload_names(race_data)
+    return pd.DataFrame({
+        'driver_id': [row.get('id') for row in rows],
+        'name': [given_names.get(row.get('id')) or model.names.get(row.get('id')) or row.get('drv') for row in rows],
+        'team': teams,
+        'rating': ratings,
+        'team_rating': team_values,
+        'grid': grids,
+        'strength': strength,
+    })
+
+
+def safety_car_rate(race_data, model=None):
+    """Share of stored races at this circuit with an incident, or across all circuits"""
+    model = model or get_model()
+    return float(model.circuit_incident_rate.get(_circuit_id(race_data), model.incident_rate))
+
+
+def predict_race(race_data, model=None):
+    """Rank the drivers of a race with the local rating model.
+
+    Returns a payload in the same shape as generate_race_predictions, with
+    the top PREDICTED_POSITIONS drivers, plus the full predicted order and
+    each driver's win probability.
+    """
+    model = model or get_model()
+    field = field_strengths(race_data, model)
+    if field.empty:
+        return None
+    strength = field['strength'].to_numpy()
+
+    beats = _expected_scores(strength)
+    np.fill_diagonal(beats, 0.0)
+    # Expected finishing position: 1 plus the expected number of drivers finishing ahead
+    expected_position = 1.0 + beats.sum(axis=0)
+    order = np.argsort(expected_position, kind='stable')
+    rank = np.empty(len(field), dtype=np.int64)
+    rank[order] = np.arange(len(field))
+    # Confidence: how strongly the pairwise probabilities agree with the predicted order
+    agreement = np.where(rank[:, None] < rank[None, :], beats, 1.0 - beats - np.eye(len(field)))
+    confidence = agreement.sum(axis=1) / max(len(field) - 1, 1)
+    weights = 10.0 ** ((strength - strength.max()) / ELO_SCALE)
+    win_probability = weights / weights.sum()
+
+    names = field['name'].tolist()
+    predictions = []
+    for position, i in enumerate(order[:PREDICTED_POSITIONS], start=1):
+        driver = field.iloc[i]
+        grid = '' if np.isnan(driver['grid']) else f", starts P{int(driver['grid'])}"
+        predictions.append({
+            'driver': names[i],
+            'position': position,
+            'confidence': round(float(confidence[i]), 2),
+            'reasoning': (f"Rating {driver['rating']:.0f}, {driver['team'] or 'unknown team'} "
+                          f"{driver['team_rating']:.0f}{grid}; {win_probability[i]:.0%} win probability"),
+            'win_probability': round(float(win_probability[i]), 4),
+        })
+
+    return {
+        'predictions': predictions,
+        'finishing_order': [names[i] for i in order],
+        'key_factors': ["Driver rating", "Constructor rating", "Grid position", "Circuit incident history"],
+        'weather_impact': "Not modelled by the local model",
+        'tire_strategy': "Not modelled by the local model",
+        'safety_car_probability': round(safety_car_rate(race_data, model), 2),
+        'model': LOCAL_MODEL_NAME,
+        'races_trained': int(len(model.race_keys)),
+    }
+
+
+def local_predictions(race_data):
+    """predict_race that logs and returns None instead of raising"""
+    try:
+        return predict_race(race_data)
+    except Exception as e:
+        logging.error(f"Error running local prediction model: {e}")
+        return None
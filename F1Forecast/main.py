@@ -1,4 +1,9 @@
-from app import app
+from app import create_app, init_db
+
+app = create_app()
 
 if __name__ == '__main__':
+    # The development server creates missing tables itself; deployments run `flask --app main init-db`
+    with app.app_context():
+        init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
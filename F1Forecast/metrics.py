@@ -0,0 +1,208 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, sized for upstream HTTP and LLM calls
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Size buckets in tokens, for LLM prompts and responses
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+# Latency buckets in seconds for served requests and database queries
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Size buckets in bytes, for upstream response bodies
+SIZE_BUCKETS = (1000, 5000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000)
+CACHE_LOOKUPS_METRIC = "cache_lookups_total"
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed bucket bounds"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def _quantile(self, counts, count, q):
+        # Upper bound of the bucket containing the quantile
+        target = q * count
+        running = 0
+        for index, bucket_count in enumerate(counts):
+            running += bucket_count
+            if running >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+        return {
+            'count': count,
+            'sum': total,
+            'mean': (total / count) if count else 0.0,
+            'p50': self._quantile(counts, count, 0.50) if count else 0.0,
+            'p95': self._quantile(counts, count, 0.95) if count else 0.0,
+            'p99': self._quantile(counts, count, 0.99) if count else 0.0,
+            'buckets': cumulative,
+        }
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        with self._lock:
+            return self._value
+
+
+_histograms = {}
+_counters = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def histogram(name, buckets=DEFAULT_BUCKETS, **labels):
+    """Return the histogram registered under a name and label set, creating it if needed"""
+    key = (name, tuple(sorted(labels.items())))
+    with _registry_lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = Histogram(buckets)
+            _histograms[key] = hist
+        return hist
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    histogram(name, buckets, **labels).observe(value)
+
+
+def counter(name, **labels):
+    """Return the counter registered under a name and label set, creating it if needed"""
+    key = (name, tuple(sorted(labels.items())))
+    with _registry_lock:
+        count = _counters.get(key)
+        if count is None:
+            count = Counter()
+            _counters[key] = count
+        return count
+
+
+def inc(name, amount=1, **labels):
+    counter(name, **labels).inc(amount)
+
+
+def counter_values(name):
+    """Return {labels tuple: value} of every counter registered under a name"""
+    with _registry_lock:
+        items = [(labels, count) for (counter_name, labels), count in _counters.items() if counter_name == name]
+    return {labels: count.value for labels, count in items}
+
+
+def register_collector(collect):
+    """Add a callable returning (name, type, labels dict, value) samples computed at scrape time.
+
+    Used for stats that modules already keep themselves, such as cache counters.
+    """
+    with _registry_lock:
+        _collectors.append(collect)
+
+
+def errors_metric(name):
+    """Name of the counter timed() increments when the block raises"""
+    return name.rsplit('_duration_seconds', 1)[0] + '_errors_total'
+
+
+@contextmanager
+def timed(name, **labels):
+    """Record the wall-clock duration of the enclosed block in a histogram.
+
+    Exceptions leaving the block are also counted in errors_metric(name).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc(errors_metric(name), **labels)
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def snapshot():
+    """Return all histograms as {name: [{'labels': {...}, ...stats}]}"""
+    with _registry_lock:
+        items = list(_histograms.items())
+    result = {}
+    for (name, labels), hist in sorted(items, key=lambda item: item[0]):
+        result.setdefault(name, []).append(dict(labels=dict(labels), **hist.snapshot()))
+    return result
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_prometheus():
+    """Render every histogram, counter and collector sample in the Prometheus text format (0.0.4)"""
+    with _registry_lock:
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        counters = sorted(_counters.items(), key=lambda item: item[0])
+        collectors = list(_collectors)
+
+    families = {}
+    for (name, labels), hist in histograms:
+        labels = dict(labels)
+        stats = hist.snapshot()
+        lines = families.setdefault(name, ('histogram', []))[1]
+        for bound, count in stats['buckets'].items():
+            lines.append(f"{name}_bucket{_format_labels(dict(labels, le=bound))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(stats['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {stats['count']}")
+    for (name, labels), count in counters:
+        families.setdefault(name, ('counter', []))[1].append(
+            f"{name}{_format_labels(dict(labels))} {_format_value(count.value)}")
+    for collect in collectors:
+        for name, kind, labels, value in collect():
+            families.setdefault(name, (kind, []))[1].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    output = []
+    for name in sorted(families):
+        kind, lines = families[name]
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return '\n'.join(output) + '\n'
@@ -1,6 +1,9 @@
 from app import db
 from datetime import datetime
-import json
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Native JSON column: JSONB on PostgreSQL, JSON (stored as text) elsewhere
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
 
 class APISettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,20 +13,156 @@ class APISettings(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class F1Data(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('season', 'round_number', name='uq_f1_data_season_round'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    season = db.Column(db.Integer, nullable=False)
+    season = db.Column(db.Integer, nullable=False, index=True)
     round_number = db.Column(db.Integer, nullable=False)
     race_name = db.Column(db.String(200), nullable=False)
+    circuit_id = db.Column(db.String(100))
     circuit_name = db.Column(db.String(200), nullable=False)
     race_date = db.Column(db.DateTime)
-    data_json = db.Column(db.Text)  # Store race data as JSON
+    data_json = db.Column(JSONType)  # Race data payload
+    results_hash = db.Column(db.String(64))  # Hash of the last ingested results payload
+    synced_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-class Prediction(db.Model):
+class RaceResult(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'driver_id', name='uq_race_result_driver'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'), nullable=False, index=True)
+    driver_id = db.Column(db.String(100), nullable=False, index=True)
+    driver_code = db.Column(db.String(10))
+    driver_name = db.Column(db.String(200))
+    constructor_id = db.Column(db.String(100), index=True)
+    grid = db.Column(db.Integer)
+    position = db.Column(db.Integer)  # Null when not classified
+    position_text = db.Column(db.String(10))
+    points = db.Column(db.Float, default=0)
+    laps = db.Column(db.Integer)
+    status = db.Column(db.String(100))
+    time_millis = db.Column(db.Integer)
+
+class QualifyingResult(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'driver_id', name='uq_qualifying_result_driver'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'), nullable=False, index=True)
+    driver_id = db.Column(db.String(100), nullable=False, index=True)
+    constructor_id = db.Column(db.String(100))
+    position = db.Column(db.Integer)
+    q1 = db.Column(db.String(20))
+    q2 = db.Column(db.String(20))
+    q3 = db.Column(db.String(20))
+
+class DriverStanding(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('season', 'round_number', 'driver_id', name='uq_driver_standing'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    season = db.Column(db.Integer, nullable=False, index=True)
+    round_number = db.Column(db.Integer, nullable=False)
+    driver_id = db.Column(db.String(100), nullable=False, index=True)
+    constructor_id = db.Column(db.String(100))
+    position = db.Column(db.Integer)
+    points = db.Column(db.Float, default=0)
+    wins = db.Column(db.Integer, default=0)
+
+class ConstructorStanding(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('season', 'round_number', 'constructor_id', name='uq_constructor_standing'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    season = db.Column(db.Integer, nullable=False, index=True)
+    round_number = db.Column(db.Integer, nullable=False)
+    constructor_id = db.Column(db.String(100), nullable=False)
+    position = db.Column(db.Integer)
+    points = db.Column(db.Float, default=0)
+    wins = db.Column(db.Integer, default=0)
+
+class LapTime(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'driver_id', 'lap', name='uq_lap_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'), nullable=False, index=True)
+    driver_id = db.Column(db.String(100), nullable=False)
+    lap = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer)
+    milliseconds = db.Column(db.Integer)
+
+class PredictionRun(db.Model):
+    __table_args__ = (
+        db.Index('ix_prediction_run_race_created', 'race_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'), nullable=False)
-    driver_name = db.Column(db.String(100), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'), index=True)
+    input_hash = db.Column(db.String(64), index=True)  # Hash of race data + model config
+    tier = db.Column(db.String(20), nullable=False, index=True)  # 'llm' or 'local'
+    model = db.Column(db.String(100))
+    payload = db.Column(JSONType, nullable=False)  # Full prediction response
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class PredictionEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_prediction_entry_race_driver', 'race_id', 'driver_id'),
+        # Driver history pages newest first by entry id, matching on name or Ergast id
+        db.Index('ix_prediction_entry_driver_key_id', 'driver_key', 'id'),
+        db.Index('ix_prediction_entry_driver_id_id', 'driver_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('prediction_run.id', ondelete='CASCADE'), nullable=False, index=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('f1_data.id'))
+    driver_id = db.Column(db.String(100))  # Ergast driver id when the name could be resolved
+    driver_name = db.Column(db.String(200), nullable=False)
+    driver_key = db.Column(db.String(200), nullable=False)  # Lower-cased name for lookups
     predicted_position = db.Column(db.Integer)
     confidence_score = db.Column(db.Float)
-    prediction_data = db.Column(db.Text)  # Store prediction details as JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ErgastCacheEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(500), unique=True, nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)  # Raw Ergast JSON response
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text)  # Job parameters as JSON
+    result = db.Column(db.Text)  # Job result as JSON
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class DriverCareerStats(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    driver_name = db.Column(db.String(200))
+    total_races = db.Column(db.Integer, default=0)
+    wins = db.Column(db.Integer, default=0)
+    podiums = db.Column(db.Integer, default=0)
+    total_points = db.Column(db.Float, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DriverAnalysis(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)  # Hash of driver + data version
+    driver_name = db.Column(db.String(200), nullable=False)
+    data_version = db.Column(db.String(200))
+    analysis = db.Column(db.Text, nullable=False)  # Analysis JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,105 @@
+import gzip
+import json
+import hashlib
+
+from flask import Response, request
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install "Workspace_F1[msgpack]"
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+COLUMNAR_MIMETYPE = 'application/vnd.f1.columnar+json'
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+COMPRESS_LEVEL = 5
+
+
+def payload_etag(payload):
+    """Content hash of a JSON-serializable payload, for use as an ETag"""
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def response_format():
+    """Pick 'msgpack' or 'json' from ?format= or the Accept header"""
+    requested = request.args.get('format')
+    if requested is None:
+        best = request.accept_mimetypes.best_match(('application/json', *MSGPACK_MIMETYPES))
+        requested = 'msgpack' if best in MSGPACK_MIMETYPES else 'json'
+    # Without the optional msgpack package every client gets JSON
+    return 'msgpack' if requested == 'msgpack' and msgpack is not None else 'json'
+
+
+def wants_columnar():
+    """Whether the client asked for column arrays instead of arrays of objects"""
+    return (request.args.get('layout') == 'columnar' or
+            COLUMNAR_MIMETYPE in request.accept_mimetypes.values())
+
+
+def _accepts_gzip():
+    # Quality of gzip (or of *); q=0 means the client refuses it
+    return request.accept_encodings['gzip'] > 0
+
+
+def _representation_etag(etag, encoding, columnar_layout):
+    # One tag per representation; weak so gzip and identity bodies share it
+    return f"{etag}-{encoding}{'-columnar' if columnar_layout else ''}"
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def not_modified_response(etag, columnar=False):
+    """Return a 304 if the client already holds this representation, else None.
+
+    For callers that must do asynchronous work to build the payload and
+    so cannot hand negotiated_response a callable.
+    """
+    etag = _representation_etag(etag, response_format(), columnar and wants_columnar())
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    return None
+
+
+def negotiated_response(build, etag=None, columnar=None, max_age=None):
+    """Serialize a payload in the encoding the client negotiated.
+
+    build is the payload or a callable producing it; with an etag that the
+    client already holds, a 304 is returned before build is called or
+    anything is serialized. columnar converts the payload to its column
+    layout when the client asks for it. Bodies are gzip-compressed for
+    clients that accept it.
+    """
+    encoding = response_format()
+    columnar_layout = columnar is not None and wants_columnar()
+    if etag is not None:
+        etag = _representation_etag(etag, encoding, columnar_layout)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
+    payload = build() if callable(build) else build
+    if columnar_layout:
+        payload = columnar(payload)
+
+    if encoding == 'msgpack':
+        body, mimetype = msgpack.packb(payload, use_bin_type=True), 'application/msgpack'
+    else:
+        body, mimetype = json.dumps(payload, separators=(',', ':')).encode('utf-8'), 'application/json'
+
+    response = Response(mimetype=mimetype)
+    if len(body) >= MIN_COMPRESS_BYTES and _accepts_gzip():
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_data(body)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    if max_age is not None:
+        response.cache_control.max_age = max_age
+    return response
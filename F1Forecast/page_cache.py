@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, current_app, render_template, request, session
+from markupsafe import Markup
+
+from negotiation import payload_etag
+
+# Rendered fragments and pages kept in process, keyed on (name, data version)
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "64"))
+ANALYTICS_TEMPLATES = ('analytics.html', 'base.html', 'partials/driver_standings.html',
+                       'partials/season_schedule.html')
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+
+def _template_version(names):
+    # Template edits invalidate rendered output without a restart
+    mtimes = []
+    for name in names:
+        path = os.path.join(current_app.root_path, current_app.template_folder, name)
+        mtimes.append(os.path.getmtime(path) if os.path.exists(path) else 0)
+    return payload_etag(mtimes)
+
+
+def cached_render(name, version, render):
+    """Return rendered markup for (name, version), calling render() only on a miss"""
+    key = (name, version)
+    with _rendered_lock:
+        html = _rendered.get(key)
+        if html is not None:
+            _rendered.move_to_end(key)
+            _stats['hits'] += 1
+            return html
+        _stats['misses'] += 1
+
+    html = render()
+    with _rendered_lock:
+        _rendered[key] = html
+        while len(_rendered) > PAGE_CACHE_MAX_ENTRIES:
+            _rendered.popitem(last=False)
+    return html
+
+
+def render_analytics(current_data, driver_standings, constructor_standings, error=None):
+    """Render the analytics page from cached fragments, answering conditional GETs.
+
+    The standings and schedule blocks are cached on the content hash of their
+    Ergast data, and the page on the hash of its fragments' versions, so a
+    refreshed cache entry with new data re-renders only what changed. The
+    page version doubles as the ETag.
+    """
+    versions = {
+        'driver_standings': payload_etag(driver_standings),
+        'season_schedule': payload_etag(current_data),
+        'constructor_standings': payload_etag(constructor_standings),
+        'templates': _template_version(ANALYTICS_TEMPLATES),
+        'error': error,
+    }
+    page_version = payload_etag(versions)
+    # Flashed messages are rendered into the page once, so such pages are never cached
+    cacheable = not session.get('_flashes')
+
+    if cacheable and request.if_none_match.contains(page_version):
+        with _rendered_lock:
+            _stats['not_modified'] += 1
+        response = Response(status=304)
+        response.set_etag(page_version)
+        return response
+
+    def render_page():
+        standings_html = cached_render(
+            'driver_standings', versions['driver_standings'],
+            lambda: render_template('partials/driver_standings.html', driver_standings=driver_standings or [])
+        )
+        schedule_html = cached_render(
+            'season_schedule', versions['season_schedule'],
+            lambda: render_template('partials/season_schedule.html', current_data=current_data or [])
+        )
+        return render_template('analytics.html',
+                               current_data=current_data,
+                               driver_standings=driver_standings,
+                               constructor_standings=constructor_standings,
+                               standings_html=Markup(standings_html),
+                               schedule_html=Markup(schedule_html),
+                               error=error)
+
+    if not cacheable:
+        return Response(render_page(), mimetype='text/html')
+
+    response = Response(cached_render('analytics', page_version, render_page), mimetype='text/html')
+    response.set_etag(page_version)
+    # Let browsers keep the page but revalidate it with the ETag on every view
+    response.cache_control.no_cache = True
+    return response
+
+
+def page_cache_stats():
+    with _rendered_lock:
+        return dict(_stats, entries=len(_rendered))
@@ -0,0 +1,446 @@
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, PredictionRun, PredictionEntry
+from prompt_context import warehouse_features
+from ai_predictions import (
+    generate_race_predictions, generate_race_predictions_async, stream_race_predictions, is_fallback_prediction,
+    GEMINI_MODEL, GROQ_MODEL, GROQ_ENRICHMENT_MODE, PREDICTION_TEMPERATURE, PROMPT_TOKEN_BUDGET,
+)
+import metrics
+
+SAMPLE_RACE_DATA = {
+    "raceName": "Sample Grand Prix",
+    "Circuit": {
+        "circuitName": "Sample Circuit",
+        "Location": {
+            "locality": "Sample City",
+            "country": "Sample Country"
+        }
+    },
+    "date": "2025-01-01",
+    "drivers": [
+        {"driverId": "verstappen", "code": "VER", "givenName": "Max", "familyName": "Verstappen"},
+        {"driverId": "hamilton", "code": "HAM", "givenName": "Lewis", "familyName": "Hamilton"},
+        {"driverId": "leclerc", "code": "LEC", "givenName": "Charles", "familyName": "Leclerc"},
+        {"driverId": "russell", "code": "RUS", "givenName": "George", "familyName": "Russell"},
+        {"driverId": "sainz", "code": "SAI", "givenName": "Carlos", "familyName": "Sainz"}
+    ]
+}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers share its result.
+
+        Returns (result, shared) where shared is True for callers that waited
+        on another thread's call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+            return call['result'], False
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines sharing one event loop.
+
+    fn() runs in its own task, so a caller that is cancelled (its client went
+    away) neither cancels the call nor fails the callers sharing it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Await fn() once per key at a time; returns (result, shared) like SingleFlight.do"""
+        call = self._calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call), True
+
+        call = self._calls[key] = asyncio.ensure_future(self._run(key, fn))
+        call.add_done_callback(self._retrieve_exception)
+        return await asyncio.shield(call), False
+
+    async def _run(self, key, fn):
+        try:
+            return await fn()
+        finally:
+            del self._calls[key]
+
+    @staticmethod
+    def _retrieve_exception(call):
+        # Mark a failure retrieved even if every caller was cancelled before it finished
+        if not call.cancelled():
+            call.exception()
+
+
+class StreamFlight:
+    """Share one event stream per key between concurrent consumers.
+
+    The stream runs on its own thread, so it completes (and is stored) even if
+    the client that started it disconnects. Every consumer, the first one
+    included, replays the events produced so far and then follows along.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def stream(self, key, fn):
+        """Start iterating fn() unless a stream for key is running.
+
+        Returns (events, shared): an iterator over the stream's events and
+        whether it joined one started by another caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = {'events': [], 'done': False, 'changed': threading.Condition()}
+                self._calls[key] = call
+                threading.Thread(target=self._run, args=(key, call, fn), daemon=True).start()
+        return self._follow(call), shared
+
+    def _run(self, key, call, fn):
+        try:
+            for item in fn():
+                with call['changed']:
+                    call['events'].append(item)
+                    call['changed'].notify_all()
+        except Exception as e:
+            logging.error(f"Error in shared stream {key[:12]}: {e}")
+        finally:
+            with self._lock:
+                del self._calls[key]
+            with call['changed']:
+                call['done'] = True
+                call['changed'].notify_all()
+
+    def _follow(self, call):
+        index = 0
+        while True:
+            with call['changed']:
+                while index == len(call['events']) and not call['done']:
+                    call['changed'].wait()
+                events = call['events'][index:]
+                done = call['done']
+            yield from events
+            if done:
+                return
+            index += len(events)
+
+
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+_stream_flights = StreamFlight()
+
+
+def load_race_data(race_id):
+    """Return (race, race_data) for a race id, using sample data when none is stored"""
+    race = db.session.get(F1Data, race_id)
+    if not race:
+        return None, SAMPLE_RACE_DATA
+    return race, race.data_json
+
+
+def prediction_key(race_data, groq_enabled=False):
+    """Content hash of everything the prompt is built from and the model configuration.
+
+    The prompt carries warehouse features (recent form, standings) besides the
+    race data, so newly ingested rounds change the key too.
+    """
+    config = {
+        'gemini_model': GEMINI_MODEL,
+        'groq_model': GROQ_MODEL if groq_enabled else None,
+        # Concurrent insights discuss the race, the other modes discuss the predictions
+        'groq_mode': GROQ_ENRICHMENT_MODE if groq_enabled else None,
+        'temperature': PREDICTION_TEMPERATURE,
+        'prompt_token_budget': PROMPT_TOKEN_BUDGET,
+    }
+    blob = json.dumps({'race_data': race_data, 'features': warehouse_features(race_data), 'config': config},
+                      sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def get_cached_prediction(key):
+    """Return the most recent stored prediction payload for a key, if any"""
+    row = (PredictionRun.query
+           .filter_by(input_hash=key)
+           .order_by(PredictionRun.created_at.desc())
+           .first())
+    return row.payload if row else None
+
+
+def _driver_lookup(race_data):
+    """Map lower-cased full names, family names, codes and ids of a race's drivers to driver ids"""
+    drivers = [entry.get('Driver', {}) for entry in race_data.get('Results') or race_data.get('QualifyingResults') or []]
+    drivers += [driver for driver in race_data.get('drivers', []) if isinstance(driver, dict)]
+    lookup = {}
+    for driver in drivers:
+        driver_id = driver.get('driverId')
+        if not driver_id:
+            continue
+        full_name = f"{driver.get('givenName', '')} {driver.get('familyName', '')}".strip()
+        for name in (full_name, driver.get('familyName'), driver.get('code'), driver_id):
+            if name:
+                lookup.setdefault(name.lower(), driver_id)
+    return lookup
+
+
+def prediction_entries(predictions, race_data=None):
+    """Per-driver PredictionEntry values of a prediction payload"""
+    lookup = _driver_lookup(race_data or {})
+    entries = []
+    for entry in predictions.get('predictions') or []:
+        name = str(entry.get('driver') or 'unknown')
+        key = name.strip().lower()
+        entries.append({
+            'driver_name': name,
+            'driver_key': key,
+            'driver_id': lookup.get(key) or lookup.get(key.split(' ')[-1]),
+            'predicted_position': entry.get('position') if isinstance(entry.get('position'), int) else None,
+            'confidence_score': entry.get('confidence') if isinstance(entry.get('confidence'), (int, float)) else None,
+        })
+    return entries
+
+
+def store_prediction(key, race_id, predictions, race_data=None, tier='llm', model=GEMINI_MODEL):
+    """Persist a prediction run and one indexed row per predicted driver"""
+    try:
+        run = PredictionRun(race_id=race_id, input_hash=key, tier=tier, model=model, payload=predictions)
+        db.session.add(run)
+        db.session.flush()
+        db.session.add_all(PredictionEntry(run_id=run.id, race_id=race_id, created_at=run.created_at, **entry)
+                           for entry in prediction_entries(predictions, race_data))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error storing prediction {key[:12]}: {e}")
+
+
+def record_local_prediction(race_id, race_data, predictions):
+    """Store a local model run for a stored race, once per distinct predicted order"""
+    if race_id is None:
+        return
+    blob = json.dumps({'race_data': race_data, 'model': predictions.get('model'),
+                       'order': predictions.get('finishing_order')},
+                      sort_keys=True, separators=(',', ':'), default=str)
+    key = hashlib.sha256(blob.encode('utf-8')).hexdigest()
+    if PredictionRun.query.filter_by(input_hash=key).first() is None:
+        store_prediction(key, race_id, predictions, race_data, tier='local', model=predictions.get('model'))
+
+
+def attach_groq_insights(key, insights):
+    """Add late-arriving Groq insights to the stored predictions for a key.
+
+    insights is None when the deferred Groq call failed or came back empty;
+    the pending flag is then cleared so clients stop waiting for it.
+    """
+    try:
+        with Session(db.engine) as session:
+            rows = session.query(PredictionRun).filter_by(input_hash=key).all()
+            for row in rows:
+                # Assign a new dict so the JSON column is marked as changed
+                predictions = dict(row.payload)
+                if insights is not None:
+                    predictions['groq_insights'] = insights
+                predictions.pop('groq_insights_pending', None)
+                row.payload = predictions
+            session.commit()
+    except Exception as e:
+        logging.error(f"Error attaching Groq insights to {key[:12]}: {e}")
+
+
+def _deferred_insights_handler(key):
+    """Build a callback that attaches late Groq insights once the prediction is stored.
+
+    Returns (callback, stored_event); set stored_event after storing the row.
+    """
+    app = current_app._get_current_object()
+    stored_event = threading.Event()
+
+    def on_groq_insights(insights):
+        # Deferred insights may arrive before the prediction row is committed
+        stored_event.wait(timeout=60)
+        with app.app_context():
+            attach_groq_insights(key, insights)
+
+    return on_groq_insights, stored_event
+
+
+def _local_if_fallback(predictions, race_data):
+    """Replace static fallback predictions with the local model's, which are never stored either"""
+    if not is_fallback_prediction(predictions):
+        return predictions
+    from local_model import local_predictions
+    local = local_predictions(race_data)
+    if local is None:
+        return predictions
+    local['note'] = "Local model predictions - AI service temporarily unavailable"
+    return local
+
+
+def get_or_generate_predictions(race_id, race_data, gemini_api_key, groq_api_key=None):
+    """Serve predictions from the Prediction table, generating them on a miss.
+
+    Concurrent misses for the same input share a single LLM call. Fallback
+    predictions are returned but never stored, so the next request retries.
+    Returns (predictions, status) where status is 'hit', 'miss' or 'shared'.
+    """
+    key = prediction_key(race_data, groq_enabled=bool(groq_api_key))
+    cached = get_cached_prediction(key)
+    if cached is not None:
+        metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='hit')
+        return cached, 'hit'
+
+    def generate():
+        # Another request may have finished generating while we waited
+        stored = get_cached_prediction(key)
+        if stored is not None:
+            return stored
+        on_groq_insights, stored_event = _deferred_insights_handler(key)
+        predictions = generate_race_predictions(
+            race_data=race_data,
+            gemini_api_key=gemini_api_key,
+            groq_api_key=groq_api_key,
+            on_groq_insights=on_groq_insights
+        )
+        try:
+            if not is_fallback_prediction(predictions):
+                store_prediction(key, race_id, predictions, race_data)
+        finally:
+            stored_event.set()
+        return _local_if_fallback(predictions, race_data)
+
+    predictions, shared = _flights.do(key, generate)
+    metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='shared' if shared else 'miss')
+    return predictions, 'shared' if shared else 'miss'
+
+
+def stream_predictions(race_id, race_data, gemini_api_key, groq_api_key=None):
+    """Yield ('prediction', entry) events followed by ('complete', predictions).
+
+    Cached predictions are replayed immediately; otherwise entries are
+    forwarded as Gemini streams them and the final payload is stored.
+    Concurrent misses for the same input share one Gemini stream.
+    """
+    key = prediction_key(race_data, groq_enabled=bool(groq_api_key))
+    cached = get_cached_prediction(key)
+    if cached is not None:
+        metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='hit')
+        yield from _replay(cached)
+        return
+
+    app = current_app._get_current_object()
+
+    def generate():
+        with app.app_context():
+            # Another stream may have finished and stored it since the lookup
+            stored = get_cached_prediction(key)
+            if stored is not None:
+                yield from _replay(stored)
+                return
+            on_groq_insights, stored_event = _deferred_insights_handler(key)
+            try:
+                for event, data in stream_race_predictions(
+                    race_data=race_data,
+                    gemini_api_key=gemini_api_key,
+                    groq_api_key=groq_api_key,
+                    on_groq_insights=on_groq_insights
+                ):
+                    if event == 'complete' and not is_fallback_prediction(data):
+                        store_prediction(key, race_id, data, race_data)
+                    yield event, data
+            finally:
+                stored_event.set()
+
+    events, shared = _stream_flights.stream(key, generate)
+    metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='shared' if shared else 'miss')
+    yield from events
+
+
+def _replay(predictions):
+    for entry in predictions.get('predictions', []):
+        yield 'prediction', entry
+    yield 'complete', predictions
+
+
+def _attach_in_app_context(app, key, insights):
+    with app.app_context():
+        attach_groq_insights(key, insights)
+
+
+async def get_or_generate_predictions_async(race_id, race_data, gemini_api_key, groq_api_key=None):
+    """Coroutine variant of get_or_generate_predictions for the ASGI serving mode"""
+    # The key reads warehouse features from the database
+    key = await asyncio.to_thread(prediction_key, race_data, bool(groq_api_key))
+    cached = await asyncio.to_thread(get_cached_prediction, key)
+    if cached is not None:
+        metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='hit')
+        return cached, 'hit'
+
+    app = current_app._get_current_object()
+
+    async def generate():
+        stored = await asyncio.to_thread(get_cached_prediction, key)
+        if stored is not None:
+            return stored
+        stored_event = asyncio.Event()
+
+        async def on_groq_insights(insights):
+            # Deferred insights may arrive before the prediction row is committed
+            try:
+                await asyncio.wait_for(stored_event.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.to_thread(_attach_in_app_context, app, key, insights)
+
+        predictions = await generate_race_predictions_async(
+            race_data=race_data,
+            gemini_api_key=gemini_api_key,
+            groq_api_key=groq_api_key,
+            on_groq_insights=on_groq_insights
+        )
+        try:
+            if not is_fallback_prediction(predictions):
+                await asyncio.to_thread(store_prediction, key, race_id, predictions, race_data)
+        finally:
+            stored_event.set()
+        return await asyncio.to_thread(_local_if_fallback, predictions, race_data)
+
+    predictions, shared = await _async_flights.do(key, generate)
+    metrics.inc(metrics.CACHE_LOOKUPS_METRIC, cache='prediction', result='shared' if shared else 'miss')
+    return predictions, 'shared' if shared else 'miss'
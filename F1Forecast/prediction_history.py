@@ -0,0 +1,162 @@
+from datetime import datetime
+
+from sqlalchemy import case, func, select, union
+
+from app import db
+from models import F1Data, PredictionEntry, PredictionRun, RaceResult
+
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 500
+
+
+def _limit(limit):
+    return max(1, min(int(limit or DEFAULT_HISTORY_LIMIT), MAX_HISTORY_LIMIT))
+
+
+def _entry_dict(entry):
+    return {
+        'driver': entry.driver_name,
+        'driver_id': entry.driver_id,
+        'position': entry.predicted_position,
+        'confidence': entry.confidence_score,
+    }
+
+
+def run_history(race_id=None, tier=None, since=None, before_id=None, limit=DEFAULT_HISTORY_LIMIT):
+    """Prediction runs newest first, with their per-driver entries.
+
+    Paginated by run id: pass the returned next_before_id to get the next page.
+    """
+    limit = _limit(limit)
+    query = select(PredictionRun.id, PredictionRun.race_id, PredictionRun.tier, PredictionRun.model,
+                   PredictionRun.created_at)
+    if race_id is not None:
+        query = query.where(PredictionRun.race_id == race_id)
+    if tier:
+        query = query.where(PredictionRun.tier == tier)
+    if since is not None:
+        query = query.where(PredictionRun.created_at >= since)
+    if before_id is not None:
+        query = query.where(PredictionRun.id < before_id)
+    runs = db.session.execute(query.order_by(PredictionRun.id.desc()).limit(limit)).all()
+
+    # One query for the entries of the whole page
+    entries = {}
+    if runs:
+        rows = db.session.execute(
+            select(PredictionEntry)
+            .where(PredictionEntry.run_id.in_([run.id for run in runs]))
+            .order_by(PredictionEntry.run_id, PredictionEntry.predicted_position)
+        ).scalars()
+        for entry in rows:
+            entries.setdefault(entry.run_id, []).append(_entry_dict(entry))
+
+    return {
+        'runs': [{
+            'run_id': run.id,
+            'race_id': run.race_id,
+            'tier': run.tier,
+            'model': run.model,
+            'created_at': run.created_at.isoformat() if run.created_at else None,
+            'predictions': entries.get(run.id, []),
+        } for run in runs],
+        'next_before_id': runs[-1].id if len(runs) == limit else None,
+    }
+
+
+def _driver_entry_ids(match, race_id, tier, since, before_id, limit):
+    """Newest matching entry ids for one driver column, as a walk down its (column, id) index"""
+    query = select(PredictionEntry.id).where(match)
+    if tier:
+        query = query.join(PredictionRun, PredictionEntry.run_id == PredictionRun.id).where(PredictionRun.tier == tier)
+    if race_id is not None:
+        query = query.where(PredictionEntry.race_id == race_id)
+    if since is not None:
+        query = query.where(PredictionEntry.created_at >= since)
+    if before_id is not None:
+        query = query.where(PredictionEntry.id < before_id)
+    page = query.order_by(PredictionEntry.id.desc()).limit(limit).subquery()
+    return select(page.c.id)
+
+
+def driver_history(driver, race_id=None, tier=None, since=None, before_id=None, limit=DEFAULT_HISTORY_LIMIT):
+    """Predictions made for one driver (id or name), newest first, paginated by entry id"""
+    limit = _limit(limit)
+    # A UNION of two index walks rather than an OR, which would scan the whole table
+    ids = union(
+        _driver_entry_ids(PredictionEntry.driver_key == driver.strip().lower(),
+                          race_id, tier, since, before_id, limit),
+        _driver_entry_ids(PredictionEntry.driver_id == driver, race_id, tier, since, before_id, limit),
+    ).subquery()
+    query = (select(PredictionEntry, PredictionRun.tier, PredictionRun.model)
+             .join(PredictionRun, PredictionEntry.run_id == PredictionRun.id)
+             .where(PredictionEntry.id.in_(select(ids.c.id))))
+    rows = db.session.execute(query.order_by(PredictionEntry.id.desc()).limit(limit)).all()
+
+    return {
+        'predictions': [dict(_entry_dict(entry),
+                             entry_id=entry.id,
+                             run_id=entry.run_id,
+                             race_id=entry.race_id,
+                             tier=tier_name,
+                             model=model,
+                             created_at=entry.created_at.isoformat() if entry.created_at else None)
+                        for entry, tier_name, model in rows],
+        'next_before_id': rows[-1][0].id if len(rows) == limit else None,
+    }
+
+
+def prediction_accuracy(season=None, race_id=None, tier=None, include_post_race=False):
+    """Compare stored predictions with actual results, aggregated per tier and model in SQL.
+
+    Only entries whose driver was resolved to an Ergast id and whose race
+    has ingested results are scored. Runs created on or after race day may
+    have seen the results, so they are left out unless include_post_race.
+    """
+    error = func.abs(PredictionEntry.predicted_position - RaceResult.position)
+    query = (select(
+                PredictionRun.tier,
+                PredictionRun.model,
+                func.count(func.distinct(PredictionRun.id)).label('runs'),
+                func.count(PredictionEntry.id).label('entries'),
+                func.avg(error).label('mean_abs_error'),
+                func.sum(case((PredictionEntry.predicted_position == RaceResult.position, 1), else_=0)).label('exact'),
+                func.sum(case(((PredictionEntry.predicted_position <= 3) & (RaceResult.position <= 3), 1),
+                              else_=0)).label('podium_hits'),
+                func.sum(case((PredictionEntry.predicted_position <= 3, 1), else_=0)).label('podium_picks'),
+                func.sum(case(((PredictionEntry.predicted_position == 1) & (RaceResult.position == 1), 1),
+                              else_=0)).label('winner_hits'),
+                func.sum(case((PredictionEntry.predicted_position == 1, 1), else_=0)).label('winner_picks'))
+             .join(PredictionRun, PredictionEntry.run_id == PredictionRun.id)
+             .join(RaceResult, (RaceResult.race_id == PredictionEntry.race_id) &
+                   (RaceResult.driver_id == PredictionEntry.driver_id))
+             .join(F1Data, F1Data.id == PredictionEntry.race_id)
+             .group_by(PredictionRun.tier, PredictionRun.model))
+    if not include_post_race:
+        # race_date holds the race day only, so this keeps runs made before race day
+        query = query.where(PredictionRun.created_at < F1Data.race_date)
+    if season is not None:
+        query = query.where(F1Data.season == season)
+    if race_id is not None:
+        query = query.where(PredictionEntry.race_id == race_id)
+    if tier:
+        query = query.where(PredictionRun.tier == tier)
+
+    models = []
+    for row in db.session.execute(query).all():
+        models.append({
+            'tier': row.tier,
+            'model': row.model,
+            'runs': row.runs,
+            'scored_predictions': row.entries,
+            'mean_abs_position_error': round(float(row.mean_abs_error), 3) if row.mean_abs_error is not None else None,
+            'exact_position_rate': round(row.exact / row.entries, 4) if row.entries else None,
+            'podium_precision': round(row.podium_hits / row.podium_picks, 4) if row.podium_picks else None,
+            'winner_accuracy': round(row.winner_hits / row.winner_picks, 4) if row.winner_picks else None,
+        })
+    return {'models': models}
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime query parameter; raises ValueError if malformed"""
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,174 @@
+"""Opt-in sampling profiler for slow requests.
+
+While enabled, a single background thread samples the stacks of every
+thread serving a request each interval and counts them as folded stacks.
+When a request finishes slower than the threshold its samples are kept,
+and can be downloaded in the folded format read by flamegraph.pl and
+speedscope. Async views share the event loop thread, so their samples
+include any coroutines interleaved with them.
+
+Settings changed through configure() are written to a signal file that
+every worker process checks at the start of each request, so a toggle
+reaches all workers rather than only the one that served it.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import itertools
+import threading
+from collections import Counter, deque
+
+PROFILE_SLOW_REQUESTS = os.environ.get("PROFILE_SLOW_REQUESTS", "").lower() in ('1', 'true', 'yes')
+PROFILE_THRESHOLD_MS = float(os.environ.get("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_PROFILES = int(os.environ.get("PROFILE_MAX_PROFILES", "50"))
+# Shared by the workers of a host; delete it to fall back to the settings above
+PROFILE_SIGNAL_PATH = os.environ.get(
+    "PROFILE_SIGNAL_PATH", os.path.join(tempfile.gettempdir(), "f1_profiler.signal")
+)
+# Bearer token for the /api/profiler endpoints, which are disabled without one
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN")
+MAX_STACK_DEPTH = 128
+
+
+def fold_stack(frame):
+    """Render a frame and its callers as 'outer;...;inner' for flame graphs"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, enabled=False, threshold_ms=500.0, interval_ms=5.0, max_profiles=50, signal_path=None):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.signal_path = signal_path
+        self._signal_version = None
+        self._lock = threading.Lock()
+        self._active = {}  # Request token -> (thread ident, sample counts)
+        self._has_active = threading.Event()
+        self._profiles = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._tokens = itertools.count(1)
+        self._thread = None
+
+    def _apply(self, enabled=None, threshold_ms=None, interval_ms=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if threshold_ms is not None:
+                self.threshold_ms = max(0.0, float(threshold_ms))
+            if interval_ms is not None:
+                self.interval_ms = max(1.0, float(interval_ms))
+            return {'enabled': self.enabled, 'threshold_ms': self.threshold_ms, 'interval_ms': self.interval_ms}
+
+    def configure(self, enabled=None, threshold_ms=None, interval_ms=None):
+        """Change the settings here and, through the signal file, in every other worker"""
+        self.sync()
+        settings = self._apply(enabled, threshold_ms, interval_ms)
+        if self.signal_path is not None:
+            try:
+                with open(self.signal_path, 'w') as f:
+                    json.dump(settings, f)
+                self._signal_version = os.stat(self.signal_path).st_mtime_ns
+            except OSError as e:
+                logging.error(f"Error signalling profiler settings: {e}")
+        return self.status()
+
+    def sync(self):
+        """Apply settings written to the signal file by another worker since the last check"""
+        if self.signal_path is None:
+            return
+        try:
+            version = os.stat(self.signal_path).st_mtime_ns
+        except OSError:
+            return
+        if version == self._signal_version:
+            return
+        try:
+            with open(self.signal_path) as f:
+                settings = json.load(f)
+            self._apply(**{key: settings.get(key) for key in ('enabled', 'threshold_ms', 'interval_ms')})
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable profiler signal file: {e}")
+        self._signal_version = version
+
+    def start_request(self):
+        """Start sampling the calling thread; returns a token for finish_request, or None if disabled"""
+        self.sync()
+        if not self.enabled:
+            return None
+        # One token per request: async views share their event loop thread
+        token = next(self._tokens)
+        with self._lock:
+            self._active[token] = (threading.get_ident(), Counter())
+            self._has_active.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name='f1-profiler', daemon=True)
+                self._thread.start()
+        return token
+
+    def finish_request(self, token, duration, **details):
+        """Stop sampling a request, keeping its samples if it ran past the threshold"""
+        if token is None:
+            return
+        with self._lock:
+            _, samples = self._active.pop(token, (None, None))
+            if not self._active:
+                self._has_active.clear()
+            if not samples or duration * 1000 < self.threshold_ms:
+                return
+            self._profiles.append(dict(details,
+                                       id=next(self._ids),
+                                       finished_at=time.time(),
+                                       duration_ms=round(duration * 1000, 1),
+                                       samples=sum(samples.values()),
+                                       stacks=samples))
+
+    def _sample_loop(self):
+        while self.enabled:
+            if not self._has_active.wait(timeout=1.0):
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.values():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[fold_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval_ms / 1000)
+
+    def status(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'threshold_ms': self.threshold_ms,
+                'interval_ms': self.interval_ms,
+                'active_requests': len(self._active),
+                'profiles': [{key: value for key, value in profile.items() if key != 'stacks'}
+                             for profile in reversed(self._profiles)],
+            }
+
+    def folded(self, profile_id):
+        """Return a kept profile as folded stack lines, or None if it is no longer kept"""
+        with self._lock:
+            for profile in self._profiles:
+                if profile['id'] == profile_id:
+                    return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].most_common())
+        return None
+
+
+profiler = SamplingProfiler(
+    enabled=PROFILE_SLOW_REQUESTS,
+    threshold_ms=PROFILE_THRESHOLD_MS,
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_profiles=PROFILE_MAX_PROFILES,
+    signal_path=PROFILE_SIGNAL_PATH,
+)
@@ -0,0 +1,218 @@
+import os
+import math
+import logging
+
+from flask import has_app_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, RaceResult, DriverStanding
+
+# Upper bound for a whole prompt, in (estimated) tokens
+PROMPT_TOKEN_BUDGET = int(os.environ.get("GEMINI_PROMPT_TOKEN_BUDGET", "2000"))
+# 'estimate' uses a local heuristic; 'api' asks Gemini for an exact count
+TOKEN_COUNT_MODE = os.environ.get("GEMINI_TOKEN_COUNT", "estimate")
+CHARS_PER_TOKEN = 4
+FORM_RACES = 3
+MIN_DRIVER_ROWS = 5
+
+# Column order in the driver table; optional columns are dropped left to right
+# when the context does not fit the budget
+CONTEXT_COLUMNS = ('drv', 'team', 'grid', 'fin', 'status', 'form', 'pts', 'dpts')
+OPTIONAL_COLUMNS = ('status', 'form', 'team', 'dpts')
+
+
+class PromptBudgetExceeded(ValueError):
+    """The race context cannot be trimmed to fit the prompt token budget"""
+
+
+def estimate_tokens(text):
+    """Approximate the token count of a text without calling the API"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_tokens(text, client=None, model=None):
+    """Count prompt tokens, exactly via the API when configured, else by estimate"""
+    if TOKEN_COUNT_MODE == 'api' and client is not None and model:
+        try:
+            return client.models.count_tokens(model=model, contents=text).total_tokens
+        except Exception as e:
+            logging.error(f"Error counting tokens: {e}")
+    return estimate_tokens(text)
+
+
+def _driver_label(driver):
+    return driver.get('code') or driver.get('familyName') or driver.get('driverId', '')
+
+
+def driver_rows(race_data):
+    """Project the per-driver entries of a race payload to the fields worth sending"""
+    rows = []
+    for result in race_data.get('Results', []):
+        driver = result.get('Driver', {})
+        rows.append({
+            'id': driver.get('driverId'),
+            'drv': _driver_label(driver),
+            'team': result.get('Constructor', {}).get('constructorId'),
+            'grid': result.get('grid'),
+            'fin': result.get('positionText'),
+            'status': result.get('status') if result.get('status') != 'Finished' else None,
+        })
+    if rows:
+        return rows
+
+    for entry in race_data.get('QualifyingResults', []):
+        driver = entry.get('Driver', {})
+        rows.append({
+            'id': driver.get('driverId'),
+            'drv': _driver_label(driver),
+            'team': entry.get('Constructor', {}).get('constructorId'),
+            'grid': entry.get('position'),
+        })
+    if rows:
+        return rows
+
+    for driver in race_data.get('drivers', []):
+        if isinstance(driver, dict):
+            rows.append({'id': driver.get('driverId'), 'drv': _driver_label(driver),
+                         'team': driver.get('team')})
+        else:
+            rows.append({'id': None, 'drv': str(driver)})
+    return rows
+
+
+def _season_round(race_data):
+    try:
+        return int(race_data['season']), int(race_data['round'])
+    except (KeyError, TypeError, ValueError):
+        return None, None
+
+
+def _recent_form(session, season, round_number):
+    """Finishing positions of each driver in the previous FORM_RACES rounds, latest first"""
+    rows = session.execute(
+        select(RaceResult.driver_id, RaceResult.position_text)
+        .join(F1Data, RaceResult.race_id == F1Data.id)
+        .where(F1Data.season == season,
+               F1Data.round_number < round_number,
+               F1Data.round_number >= round_number - FORM_RACES)
+        .order_by(F1Data.round_number.desc())
+    ).all()
+    form = {}
+    for driver_id, position_text in rows:
+        form.setdefault(driver_id, []).append(position_text or '-')
+    return form
+
+
+def _standings_deltas(session, season, round_number):
+    """Championship points before this round and the points gained in the previous round"""
+    rows = session.execute(
+        select(DriverStanding.driver_id, DriverStanding.round_number, DriverStanding.points)
+        .where(DriverStanding.season == season,
+               DriverStanding.round_number.in_((round_number - 1, round_number - 2)))
+    ).all()
+    latest, previous = {}, {}
+    for driver_id, standing_round, points in rows:
+        (latest if standing_round == round_number - 1 else previous)[driver_id] = points
+    return {driver_id: (points, points - previous.get(driver_id, 0.0))
+            for driver_id, points in latest.items()}
+
+
+def warehouse_features(race_data):
+    """Recent form and standings deltas per driver id from the local warehouse; {} when unavailable"""
+    season, round_number = _season_round(race_data)
+    if season is None or not has_app_context():
+        return {}
+    try:
+        with Session(db.engine) as session:
+            form = _recent_form(session, season, round_number)
+            standings = _standings_deltas(session, season, round_number)
+    except Exception as e:
+        logging.error(f"Error loading warehouse features for {season} round {round_number}: {e}")
+        return {}
+
+    features = {}
+    for driver_id, positions in form.items():
+        features.setdefault(driver_id, {})['form'] = ','.join(positions)
+    for driver_id, (points, delta) in standings.items():
+        features.setdefault(driver_id, {}).update(pts=f"{points:g}", dpts=f"{delta:+g}")
+    return features
+
+
+def _grid_order(row):
+    try:
+        grid = int(row.get('grid'))
+    except (TypeError, ValueError):
+        return 99
+    # Ergast reports pit lane starts as grid 0
+    return grid if grid > 0 else 98
+
+
+def _race_header(race_data):
+    circuit = race_data.get('Circuit') or race_data.get('circuit') or {}
+    if isinstance(circuit, dict):
+        location = circuit.get('Location', {})
+        circuit = ', '.join(filter(None, [circuit.get('circuitName') or circuit.get('name'),
+                                          location.get('locality'), location.get('country')]))
+    fields = [race_data.get('raceName') or race_data.get('race_name'), circuit,
+              race_data.get('date')]
+    if race_data.get('season'):
+        fields.append(f"{race_data['season']} R{race_data.get('round', '?')}")
+    return 'race: ' + ' | '.join(str(field) for field in fields if field)
+
+
+def _extra_lines(race_data):
+    """Scalar conditions (weather, track temperature, ...) as key=value pairs"""
+    skip = {'Results', 'QualifyingResults', 'drivers', 'Circuit', 'circuit', 'raceName', 'race_name',
+            'date', 'season', 'round', 'url', 'time'}
+    pairs = [f"{key}={value}" for key, value in race_data.items()
+             if key not in skip and isinstance(value, (str, int, float, bool))]
+    return ['conditions: ' + '; '.join(pairs)] if pairs else []
+
+
+def _render(header, extra, rows, columns):
+    lines = [header, *extra, '|'.join(columns)]
+    for row in rows:
+        lines.append('|'.join('' if row.get(column) is None else str(row[column]) for column in columns))
+    return '\n'.join(lines)
+
+
+def compact_race_context(race_data, token_budget=PROMPT_TOKEN_BUDGET):
+    """Encode race data as a compact pipe-delimited table for an LLM prompt.
+
+    Keeps the race header, scalar conditions and one row per driver (grid,
+    result, recent form, championship points and last-round points delta).
+    If the encoding exceeds token_budget, optional columns are dropped, then
+    the back of the grid is trimmed and finally the conditions line; raises
+    PromptBudgetExceeded when even that does not fit.
+    """
+    rows = driver_rows(race_data)
+    features = warehouse_features(race_data)
+    for row in rows:
+        row.update(features.get(row['id'], {}))
+    rows.sort(key=_grid_order)
+
+    header = _race_header(race_data)
+    extra = _extra_lines(race_data)
+    columns = [column for column in CONTEXT_COLUMNS if any(row.get(column) is not None for row in rows)]
+    text = _render(header, extra, rows, columns)
+
+    for column in OPTIONAL_COLUMNS:
+        if estimate_tokens(text) <= token_budget:
+            break
+        if column in columns:
+            columns.remove(column)
+            text = _render(header, extra, rows, columns)
+
+    while estimate_tokens(text) > token_budget and len(rows) > MIN_DRIVER_ROWS:
+        rows = rows[:max(MIN_DRIVER_ROWS, len(rows) * 3 // 4)]
+        text = _render(header, extra, rows, columns)
+
+    if estimate_tokens(text) > token_budget and extra:
+        extra = []
+        text = _render(header, extra, rows, columns)
+
+    if estimate_tokens(text) > token_budget:
+        raise PromptBudgetExceeded(f"Race context needs {estimate_tokens(text)} tokens, over the {token_budget} budget")
+    return text
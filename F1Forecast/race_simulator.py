@@ -0,0 +1,313 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: simulations are then only serialized within a process
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, LapTime, RaceResult
+from local_model import ELO_SCALE, field_strengths, get_model, safety_car_rate
+import simulation
+
+DEFAULT_SIMULATIONS = int(os.environ.get("SIM_DEFAULT_RUNS", "5000"))
+MAX_SIMULATIONS = int(os.environ.get("SIM_MAX_RUNS", "10000"))
+# Cap on the runs of one request including the strategy comparison, which re-runs the race per strategy
+MAX_TOTAL_SIMULATIONS = int(os.environ.get("SIM_MAX_TOTAL_RUNS", "20000"))
+# Simulations running at once across every worker process of the host, each using the SIM_WORKERS pool
+SIM_CONCURRENCY = int(os.environ.get("SIM_CONCURRENCY", "1"))
+# How long a request waits for a free simulation slot before it is turned away
+SIM_QUEUE_TIMEOUT = float(os.environ.get("SIM_QUEUE_TIMEOUT", "10"))  # seconds
+SIM_LOCK_DIR = os.environ.get("SIM_LOCK_DIR", tempfile.gettempdir())
+# Simulations per chunk; chunks are spread over SIM_WORKERS processes
+SIM_CHUNK_SIZE = int(os.environ.get("SIM_CHUNK_SIZE", "2000"))
+SIM_WORKERS = int(os.environ.get("SIM_WORKERS", str(os.cpu_count() or 1)))
+PIT_LOSS = float(os.environ.get("SIM_PIT_LOSS", "22.0"))  # seconds
+DEFAULT_LAPS = 57
+DEFAULT_BASE_LAP = 90.0  # seconds
+DEFAULT_SIGMA = 0.6  # seconds of lap-to-lap variation
+DEFAULT_DNF_PROBABILITY = 0.08
+# Lap time gap per ELO_SCALE rating points, used when a driver has no stored laps
+SECONDS_PER_RATING_SCALE = 0.8
+# Laps slower than this multiple of the race median (pit laps, safety cars) are not pace samples
+CLEAN_LAP_FACTOR = 1.07
+PACE_RACES = 5
+# Weight of the prior retirement rate, in races
+DNF_PRIOR_RACES = 5
+
+_pool = None
+_slot_lock = threading.Semaphore(SIM_CONCURRENCY)
+
+
+class SimulatorBusy(Exception):
+    """Raised when no simulation slot frees up within SIM_QUEUE_TIMEOUT"""
+
+
+@contextmanager
+def simulation_slot(timeout=None):
+    """Hold one of the host-wide SIM_CONCURRENCY simulation slots.
+
+    Slots are exclusive locks on files in SIM_LOCK_DIR, so every gunicorn
+    worker shares them and at most SIM_CONCURRENCY x SIM_WORKERS processes
+    simulate at once, however many workers the server runs.
+    """
+    deadline = time.monotonic() + (SIM_QUEUE_TIMEOUT if timeout is None else timeout)
+    if fcntl is None:
+        if not _slot_lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise SimulatorBusy("All simulation slots are busy")
+        try:
+            yield
+        finally:
+            _slot_lock.release()
+        return
+
+    while True:
+        for slot in range(SIM_CONCURRENCY):
+            handle = open(os.path.join(SIM_LOCK_DIR, f"f1_simulation.{slot}.lock"), 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+            return
+        if time.monotonic() >= deadline:
+            raise SimulatorBusy("All simulation slots are busy")
+        time.sleep(0.05)
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        # spawn keeps worker processes free of the app's threads and connections
+        _pool = ProcessPoolExecutor(max_workers=SIM_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _recent_laps(session, driver_ids, circuit_id):
+    """Clean laps of the given drivers in the latest stored races, with each race's median lap"""
+    races = session.execute(
+        select(F1Data.id, F1Data.circuit_id)
+        .where(F1Data.id.in_(select(LapTime.race_id).distinct()))
+        .order_by(F1Data.season.desc(), F1Data.round_number.desc())
+        .limit(PACE_RACES)
+    ).all()
+    if not races:
+        return pd.DataFrame(columns=['race_id', 'driver_id', 'seconds', 'race_median']), None
+    rows = session.execute(
+        select(LapTime.race_id, LapTime.driver_id, LapTime.milliseconds)
+        .where(LapTime.race_id.in_([race_id for race_id, _ in races]), LapTime.milliseconds > 0)
+    ).all()
+    laps = pd.DataFrame(rows, columns=['race_id', 'driver_id', 'milliseconds'])
+    laps['seconds'] = laps['milliseconds'] / 1000.0
+    laps['race_median'] = laps.groupby('race_id')['seconds'].transform('median')
+    laps = laps[laps['seconds'] < laps['race_median'] * CLEAN_LAP_FACTOR]
+
+    # The latest race at this circuit sets the base lap time
+    base_lap = None
+    for race_id, race_circuit in races:
+        medians = laps.loc[laps['race_id'] == race_id, 'race_median']
+        if race_circuit == circuit_id and not medians.empty:
+            base_lap = float(medians.iloc[0])
+            break
+    return laps[laps['driver_id'].isin(driver_ids)], base_lap
+
+
+def _retirement_rates(session, driver_ids):
+    rows = session.execute(
+        select(RaceResult.driver_id, RaceResult.status)
+        .where(RaceResult.driver_id.in_(driver_ids))
+    ).all()
+    results = pd.DataFrame(rows, columns=['driver_id', 'status'])
+    if results.empty:
+        return {}
+    status = results['status'].fillna('')
+    results['retired'] = ~(status.eq('Finished') | status.str.contains(r'Lap', regex=True))
+    stats = results.groupby('driver_id')['retired'].agg(['sum', 'size'])
+    rates = (stats['sum'] + DEFAULT_DNF_PROBABILITY * DNF_PRIOR_RACES) / (stats['size'] + DNF_PRIOR_RACES)
+    return rates.to_dict()
+
+
+def _race_laps(race_data):
+    laps = [int(result['laps']) for result in race_data.get('Results', [])
+            if str(result.get('laps', '')).isdigit()]
+    return max(laps) if laps and max(laps) > 0 else DEFAULT_LAPS
+
+
+def simulation_inputs(race_data):
+    """Build the simulate_chunk parameters of a race from the warehouse.
+
+    Pace is each driver's median clean-lap gap to the race median over the
+    latest races with stored laps, falling back to the local rating model;
+    retirement rates come from stored result statuses and the safety car
+    probability from the circuit's incident history. Returns (field, params).
+    """
+    model = get_model()
+    field = field_strengths(race_data, model)
+    if field.empty:
+        return field, None
+    circuit = race_data.get('Circuit') or {}
+    driver_ids = [driver_id for driver_id in field['driver_id'] if driver_id]
+
+    with Session(db.engine) as session:
+        laps, base_lap = _recent_laps(session, driver_ids, circuit.get('circuitId') if isinstance(circuit, dict) else None)
+        retirement = _retirement_rates(session, driver_ids)
+
+    rating_pace = -(field['strength'] - field['strength'].mean()) / ELO_SCALE * SECONDS_PER_RATING_SCALE
+    if laps.empty:
+        pace, sigma = rating_pace, pd.Series(DEFAULT_SIGMA, index=field.index)
+    else:
+        gaps = (laps.assign(gap=laps['seconds'] - laps['race_median'])
+                .groupby(['driver_id', 'race_id'])['gap'].agg(['median', 'std'])
+                .groupby('driver_id').mean())
+        measured = field['driver_id'].map(gaps['median'])
+        pace = measured.fillna(rating_pace)
+        sigma = field['driver_id'].map(gaps['std']).fillna(DEFAULT_SIGMA)
+
+    start = field['grid'].to_numpy()
+    if np.isnan(start).all():
+        start = np.empty(len(field))
+        start[np.argsort(-field['strength'].to_numpy(), kind='stable')] = np.arange(len(field))
+    else:
+        start = np.argsort(np.argsort(np.where(np.isnan(start), np.inf, start), kind='stable'), kind='stable')
+
+    laps_in_race = _race_laps(race_data)
+    params = {
+        'pace': pace.to_numpy(dtype=np.float64),
+        'sigma': sigma.to_numpy(dtype=np.float64),
+        'dnf_probability': field['driver_id'].map(retirement).fillna(DEFAULT_DNF_PROBABILITY).to_numpy(dtype=np.float64),
+        'start_order': np.asarray(start, dtype=np.float64),
+        'laps': laps_in_race,
+        'base_lap': base_lap or DEFAULT_BASE_LAP,
+        'pit_loss': PIT_LOSS,
+        'safety_car_probability': safety_car_rate(race_data, model),
+        'plans': np.stack([simulation.strategy_plan(stints, laps_in_race)
+                           for stints in simulation.STRATEGIES.values()]),
+        'strategy': None,
+    }
+    return field, params
+
+
+def _run(params, simulations, seed):
+    """Run simulations in chunks, in worker processes when there is more than one chunk"""
+    global _pool
+    chunks = [min(SIM_CHUNK_SIZE, simulations - start) for start in range(0, simulations, SIM_CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if len(chunks) == 1 or SIM_WORKERS <= 1:
+        return simulation.merge_results([simulation.simulate_chunk(params, size, chunk_seed)
+                                         for size, chunk_seed in zip(chunks, seeds)])
+    try:
+        futures = [_executor().submit(simulation.simulate_chunk, params, size, chunk_seed)
+                   for size, chunk_seed in zip(chunks, seeds)]
+        return simulation.merge_results([future.result() for future in futures])
+    except BrokenProcessPool as e:
+        logging.error(f"Simulation worker pool failed, running in process: {e}")
+        _pool = None
+        return simulation.merge_results([simulation.simulate_chunk(params, size, chunk_seed)
+                                         for size, chunk_seed in zip(chunks, seeds)])
+
+
+def _position_summary(field, result, simulations):
+    probabilities = result['position_counts'] / simulations
+    places = np.arange(1, len(field) + 1)
+    drivers = []
+    for i, name in enumerate(field['name']):
+        drivers.append({
+            'driver': name,
+            'driver_id': field['driver_id'].iloc[i],
+            'mean_position': round(float(probabilities[i] @ places), 2),
+            'win_probability': round(float(probabilities[i, 0]), 4),
+            'podium_probability': round(float(probabilities[i, :3].sum()), 4),
+            'points_probability': round(float(probabilities[i, :10].sum()), 4),
+            'dnf_probability': round(float(result['dnf'][i] / simulations), 4),
+            'position_distribution': [round(float(p), 4) for p in probabilities[i]],
+        })
+    return sorted(drivers, key=lambda driver: driver['mean_position'])
+
+
+def _strategy_comparison(field, params, driver_index, simulations, seed):
+    """Race each candidate strategy for one driver against the same random draws"""
+    comparison = []
+    others = np.random.default_rng(seed).integers(0, len(simulation.STRATEGIES), size=len(field))
+    for index, name in enumerate(simulation.STRATEGIES):
+        strategy = others.copy()
+        strategy[driver_index] = index
+        # Common random numbers: every strategy sees the same seed, so differences come from the strategy
+        result = _run(dict(params, strategy=strategy), simulations, seed)
+        probabilities = result['position_counts'][driver_index] / simulations
+        finishers = max(int(result['finishers'][driver_index]), 1)
+        comparison.append({
+            'strategy': name,
+            'stints': [compound for compound, _ in simulation.STRATEGIES[name]],
+            'mean_position': round(float(probabilities @ np.arange(1, len(field) + 1)), 2),
+            'win_probability': round(float(probabilities[0]), 4),
+            'podium_probability': round(float(probabilities[:3].sum()), 4),
+            'mean_race_time': round(float(result['race_time_sum'][driver_index] / finishers), 1),
+        })
+    return sorted(comparison, key=lambda entry: entry['mean_position'])
+
+
+def simulate_race(race_data, simulations=DEFAULT_SIMULATIONS, driver_id=None, seed=None):
+    """Monte Carlo finishing-position distributions and a strategy comparison for a race.
+
+    Strategies are compared for driver_id, or the strongest driver when not
+    given, with the runs left under MAX_TOTAL_SIMULATIONS split between them.
+    Returns None when the race names no drivers; raises SimulatorBusy when
+    no simulation slot frees up in time.
+    """
+    started = time.perf_counter()
+    simulations = max(1, min(int(simulations), MAX_SIMULATIONS, MAX_TOTAL_SIMULATIONS // 2))
+    strategy_simulations = max(1, min(simulations, (MAX_TOTAL_SIMULATIONS - simulations) // len(simulation.STRATEGIES)))
+    seed = int(seed) if seed is not None else int(np.random.SeedSequence().entropy % (2 ** 32))
+    field, params = simulation_inputs(race_data)
+    if params is None:
+        return None
+
+    if driver_id is not None and driver_id in set(field['driver_id']):
+        driver_index = int(np.flatnonzero(field['driver_id'].to_numpy() == driver_id)[0])
+    else:
+        driver_index = int(field['strength'].to_numpy().argmax())
+
+    with simulation_slot():
+        result = _run(params, simulations, seed)
+        strategies = _strategy_comparison(field, params, driver_index, strategy_simulations, seed)
+
+    return {
+        'simulations': simulations,
+        'strategy_simulations': strategy_simulations,
+        'seed': seed,
+        'laps': params['laps'],
+        'safety_car_probability': round(result['safety_car_races'] / simulations, 4),
+        'drivers': _position_summary(field, result, simulations),
+        'strategy_driver': field['name'].iloc[driver_index],
+        'strategies': strategies,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def run_simulation(race_data, simulations=DEFAULT_SIMULATIONS, driver_id=None, seed=None):
+    """simulate_race that logs and returns None instead of raising, except for SimulatorBusy"""
+    try:
+        return simulate_race(race_data, simulations, driver_id, seed)
+    except SimulatorBusy:
+        raise
+    except Exception as e:
+        logging.error(f"Error simulating race: {e}")
+        return None
@@ -1,33 +1,53 @@
-from flask import render_template, request, jsonify, flash, redirect, url_for
-from app import app, db
-from models import APISettings, F1Data, Prediction
-import json
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, Response
+from app import db
+from models import APISettings, F1Data
+import hmac
 import logging
-from f1_data import get_current_season_data, get_driver_standings, get_race_results
-from ai_predictions import generate_race_predictions, analyze_driver_performance
+from f1_data import (
+    get_current_season_data, get_driver_standings, get_constructor_standings, get_race_results,
+    race_results_columns, get_driver_career_stats,
+)
+from ai_predictions import analyze_driver_performance, stream_driver_analysis
+from prediction_cache import (
+    load_race_data, get_or_generate_predictions, get_cached_prediction, prediction_key, stream_predictions,
+    record_local_prediction,
+)
+from sse import format_event, event_stream_response
+from negotiation import negotiated_response, not_modified_response, payload_etag
+from page_cache import render_analytics, page_cache_stats
+from prediction_history import (
+    run_history, driver_history, prediction_accuracy, parse_since, DEFAULT_HISTORY_LIMIT,
+)
+from batch_analysis import normalize_drivers, batch_analyses, iter_batch_analyses
+from settings_cache import get_api_settings, invalidate_api_settings, settings_cache_stats
+import jobs
+import ergast_cache
+import http_client
+import metrics
+from profiler import profiler, PROFILE_ADMIN_TOKEN
 
-@app.route('/')
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/analytics')
+@bp.route('/analytics')
 def analytics():
     try:
-        # Get current season data
-        current_data = get_current_season_data()
-        driver_standings = get_driver_standings()
+        # Fetch season schedule and standings concurrently
+        data = http_client.fan_out({
+            'current_data': get_current_season_data,
+            'driver_standings': get_driver_standings,
+            'constructor_standings': get_constructor_standings,
+        })
         
-        return render_template('analytics.html', 
-                             current_data=current_data,
-                             driver_standings=driver_standings)
+        return render_analytics(data['current_data'], data['driver_standings'], data['constructor_standings'])
     except Exception as e:
         logging.error(f"Error loading analytics: {e}")
-        return render_template('analytics.html', 
-                             current_data=None,
-                             driver_standings=None,
-                             error="Failed to load F1 data")
+        return render_analytics(None, None, None, error="Failed to load F1 data")
 
-@app.route('/settings', methods=['GET', 'POST'])
+@bp.route('/settings', methods=['GET', 'POST'])
 def settings():
     if request.method == 'POST':
         try:
@@ -43,77 +63,218 @@ def settings():
             settings.gemini_api_key = gemini_key
             settings.groq_api_key = groq_key
             db.session.commit()
+            invalidate_api_settings()
             
             flash('API keys saved successfully!', 'success')
-            return redirect(url_for('settings'))
+            return redirect(url_for('main.settings'))
             
         except Exception as e:
             logging.error(f"Error saving settings: {e}")
             flash('Failed to save settings. Please try again.', 'error')
     
     # Get current settings
-    settings = APISettings.query.first()
+    settings = get_api_settings()
     return render_template('settings.html', settings=settings)
 
-@app.route('/api/race-data/<int:season>/<int:round_num>')
+def race_data_not_modified(season, round_num):
+    """Return (304 response or None, results_hash) for a race-data request.
+
+    Ingested rounds carry a content hash, so unchanged data is answered
+    before it is loaded. Shared with the ASGI view in asgi.py.
+    """
+    race = F1Data.query.filter_by(season=season, round_number=round_num).first()
+    results_hash = race.results_hash if race else None
+    if results_hash:
+        return not_modified_response(results_hash, columnar=True), results_hash
+    return None, None
+
+def race_data_response(race_data, results_hash=None):
+    """Negotiated race-data response, tagged with the stored results hash when there is one"""
+    if not race_data:
+        return jsonify(race_data)
+    return negotiated_response(race_data, etag=results_hash or payload_etag(race_data), columnar=race_results_columns)
+
+@bp.route('/api/race-data/<int:season>/<int:round_num>')
 def get_race_data(season, round_num):
     try:
-        race_data = get_race_results(season, round_num)
-        return jsonify(race_data)
+        not_modified, results_hash = race_data_not_modified(season, round_num)
+        if not_modified is not None:
+            return not_modified
+        return race_data_response(get_race_results(season, round_num), results_hash)
     except Exception as e:
         logging.error(f"Error fetching race data: {e}")
         return jsonify({'error': 'Failed to fetch race data'}), 500
 
-@app.route('/api/predictions/<int:race_id>')
+@bp.route('/api/lap-times/<int:season>/<int:round_num>')
+def get_lap_time_columns(season, round_num):
+    """Return all lap times of a race as columnar arrays"""
+    # pandas-backed modules are imported on first use so workers boot without them
+    import lap_data
+    try:
+        frame = lap_data.lap_frame(season, round_num)
+        return negotiated_response(
+            lambda: {'season': season, 'round': round_num, 'columns': lap_data.frame_to_columns(frame)},
+            etag=lap_data.frame_etag(frame)
+        )
+    except Exception as e:
+        logging.error(f"Error fetching lap times: {e}")
+        return jsonify({'error': 'Failed to fetch lap times'}), 500
+
+PREDICTION_TIERS = ('local', 'llm', 'auto')
+
+def _local_prediction_response(race, race_data, upgrade_job_id=None):
+    """Serve the local model's ranking; None when it cannot rank the race"""
+    from local_model import local_predictions
+    predictions = local_predictions(race_data)
+    if predictions is None:
+        return None
+    record_local_prediction(race.id if race else None, race_data, predictions)
+    if upgrade_job_id is not None:
+        # LLM predictions are generated in the background; clients follow the job for the upgrade
+        predictions = dict(predictions, upgrade=_job_links(upgrade_job_id))
+    response = jsonify(predictions)
+    response.headers['X-Prediction-Tier'] = 'local'
+    return response
+
+def predictions_before_llm(race_id):
+    """Answer a predictions request as far as possible without waiting for the LLM.
+
+    tier=local uses only the local rating model and tier=llm waits for the LLM;
+    tier=auto answers from the LLM cache, else from the local model while the
+    LLM runs as a job. Returns (response, None) when the request is answered,
+    or (None, (race_id, race_data, settings)) when the caller must generate
+    LLM predictions. Shared with the ASGI view in asgi.py.
+    """
+    tier = request.args.get('tier', 'auto')
+    if tier not in PREDICTION_TIERS:
+        return (jsonify({'error': f'tier must be one of {", ".join(PREDICTION_TIERS)}'}), 400), None
+    settings = get_api_settings()
+    has_keys = bool(settings and settings.gemini_api_key)
+    if tier == 'llm' and not has_keys:
+        return (jsonify({'error': 'API keys not configured'}), 400), None
+
+    # Use stored race data, or sample data if none exists
+    race, race_data = load_race_data(race_id)
+
+    if tier == 'local' or not has_keys:
+        response = _local_prediction_response(race, race_data)
+        if response is None:
+            return (jsonify({'error': 'Local model could not rank this race'}), 500), None
+        return response, None
+
+    if tier == 'auto':
+        key = prediction_key(race_data, groq_enabled=bool(settings.groq_api_key))
+        cached = get_cached_prediction(key)
+        if cached is not None:
+            return llm_predictions_response(cached, 'hit'), None
+        upgrade_job_id = jobs.submit_job_once('predictions', key, race_id=race_id)
+        response = _local_prediction_response(race, race_data, upgrade_job_id)
+        if response is not None:
+            return response, None
+    return None, (race.id if race else None, race_data, settings)
+
+def llm_predictions_response(predictions, cache_status):
+    response = jsonify(predictions)
+    response.headers['X-Prediction-Cache'] = cache_status
+    response.headers['X-Prediction-Tier'] = 'llm'
+    return response
+
+@bp.route('/api/predictions/<int:race_id>')
 def get_predictions(race_id):
     try:
-        settings = APISettings.query.first()
-        if not settings or not settings.gemini_api_key:
-            return jsonify({'error': 'API keys not configured'}), 400
+        response, pending = predictions_before_llm(race_id)
+        if response is not None:
+            return response
+        stored_race_id, race_data, settings = pending
         
-        # Try to get race data, or create sample data if none exists
-        race = F1Data.query.get(race_id)
-        if not race:
-            # Create sample race data for demonstration
-            sample_race_data = {
-                "raceName": "Sample Grand Prix",
-                "Circuit": {
-                    "circuitName": "Sample Circuit",
-                    "Location": {
-                        "locality": "Sample City",
-                        "country": "Sample Country"
-                    }
-                },
-                "date": "2025-01-01",
-                "drivers": [
-                    {"driverId": "verstappen", "code": "VER", "givenName": "Max", "familyName": "Verstappen"},
-                    {"driverId": "hamilton", "code": "HAM", "givenName": "Lewis", "familyName": "Hamilton"},
-                    {"driverId": "leclerc", "code": "LEC", "givenName": "Charles", "familyName": "Leclerc"},
-                    {"driverId": "russell", "code": "RUS", "givenName": "George", "familyName": "Russell"},
-                    {"driverId": "sainz", "code": "SAI", "givenName": "Carlos", "familyName": "Sainz"}
-                ]
-            }
-            race_data = sample_race_data
-        else:
-            race_data = json.loads(race.data_json)
-        
-        # Generate predictions using AI
-        predictions = generate_race_predictions(
+        # Serve cached predictions, generating them with AI only when the input changed
+        predictions, cache_status = get_or_generate_predictions(
+            race_id=stored_race_id,
             race_data=race_data,
             gemini_api_key=settings.gemini_api_key,
             groq_api_key=settings.groq_api_key
         )
-        
-        return jsonify(predictions)
+        return llm_predictions_response(predictions, cache_status)
         
     except Exception as e:
         logging.error(f"Error generating predictions: {e}")
         return jsonify({'error': f'Failed to generate predictions: {str(e)}'}), 500
 
-@app.route('/api/driver-analysis/<driver_name>')
+@bp.route('/api/predictions/history')
+def get_prediction_history():
+    """Stored prediction runs newest first; with ?driver= the predictions made for that driver"""
+    try:
+        race_id = request.args.get('race_id', type=int)
+        tier = request.args.get('tier')
+        since = parse_since(request.args.get('since'))
+        before_id = request.args.get('before_id', type=int)
+        limit = request.args.get('limit', DEFAULT_HISTORY_LIMIT, type=int)
+        driver = request.args.get('driver')
+        
+        if driver:
+            return jsonify(driver_history(driver, race_id, tier, since, before_id, limit))
+        return jsonify(run_history(race_id, tier, since, before_id, limit))
+        
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO date'}), 400
+    except Exception as e:
+        logging.error(f"Error fetching prediction history: {e}")
+        return jsonify({'error': 'Failed to fetch prediction history'}), 500
+
+@bp.route('/api/predictions/accuracy')
+def get_prediction_accuracy():
+    """Accuracy of stored predictions against actual results, per tier and model"""
+    try:
+        return jsonify(prediction_accuracy(
+            season=request.args.get('season', type=int),
+            race_id=request.args.get('race_id', type=int),
+            tier=request.args.get('tier'),
+            include_post_race=request.args.get('include_post_race') == '1'
+        ))
+    except Exception as e:
+        logging.error(f"Error computing prediction accuracy: {e}")
+        return jsonify({'error': 'Failed to compute prediction accuracy'}), 500
+
+@bp.route('/api/simulate/<int:race_id>')
+def simulate_race_route(race_id):
+    """Monte Carlo finishing-position distributions and strategy comparison for a race"""
+    from race_simulator import run_simulation, DEFAULT_SIMULATIONS, SimulatorBusy
+    try:
+        simulations = request.args.get('sims', DEFAULT_SIMULATIONS, type=int)
+        seed = request.args.get('seed', type=int)
+        _, race_data = load_race_data(race_id)
+        
+        result = run_simulation(race_data, simulations, driver_id=request.args.get('driver'), seed=seed)
+        if result is None:
+            return jsonify({'error': 'Failed to simulate race'}), 500
+        return jsonify(result)
+        
+    except SimulatorBusy:
+        return jsonify({'error': 'Simulator busy, try again shortly'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        logging.error(f"Error simulating race: {e}")
+        return jsonify({'error': 'Failed to simulate race'}), 500
+
+@bp.route('/api/predictions/<int:race_id>/stream')
+def stream_race_predictions_route(race_id):
+    """Stream predictions as Server-Sent Events, one event per predicted driver"""
+    settings = get_api_settings()
+    if not settings or not settings.gemini_api_key:
+        return jsonify({'error': 'API keys not configured'}), 400
+    
+    race, race_data = load_race_data(race_id)
+    events = stream_predictions(
+        race_id=race.id if race else None,
+        race_data=race_data,
+        gemini_api_key=settings.gemini_api_key,
+        groq_api_key=settings.groq_api_key
+    )
+    return event_stream_response(format_event(event, data) for event, data in events)
+
+@bp.route('/api/driver-analysis/<driver_name>')
 def driver_analysis(driver_name):
     try:
-        settings = APISettings.query.first()
+        settings = get_api_settings()
         if not settings or not settings.gemini_api_key:
             return jsonify({'error': 'API keys not configured'}), 400
         
@@ -128,45 +289,348 @@ def driver_analysis(driver_name):
         logging.error(f"Error analyzing driver: {e}")
         return jsonify({'error': 'Failed to analyze driver performance'}), 500
 
-@app.route('/api/telemetry-data')
+@bp.route('/api/driver-analysis/<driver_name>/stream')
+def stream_driver_analysis_route(driver_name):
+    """Stream a driver analysis as Server-Sent Events as Gemini generates it"""
+    settings = get_api_settings()
+    if not settings or not settings.gemini_api_key:
+        return jsonify({'error': 'API keys not configured'}), 400
+    
+    events = stream_driver_analysis(
+        driver_name=driver_name,
+        gemini_api_key=settings.gemini_api_key
+    )
+    return event_stream_response(format_event(event, data) for event, data in events)
+
+@bp.route('/api/driver-analysis/batch', methods=['POST'])
+def batch_driver_analysis():
+    """Analyze a list of drivers, reusing cached analyses for the current data version"""
+    try:
+        settings = get_api_settings()
+        if not settings or not settings.gemini_api_key:
+            return jsonify({'error': 'API keys not configured'}), 400
+        
+        drivers = normalize_drivers((request.get_json(silent=True) or {}).get('drivers'))
+        return jsonify(batch_analyses(drivers, settings.gemini_api_key))
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error analyzing driver batch: {e}")
+        return jsonify({'error': 'Failed to analyze drivers'}), 500
+
+@bp.route('/api/driver-analysis/batch/stream', methods=['POST'])
+def stream_batch_driver_analysis():
+    """Stream one 'analysis' event per driver as each finishes, then 'complete'"""
+    settings = get_api_settings()
+    if not settings or not settings.gemini_api_key:
+        return jsonify({'error': 'API keys not configured'}), 400
+    
+    try:
+        drivers = normalize_drivers((request.get_json(silent=True) or {}).get('drivers'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def events():
+        counts = {'hit': 0, 'miss': 0}
+        for driver, analysis, status in iter_batch_analyses(drivers, settings.gemini_api_key):
+            counts[status] += 1
+            yield format_event('analysis', {'driver': driver, 'analysis': analysis, 'cache': status})
+        yield format_event('complete', {'drivers': len(drivers), 'cache': counts})
+    
+    return event_stream_response(events())
+
+@bp.route('/api/telemetry-data')
 def get_telemetry_data():
-    """Return simulated telemetry data for dashboard gauges"""
-    try:
-        # This would typically come from real F1 telemetry APIs
-        # For now, return structured data that matches the dashboard design
-        telemetry_data = {
-            'engine_rpm': {
-                'current': 6646.51,
-                'min': 0,
-                'max': 12000,
-                'unit': 'RPM'
-            },
-            'gear': {
-                'current': 5,
-                'min': 0,
-                'max': 8
-            },
-            'speed': {
-                'current': 130.45,
-                'min': 0,
-                'max': 350,
-                'unit': 'km/h'
-            },
-            'track_data': {
-                'lap': 2,
-                'sector_times': [23.456, 28.789, 31.234],
-                'position_data': [
-                    {'x': 100, 'y': 200},
-                    {'x': 150, 'y': 180},
-                    {'x': 200, 'y': 160},
-                    {'x': 250, 'y': 140},
-                    {'x': 300, 'y': 130}
-                ]
-            }
-        }
-        
-        return jsonify(telemetry_data)
+    """Return the latest telemetry frame for dashboard gauges"""
+    # The telemetry engine loads NumPy and builds its ring buffer, so it starts on first use
+    import telemetry
+    try:
+        seq, frame = telemetry.broadcaster.latest()
+        return negotiated_response(frame)
         
     except Exception as e:
         logging.error(f"Error fetching telemetry data: {e}")
         return jsonify({'error': 'Failed to fetch telemetry data'}), 500
+
+@bp.route('/api/telemetry-window')
+def get_telemetry_window():
+    """Return recent simulated telemetry for the whole grid (or one car) as columns"""
+    import telemetry_engine
+    try:
+        seconds = min(request.args.get('seconds', 10.0, type=float), telemetry_engine.TELEMETRY_HISTORY_SECONDS)
+        car = request.args.get('car', type=int)
+        if car is not None and not 0 <= car < telemetry_engine.engine.cars:
+            return jsonify({'error': f'car must be between 0 and {telemetry_engine.engine.cars - 1}'}), 400
+        channels = request.args.get('channels')
+        times, columns = telemetry_engine.engine.window(
+            seconds=seconds,
+            car=car,
+            channels=channels.split(',') if channels else None,
+            max_points=request.args.get('max_points', 500, type=int)
+        )
+        return negotiated_response(telemetry_engine.window_to_columns(times, columns))
+        
+    except Exception as e:
+        logging.error(f"Error fetching telemetry window: {e}")
+        return jsonify({'error': 'Failed to fetch telemetry window'}), 500
+
+@bp.route('/api/telemetry-engine/stats')
+def get_telemetry_engine_stats():
+    """Return size and rate of the telemetry ring buffer"""
+    import telemetry_engine
+    return jsonify(telemetry_engine.engine.stats())
+
+@bp.route('/api/telemetry-stream')
+def stream_telemetry():
+    """Push telemetry frames over SSE: a keyframe, then deltas of changed fields"""
+    import telemetry
+    return event_stream_response(telemetry.telemetry_events())
+
+@bp.route('/api/telemetry-stream/stats')
+def get_telemetry_stream_stats():
+    """Return subscriber and dropped-frame counts of the telemetry stream"""
+    import telemetry
+    return jsonify(telemetry.broadcaster.stats())
+
+@bp.route('/api/cache/stats')
+def get_cache_stats():
+    """Return Ergast cache hit/miss/age counters"""
+    return jsonify(ergast_cache.cache_stats())
+
+@bp.route('/api/page-cache/stats')
+def get_page_cache_stats():
+    """Return rendered page/fragment cache counters"""
+    return jsonify(page_cache_stats())
+
+@bp.route('/api/settings-cache/stats')
+def get_settings_cache_stats():
+    """Return API settings cache hit/load counters"""
+    return jsonify(settings_cache_stats())
+
+@bp.route('/api/metrics/latency')
+def get_latency_metrics():
+    """Return per-provider latency histograms"""
+    return jsonify(metrics.snapshot())
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Expose every latency histogram, counter and cache ratio in the Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def _profiler_denied():
+    """Error response unless the request carries the profiler admin token"""
+    if not PROFILE_ADMIN_TOKEN:
+        return jsonify({'error': 'Profiler API is disabled; set PROFILE_ADMIN_TOKEN to enable it'}), 404
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {PROFILE_ADMIN_TOKEN}".encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+@bp.route('/api/profiler', methods=['GET', 'POST'])
+def slow_request_profiler():
+    """Return the sampling profiler state and kept profiles; POST toggles it in every worker"""
+    denied = _profiler_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            return jsonify(profiler.configure(
+                enabled=data.get('enabled'),
+                threshold_ms=data.get('threshold_ms'),
+                interval_ms=data.get('interval_ms')
+            ))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'threshold_ms and interval_ms must be numbers'}), 400
+    return jsonify(profiler.status())
+
+@bp.route('/api/profiler/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    """Download a slow request profile as folded stacks for flamegraph.pl or speedscope"""
+    denied = _profiler_denied()
+    if denied:
+        return denied
+    folded = profiler.folded(profile_id)
+    if folded is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(folded, mimetype='text/plain')
+
+@bp.route('/api/upstream/status')
+def get_upstream_status():
+    """Return the circuit breaker state of each upstream"""
+    return jsonify(http_client.upstream_status())
+
+def _job_links(job_id):
+    return {
+        'job_id': job_id,
+        'status_url': url_for('main.get_job_status', job_id=job_id),
+        'result_url': url_for('main.get_job_result', job_id=job_id),
+        'stream_url': url_for('main.stream_job', job_id=job_id),
+    }
+
+def _job_accepted(job_id):
+    job = jobs.get_job(job_id)
+    job.update(_job_links(job_id))
+    return jsonify(job), 202
+
+@bp.route('/api/jobs/predictions/<int:race_id>', methods=['POST'])
+def submit_predictions_job(race_id):
+    try:
+        settings = get_api_settings()
+        if not settings or not settings.gemini_api_key:
+            return jsonify({'error': 'API keys not configured'}), 400
+        
+        # Answer straight from the prediction cache when the input is unchanged
+        _, race_data = load_race_data(race_id)
+        cached = get_cached_prediction(prediction_key(race_data, groq_enabled=bool(settings.groq_api_key)))
+        if cached is not None:
+            return jsonify({'status': 'succeeded', 'result': cached})
+        
+        return _job_accepted(jobs.submit_job('predictions', race_id=race_id))
+        
+    except Exception as e:
+        logging.error(f"Error submitting prediction job: {e}")
+        return jsonify({'error': 'Failed to queue predictions'}), 500
+
+@bp.route('/api/jobs/driver-analysis/<driver_name>', methods=['POST'])
+def submit_driver_analysis_job(driver_name):
+    try:
+        settings = get_api_settings()
+        if not settings or not settings.gemini_api_key:
+            return jsonify({'error': 'API keys not configured'}), 400
+        
+        return _job_accepted(jobs.submit_job('driver_analysis', driver_name=driver_name))
+        
+    except Exception as e:
+        logging.error(f"Error submitting driver analysis job: {e}")
+        return jsonify({'error': 'Failed to queue driver analysis'}), 500
+
+@bp.route('/api/jobs/strategy', methods=['POST'])
+def submit_strategy_job():
+    try:
+        settings = get_api_settings()
+        if not settings or not settings.gemini_api_key:
+            return jsonify({'error': 'API keys not configured'}), 400
+        
+        race_conditions = request.get_json(silent=True)
+        if not isinstance(race_conditions, dict):
+            return jsonify({'error': 'Race conditions must be a JSON object'}), 400
+        
+        return _job_accepted(jobs.submit_job('strategy', race_conditions=race_conditions))
+        
+    except Exception as e:
+        logging.error(f"Error submitting strategy job: {e}")
+        return jsonify({'error': 'Failed to queue strategy generation'}), 500
+
+@bp.route('/api/jobs/<job_id>')
+def get_job_status(job_id):
+    job = jobs.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@bp.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = jobs.get_job(job_id, include_result=True)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'succeeded':
+        return jsonify(job.get('result'))
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']}), 500
+    return jsonify({'status': job['status']}), 202
+
+@bp.route('/api/jobs/<job_id>/stream')
+def stream_job(job_id):
+    """Push job status changes and the final result as Server-Sent Events"""
+    return event_stream_response(jobs.stream_job_events(job_id))
+
+@bp.route('/api/warehouse/sync/<int:season>', methods=['POST'])
+def submit_season_sync(season):
+    """Queue a background ingestion of a whole season into the local database"""
+    try:
+        force = request.args.get('force') == '1'
+        include_laps = request.args.get('laps', '1') != '0'
+        return _job_accepted(jobs.submit_job('sync_season', season=season, force=force, include_laps=include_laps))
+    except Exception as e:
+        logging.error(f"Error submitting season sync: {e}")
+        return jsonify({'error': 'Failed to queue season sync'}), 500
+
+@bp.route('/api/warehouse/status')
+def get_warehouse_status():
+    import ingest
+    return jsonify(ingest.warehouse_status())
+
+@bp.route('/api/career-stats')
+def get_career_leaderboard():
+    """Return precomputed career statistics for all ingested drivers"""
+    import career_stats
+    order_by = request.args.get('order_by', 'total_points')
+    if order_by not in career_stats.STAT_COLUMNS:
+        return jsonify({'error': f'order_by must be one of {", ".join(career_stats.STAT_COLUMNS)}'}), 400
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify(career_stats.leaderboard(order_by=order_by, limit=limit))
+
+@bp.route('/api/career-stats/<driver_id>')
+def get_driver_career(driver_id):
+    stats = get_driver_career_stats(driver_id)
+    if not stats:
+        return jsonify({'error': 'No career data found'}), 404
+    return jsonify(stats)
+
+@bp.route('/api/season/<int:season>/progression')
+def get_season_progression(season):
+    """Return cumulative points and standings positions after every synced round"""
+    import season_progression
+    kind = request.args.get('kind', 'drivers')
+    if kind not in season_progression.KINDS:
+        return jsonify({'error': f'kind must be one of {", ".join(season_progression.KINDS)}'}), 400
+    top = request.args.get('top', type=int)
+    try:
+        progression = season_progression.get_progression(season)
+        if progression is None:
+            return jsonify({'error': 'No synced rounds for this season'}), 404
+        return negotiated_response(lambda: progression.standings(kind, top),
+                                   etag=f"{progression.version}-{kind}-{top}")
+    except Exception as e:
+        logging.error(f"Error building season progression: {e}")
+        return jsonify({'error': 'Failed to build season progression'}), 500
+
+@bp.route('/api/season/<int:season>/head-to-head')
+def get_season_head_to_head(season):
+    """Return race and qualifying head-to-heads; one pair with ?a=&b=, else the full matrix"""
+    import season_progression
+    scope = request.args.get('scope', 'all')
+    if scope not in season_progression.SCOPES:
+        return jsonify({'error': f'scope must be one of {", ".join(season_progression.SCOPES)}'}), 400
+    a, b = request.args.get('a'), request.args.get('b')
+    if bool(a) != bool(b):
+        return jsonify({'error': 'Both a and b driver ids are required'}), 400
+    try:
+        progression = season_progression.get_progression(season)
+        if progression is None:
+            return jsonify({'error': 'No synced rounds for this season'}), 404
+        if a:
+            record = progression.head_to_head(a, b, scope)
+            if record is None:
+                return jsonify({'error': 'Driver not found in this season'}), 404
+            return jsonify(record)
+        return negotiated_response(lambda: progression.head_to_head_matrix(scope),
+                                   etag=f"{progression.version}-h2h-{scope}")
+    except Exception as e:
+        logging.error(f"Error building head-to-head: {e}")
+        return jsonify({'error': 'Failed to build head-to-head'}), 500
+
+@bp.route('/api/season/<int:season>/quali-race-delta')
+def get_season_quali_race_delta(season):
+    """Return places gained or lost from qualifying to the finish for every driver"""
+    import season_progression
+    try:
+        progression = season_progression.get_progression(season)
+        if progression is None:
+            return jsonify({'error': 'No synced rounds for this season'}), 404
+        return negotiated_response(progression.quali_race_delta, etag=f"{progression.version}-delta")
+    except Exception as e:
+        logging.error(f"Error building qualifying to race deltas: {e}")
+        return jsonify({'error': 'Failed to build qualifying to race deltas'}), 500
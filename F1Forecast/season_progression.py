@@ -0,0 +1,375 @@
+import os
+import copy
+import time
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import db
+from models import F1Data, RaceResult, QualifyingResult, DriverStanding, ConstructorStanding
+
+# Upper bound on staleness when a round was ingested by another worker process
+PROGRESSION_TTL = float(os.environ.get("F1_PROGRESSION_TTL", "30"))  # seconds
+
+KINDS = ('drivers', 'constructors')
+SCOPES = ('all', 'teammates')
+
+_seasons = {}
+_lock = threading.Lock()
+
+
+def _pad(array, shape, fill=0):
+    """Grow an array to at least `shape`, filling new cells with `fill`"""
+    if array.shape == shape:
+        return array
+    grown = np.full(shape, fill, dtype=array.dtype)
+    grown[tuple(slice(0, size) for size in array.shape)] = array
+    return grown
+
+
+def _rank(points, wins, active):
+    """Standings positions (1-based, 0 when inactive) ordered by points, then wins"""
+    positions = np.zeros(len(points), dtype=np.int16)
+    order = [i for i in np.lexsort((-wins, -points)) if active[i]]
+    positions[order] = np.arange(1, len(order) + 1)
+    return positions
+
+
+def _beats(order):
+    """Pairwise matrix: True where driver i placed ahead of driver j, both having taken part"""
+    present = order > 0
+    return (order[:, None] < order[None, :]) & present[:, None] & present[None, :]
+
+
+class SeasonProgression:
+    """Per-round standings and head-to-head counts for one season, kept as arrays.
+
+    Row r of each (round, driver) matrix holds the season state after the
+    r-th applied round. The pairwise matrices count the rounds in which
+    driver i finished or qualified ahead of driver j. Rounds are applied in
+    order, one at a time, so a new round costs one row and one pairwise
+    update rather than a recomputation of the season.
+    """
+
+    def __init__(self, season):
+        self.season = season
+        self.rounds = []
+        self.race_names = []
+        self.results_hashes = []
+        self.version = hashlib.sha1(str(season).encode('utf-8')).hexdigest()
+        self.checked_at = 0.0
+
+        self.drivers, self.driver_names, self.driver_index = [], [], {}
+        self.constructors, self.constructor_index = [], {}
+
+        # (round, driver)
+        self.driver_points = np.zeros((0, 0), dtype=np.float64)
+        self.driver_positions = np.zeros((0, 0), dtype=np.int16)
+        self.driver_wins = np.zeros((0, 0), dtype=np.int16)
+        self.finish = np.zeros((0, 0), dtype=np.int16)  # Classification order, 0 when absent
+        self.quali = np.zeros((0, 0), dtype=np.int16)  # Qualifying position, 0 when absent
+        self.teams = np.zeros((0, 0), dtype=np.int16)  # Constructor index, -1 when absent
+        # (round, constructor)
+        self.constructor_points = np.zeros((0, 0), dtype=np.float64)
+        self.constructor_positions = np.zeros((0, 0), dtype=np.int16)
+        # (driver, driver)
+        self.race_ahead = np.zeros((0, 0), dtype=np.int32)
+        self.quali_ahead = np.zeros((0, 0), dtype=np.int32)
+        self.teammate_race_ahead = np.zeros((0, 0), dtype=np.int32)
+        self.teammate_quali_ahead = np.zeros((0, 0), dtype=np.int32)
+        # (driver,) running sums of qualifying position minus finishing position
+        self.gain_total = np.zeros(0, dtype=np.int32)
+        self.gain_rounds = np.zeros(0, dtype=np.int32)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def _driver(self, driver_id, name=None):
+        index = self.driver_index.get(driver_id)
+        if index is None:
+            index = self.driver_index[driver_id] = len(self.drivers)
+            self.drivers.append(driver_id)
+            self.driver_names.append(name or driver_id)
+        elif name:
+            self.driver_names[index] = name
+        return index
+
+    def _constructor(self, constructor_id):
+        index = self.constructor_index.get(constructor_id)
+        if index is None:
+            index = self.constructor_index[constructor_id] = len(self.constructors)
+            self.constructors.append(constructor_id)
+        return index
+
+    def _resize(self, rounds):
+        drivers, constructors = len(self.drivers), len(self.constructors)
+        for name in ('driver_points', 'driver_positions', 'driver_wins', 'finish', 'quali'):
+            setattr(self, name, _pad(getattr(self, name), (rounds, drivers)))
+        self.teams = _pad(self.teams, (rounds, drivers), fill=-1)
+        for name in ('constructor_points', 'constructor_positions'):
+            setattr(self, name, _pad(getattr(self, name), (rounds, constructors)))
+        for name in ('race_ahead', 'quali_ahead', 'teammate_race_ahead', 'teammate_quali_ahead'):
+            setattr(self, name, _pad(getattr(self, name), (drivers, drivers)))
+        self.gain_total = _pad(self.gain_total, (drivers,))
+        self.gain_rounds = _pad(self.gain_rounds, (drivers,))
+
+    def apply_round(self, round_number, race_name, results_hash, results, qualifying,
+                    driver_standings, constructor_standings):
+        """Append one round's results to the cumulative arrays.
+
+        results are (driver_id, driver_name, constructor_id, points, won)
+        tuples in classification order; qualifying is (driver_id,
+        constructor_id, position); standings are (id, position, points, wins)
+        as published after the round. Without stored standings the totals
+        are carried forward from race points.
+        """
+        driver_rows = [self._driver(driver_id, name) for driver_id, name, _, _, _ in results]
+        quali_rows = [self._driver(driver_id) for driver_id, _, _ in qualifying]
+        standing_rows = [self._driver(entry[0]) for entry in driver_standings]
+        team_rows = [self._constructor(constructor_id) if constructor_id else -1
+                     for _, _, constructor_id, _, _ in results]
+        quali_teams = [self._constructor(constructor_id) if constructor_id else -1
+                       for _, constructor_id, _ in qualifying]
+        constructor_rows = [self._constructor(entry[0]) for entry in constructor_standings]
+        row = len(self.rounds)
+        self._resize(row + 1)
+
+        finish, quali, teams = self.finish[row], self.quali[row], self.teams[row]
+        finish[driver_rows] = np.arange(1, len(driver_rows) + 1)
+        quali[quali_rows] = [position or 0 for _, _, position in qualifying]
+        teams[quali_rows] = quali_teams
+        teams[driver_rows] = team_rows
+
+        previous = row - 1 if row else None
+        if driver_standings:
+            self.driver_points[row] = self.driver_points[previous] if previous is not None else 0
+            self.driver_wins[row] = self.driver_wins[previous] if previous is not None else 0
+            self.driver_positions[row, standing_rows] = [entry[1] or 0 for entry in driver_standings]
+            self.driver_points[row, standing_rows] = [entry[2] for entry in driver_standings]
+            self.driver_wins[row, standing_rows] = [entry[3] for entry in driver_standings]
+        else:
+            points = np.zeros(len(self.drivers))
+            wins = np.zeros(len(self.drivers), dtype=np.int16)
+            points[driver_rows] = [entry[3] for entry in results]
+            wins[driver_rows] = [entry[4] for entry in results]
+            if previous is not None:
+                points += self.driver_points[previous]
+                wins += self.driver_wins[previous]
+            self.driver_points[row], self.driver_wins[row] = points, wins
+            active = (self.finish[:row + 1] > 0).any(axis=0)
+            self.driver_positions[row] = _rank(points, wins, active)
+
+        if constructor_standings:
+            if previous is not None:
+                self.constructor_points[row] = self.constructor_points[previous]
+            self.constructor_positions[row, constructor_rows] = [entry[1] or 0 for entry in constructor_standings]
+            self.constructor_points[row, constructor_rows] = [entry[2] for entry in constructor_standings]
+        else:
+            points = np.zeros(len(self.constructors))
+            scored = [(team, entry[3]) for team, entry in zip(team_rows, results) if team >= 0]
+            if scored:
+                np.add.at(points, [team for team, _ in scored], [value for _, value in scored])
+            if previous is not None:
+                points += self.constructor_points[previous]
+            self.constructor_points[row] = points
+            active = (self.teams[:row + 1, :, None] == np.arange(len(self.constructors))).any(axis=(0, 1))
+            self.constructor_positions[row] = _rank(points, np.zeros(len(points)), active)
+
+        teammates = (teams[:, None] == teams[None, :]) & (teams[:, None] >= 0)
+        race_beats, quali_beats = _beats(finish), _beats(quali)
+        self.race_ahead += race_beats
+        self.quali_ahead += quali_beats
+        self.teammate_race_ahead += race_beats & teammates
+        self.teammate_quali_ahead += quali_beats & teammates
+
+        both = (finish > 0) & (quali > 0)
+        self.gain_total += np.where(both, quali.astype(np.int32) - finish, 0)
+        self.gain_rounds += both
+
+        self.rounds.append(round_number)
+        self.race_names.append(race_name)
+        self.results_hashes.append(results_hash)
+        self.version = hashlib.sha1(f"{self.version}:{results_hash}".encode('utf-8')).hexdigest()
+
+    def standings(self, kind='drivers', top=None):
+        """Cumulative points and positions after every round, leaders first"""
+        if kind == 'constructors':
+            ids, names = self.constructors, self.constructors
+            points, positions = self.constructor_points, self.constructor_positions
+        else:
+            ids, names = self.drivers, self.driver_names
+            points, positions = self.driver_points, self.driver_positions
+
+        latest = positions[-1] if len(self.rounds) else np.zeros(len(ids), dtype=np.int16)
+        order = sorted((i for i in range(len(ids)) if latest[i] > 0), key=lambda i: latest[i])
+        if top:
+            order = order[:top]
+        return {
+            'season': self.season,
+            'kind': kind,
+            'rounds': self.rounds,
+            'race_names': self.race_names,
+            'series': [{
+                'id': ids[i],
+                'name': names[i],
+                'points': points[:, i].tolist(),
+                'positions': [int(p) or None for p in positions[:, i]],
+            } for i in order],
+        }
+
+    def head_to_head(self, a, b, scope='all'):
+        """Race and qualifying record of driver a against driver b; None if either is unknown"""
+        i, j = self.driver_index.get(a), self.driver_index.get(b)
+        if i is None or j is None:
+            return None
+        race, quali = self._pairwise(scope)
+        return {
+            'season': self.season,
+            'scope': scope,
+            'drivers': [{'id': a, 'name': self.driver_names[i]}, {'id': b, 'name': self.driver_names[j]}],
+            'race': {a: int(race[i, j]), b: int(race[j, i])},
+            'qualifying': {a: int(quali[i, j]), b: int(quali[j, i])},
+        }
+
+    def head_to_head_matrix(self, scope='all'):
+        """Full pairwise matrices; cell [i][j] counts rounds driver i beat driver j"""
+        race, quali = self._pairwise(scope)
+        return {
+            'season': self.season,
+            'scope': scope,
+            'drivers': self.drivers,
+            'names': self.driver_names,
+            'race': race.tolist(),
+            'qualifying': quali.tolist(),
+        }
+
+    def _pairwise(self, scope):
+        if scope == 'teammates':
+            return self.teammate_race_ahead, self.teammate_quali_ahead
+        return self.race_ahead, self.quali_ahead
+
+    def quali_race_delta(self):
+        """Places gained from qualifying to the finish, per round and on average"""
+        gains = np.where((self.finish > 0) & (self.quali > 0),
+                         self.quali.astype(np.int32) - self.finish, np.iinfo(np.int32).min)
+        return {
+            'season': self.season,
+            'rounds': self.rounds,
+            'drivers': [{
+                'id': driver_id,
+                'name': self.driver_names[i],
+                'rounds': int(self.gain_rounds[i]),
+                'total_gain': int(self.gain_total[i]),
+                'average_gain': float(self.gain_total[i] / self.gain_rounds[i]) if self.gain_rounds[i] else None,
+                'gains': [int(g) if g != np.iinfo(np.int32).min else None for g in gains[:, i]],
+            } for i, driver_id in enumerate(self.drivers)],
+        }
+
+
+def _synced_races(session, season):
+    return session.execute(
+        select(F1Data.id, F1Data.round_number, F1Data.race_name, F1Data.results_hash)
+        .where(F1Data.season == season, F1Data.results_hash.isnot(None))
+        .order_by(F1Data.round_number)
+    ).all()
+
+
+def _round_rows(session, season, races):
+    """Load stored results, qualifying and standings for several rounds in one query per table"""
+    race_ids = [race.id for race in races]
+    round_numbers = [race.round_number for race in races]
+    rows = {race.id: {'results': [], 'qualifying': [], 'drivers': [], 'constructors': []} for race in races}
+    by_round = {race.round_number: rows[race.id] for race in races}
+
+    results = session.execute(
+        select(RaceResult.race_id, RaceResult.driver_id, RaceResult.driver_name, RaceResult.constructor_id,
+               RaceResult.points, RaceResult.position)
+        .where(RaceResult.race_id.in_(race_ids))
+        .order_by(RaceResult.race_id, RaceResult.id)  # Rows are stored in classification order
+    )
+    for race_id, driver_id, name, constructor_id, points, position in results:
+        rows[race_id]['results'].append((driver_id, name, constructor_id, points or 0.0, int(position == 1)))
+
+    qualifying = session.execute(
+        select(QualifyingResult.race_id, QualifyingResult.driver_id, QualifyingResult.constructor_id,
+               QualifyingResult.position)
+        .where(QualifyingResult.race_id.in_(race_ids))
+    )
+    for race_id, driver_id, constructor_id, position in qualifying:
+        rows[race_id]['qualifying'].append((driver_id, constructor_id, position))
+
+    for model, key, id_column in ((DriverStanding, 'drivers', DriverStanding.driver_id),
+                                  (ConstructorStanding, 'constructors', ConstructorStanding.constructor_id)):
+        standings = session.execute(
+            select(model.round_number, id_column, model.position, model.points, model.wins)
+            .where(model.season == season, model.round_number.in_(round_numbers))
+        )
+        for round_number, entry_id, position, points, wins in standings:
+            by_round[round_number][key].append((entry_id, position, points or 0.0, wins or 0))
+    return rows
+
+
+def _apply(progression, season, races):
+    with Session(db.engine) as session:
+        rows = _round_rows(session, season, races)
+    for race in races:
+        loaded = rows[race.id]
+        progression.apply_round(race.round_number, race.race_name, race.results_hash, loaded['results'],
+                                loaded['qualifying'], loaded['drivers'], loaded['constructors'])
+
+
+def refresh(season):
+    """Bring a season's arrays up to date with the warehouse.
+
+    Rounds synced after the ones already applied are added incrementally; if
+    an applied round was re-synced with different results, or a missing
+    earlier round has arrived, the season is rebuilt. Returns the current
+    progression, or None when no round of the season has been synced.
+    """
+    with Session(db.engine) as session:
+        races = _synced_races(session, season)
+    with _lock:
+        current = _seasons.get(season)
+
+    applied = len(current.rounds) if current else 0
+    stored = [(race.round_number, race.results_hash) for race in races[:applied]]
+    if current is None or stored != list(zip(current.rounds, current.results_hashes)):
+        progression, pending = SeasonProgression(season), races
+    else:
+        # Applied to a copy so readers never see a half-updated season
+        progression, pending = (current.copy(), races[applied:]) if races[applied:] else (current, [])
+    if pending:
+        _apply(progression, season, pending)
+    progression.checked_at = time.monotonic()
+
+    with _lock:
+        if progression.rounds:
+            _seasons[season] = progression
+        else:
+            _seasons.pop(season, None)
+    return progression if progression.rounds else None
+
+
+def get_progression(season):
+    """Return the season's progression arrays, refreshing them at most every PROGRESSION_TTL seconds"""
+    with _lock:
+        progression = _seasons.get(season)
+    if progression is not None and time.monotonic() - progression.checked_at < PROGRESSION_TTL:
+        return progression
+    return refresh(season)
+
+
+def on_round_synced(season):
+    """Apply a newly ingested round to the season's arrays if this process has them loaded"""
+    with _lock:
+        loaded = season in _seasons
+    if not loaded:
+        return
+    try:
+        refresh(season)
+    except Exception as e:
+        logging.error(f"Error updating season progression for {season}: {e}")
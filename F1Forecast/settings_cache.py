@@ -0,0 +1,81 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from collections import namedtuple
+
+from models import APISettings
+
+# Touched on every settings change so other worker processes drop their copy
+SETTINGS_SIGNAL_PATH = os.environ.get(
+    "F1_SETTINGS_SIGNAL_PATH", os.path.join(tempfile.gettempdir(), "f1_settings.signal")
+)
+# Upper bound on staleness when workers do not share the signal file (e.g. separate hosts)
+SETTINGS_TTL = float(os.environ.get("F1_SETTINGS_TTL", "60"))  # seconds
+
+ApiKeys = namedtuple('ApiKeys', ('gemini_api_key', 'groq_api_key'))
+
+_lock = threading.Lock()
+_cached = None
+_loaded_at = None
+_loaded_signal = None
+_generation = 0
+_stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+
+def _signal_version():
+    try:
+        return os.stat(SETTINGS_SIGNAL_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load():
+    settings = APISettings.query.first()
+    if not settings:
+        return None
+    return ApiKeys(settings.gemini_api_key, settings.groq_api_key)
+
+
+def get_api_settings():
+    """Return the stored API keys as an ApiKeys tuple, or None if none are saved.
+
+    The row is read from the database once and reused until /settings
+    changes it, in this process or another one, or SETTINGS_TTL passes.
+    """
+    global _cached, _loaded_at, _loaded_signal
+    signal = _signal_version()
+    with _lock:
+        if (_loaded_at is not None and signal == _loaded_signal and
+                time.monotonic() - _loaded_at < SETTINGS_TTL):
+            _stats['hits'] += 1
+            return _cached
+        generation = _generation
+
+    settings = _load()
+    with _lock:
+        # An invalidation that raced with the load means this copy may already be stale
+        if generation == _generation:
+            _cached, _loaded_at, _loaded_signal = settings, time.monotonic(), signal
+        _stats['loads'] += 1
+    return settings
+
+
+def invalidate_api_settings():
+    """Drop the cached keys here and signal other workers to drop theirs"""
+    global _cached, _loaded_at, _generation
+    with _lock:
+        _cached, _loaded_at = None, None
+        _generation += 1
+        _stats['invalidations'] += 1
+    try:
+        with open(SETTINGS_SIGNAL_PATH, 'w') as f:
+            f.write(str(time.time_ns()))
+    except OSError as e:
+        logging.error(f"Error signalling settings change: {e}")
+
+
+def settings_cache_stats():
+    with _lock:
+        return dict(_stats, cached=_loaded_at is not None)
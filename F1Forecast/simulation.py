@@ -0,0 +1,122 @@
+"""Vectorized Monte Carlo race simulation.
+
+Only depends on NumPy so chunks can run in worker processes without
+importing the Flask app. Every simulated race of a chunk advances together,
+one lap at a time, as (simulations x drivers) arrays.
+"""
+import numpy as np
+
+# Compound: (pace offset in seconds, degradation in seconds per lap of tyre age)
+COMPOUNDS = {
+    'SOFT': (-0.6, 0.09),
+    'MEDIUM': (0.0, 0.05),
+    'HARD': (0.4, 0.03),
+}
+# Candidate strategies as (compound, share of race distance) stints
+STRATEGIES = {
+    '1-stop M-H': (('MEDIUM', 0.4), ('HARD', 0.6)),
+    '1-stop H-M': (('HARD', 0.6), ('MEDIUM', 0.4)),
+    '2-stop S-M-S': (('SOFT', 0.25), ('MEDIUM', 0.45), ('SOFT', 0.3)),
+    '2-stop M-H-S': (('MEDIUM', 0.3), ('HARD', 0.45), ('SOFT', 0.25)),
+}
+SAFETY_CAR_LAPS = 4
+SAFETY_CAR_LAP_FACTOR = 1.4
+SAFETY_CAR_GAP = 0.8  # seconds between cars when the safety car pulls in
+PIT_LOSS_UNDER_SAFETY_CAR = 0.5  # share of the pit loss paid when stopping under the safety car
+START_GAP = 0.25  # seconds per grid slot after the start
+
+
+def strategy_plan(stints, laps):
+    """Per-lap compound pace, degradation and pit-stop flag arrays for one strategy"""
+    pace, degradation, age, pit = (np.zeros(laps) for _ in range(4))
+    boundaries = np.round(np.cumsum([share for _, share in stints]) / sum(share for _, share in stints) * laps)
+    start = 0
+    for (compound, _), end in zip(stints, boundaries.astype(int)):
+        offset, wear = COMPOUNDS[compound]
+        pace[start:end], degradation[start:end] = offset, wear
+        age[start:end] = np.arange(end - start)
+        if start > 0:
+            pit[start] = 1.0
+        start = end
+    return np.stack([pace + degradation * age, pit])
+
+
+def simulate_chunk(params, simulations, seed):
+    """Simulate `simulations` races and return aggregated counts.
+
+    params holds per-driver arrays (pace, sigma, dnf_probability, start_order),
+    the race scalars (laps, base_lap, pit_loss, safety_car_probability), the
+    strategy plans as a (strategies, 2, laps) array and either a fixed
+    per-driver strategy index or None to draw one per simulation.
+    """
+    rng = np.random.default_rng(seed)
+    laps = int(params['laps'])
+    drivers = len(params['pace'])
+    plans = params['plans']
+
+    strategy = params.get('strategy')
+    if strategy is None:
+        strategy = rng.integers(0, len(plans), size=(simulations, drivers))
+    else:
+        strategy = np.broadcast_to(strategy, (simulations, drivers))
+    tyre_time = plans[strategy, 0]  # (simulations, drivers, laps)
+    pit_stop = plans[strategy, 1]
+
+    # Per-lap hazard giving the requested chance of at least one deployment per race
+    hazard = 1.0 - (1.0 - params['safety_car_probability']) ** (1.0 / laps)
+    deploy = rng.random((simulations, laps)) < hazard
+    retire_lap = np.where(rng.random((simulations, drivers)) < params['dnf_probability'],
+                          rng.integers(1, laps + 1, size=(simulations, drivers)), laps + 1)
+
+    elapsed = np.broadcast_to(params['start_order'] * START_GAP, (simulations, drivers)).copy()
+    safety_car_left = np.zeros(simulations, dtype=np.int64)
+    had_safety_car = np.zeros(simulations, dtype=bool)
+    for lap in range(laps):
+        starting = deploy[:, lap] & (safety_car_left == 0)
+        safety_car_left[starting] = SAFETY_CAR_LAPS
+        under_safety_car = safety_car_left > 0
+        had_safety_car |= under_safety_car
+
+        racing = (params['base_lap'] + params['pace'] + tyre_time[:, :, lap] +
+                  params['sigma'] * rng.standard_normal((simulations, drivers)))
+        neutralised = params['base_lap'] * SAFETY_CAR_LAP_FACTOR
+        lap_time = np.where(under_safety_car[:, None], neutralised, racing)
+        pit_cost = np.where(under_safety_car[:, None], params['pit_loss'] * PIT_LOSS_UNDER_SAFETY_CAR,
+                            params['pit_loss'])
+        elapsed += lap_time + pit_stop[:, :, lap] * pit_cost
+
+        # The field bunches up behind the safety car on its last lap
+        ending = safety_car_left == 1
+        if ending.any():
+            bunched = elapsed[ending]
+            order = np.argsort(bunched, axis=1)
+            place = np.empty_like(order)
+            np.put_along_axis(place, order, np.arange(drivers)[None, :].repeat(len(order), axis=0), axis=1)
+            elapsed[ending] = bunched.min(axis=1, keepdims=True) + place * SAFETY_CAR_GAP
+        safety_car_left = np.maximum(safety_car_left - 1, 0)
+
+    # Retired cars are classified behind every finisher, later retirements first
+    finished = retire_lap > laps
+    sort_key = np.where(finished, elapsed, 1e9 - retire_lap)
+    order = np.argsort(sort_key, axis=1)
+    position = np.empty_like(order)
+    np.put_along_axis(position, order, np.arange(drivers)[None, :].repeat(simulations, axis=0), axis=1)
+
+    counts = np.zeros((drivers, drivers), dtype=np.int64)
+    np.add.at(counts, (np.tile(np.arange(drivers), simulations), position.ravel()), 1)
+    return {
+        'position_counts': counts,
+        'dnf': (~finished).sum(axis=0),
+        'safety_car_races': int(had_safety_car.sum()),
+        'race_time_sum': np.where(finished, elapsed, 0.0).sum(axis=0),
+        'finishers': finished.sum(axis=0),
+    }
+
+
+def merge_results(chunks):
+    """Sum the counts of several simulate_chunk results"""
+    merged = {key: chunks[0][key] for key in chunks[0]}
+    for chunk in chunks[1:]:
+        for key, value in chunk.items():
+            merged[key] = merged[key] + value
+    return merged
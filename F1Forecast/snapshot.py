@@ -0,0 +1,568 @@
+"""Offline Ergast snapshots: whole seasons packed into memory-mapped NumPy columns.
+
+A snapshot is a directory with one .npy file per table column and a
+manifest. Strings are interned into a single UTF-8 blob and stored as int32
+codes, so every column is a fixed-width array that np.load maps without
+reading it; a lookup binary-searches the mapped columns and copies out only
+the rows of the requested race or round.
+
+    flask --app main export-snapshot snapshots/f1 2023 2024
+    F1_SNAPSHOT_PATH=snapshots/f1 gunicorn main:app
+
+The Ergast cache answers from the snapshot with the same JSON shape as the
+Ergast API when the upstream fails, or instead of the upstream when
+F1_SNAPSHOT_MODE is 'offline'. NumPy is imported only when a snapshot is
+written or mapped, so workers without one never load it.
+"""
+import os
+import json
+import shutil
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+SNAPSHOT_PATH = os.environ.get("F1_SNAPSHOT_PATH")
+# 'fallback' serves the snapshot only when Ergast fails; 'offline' never calls Ergast
+SNAPSHOT_MODE = os.environ.get("F1_SNAPSHOT_MODE", "fallback")
+SNAPSHOT_MODES = ('fallback', 'offline')
+SNAPSHOT_FORMAT = 1
+ERGAST_DEFAULT_LIMIT = 30
+NULL = -1
+STRING = 'string'
+
+# table -> column -> dtype; STRING columns hold int32 codes into the string blob.
+# Rows are grouped by race (or season and round) in calendar order.
+SCHEMA = {
+    'races': {'season': 'i4', 'round': 'i4', 'race_name': STRING, 'circuit_id': STRING, 'circuit_name': STRING,
+              'locality': STRING, 'country': STRING, 'date': STRING, 'time': STRING},
+    'drivers': {'driver_id': STRING, 'number': STRING, 'code': STRING, 'given_name': STRING,
+                'family_name': STRING, 'date_of_birth': STRING, 'nationality': STRING},
+    'constructors': {'constructor_id': STRING, 'name': STRING, 'nationality': STRING},
+    'results': {'race': 'i4', 'driver': 'i4', 'constructor': 'i4', 'number': STRING, 'grid': 'i4',
+                'position': 'i4', 'position_text': STRING, 'points': 'f8', 'laps': 'i4', 'status': STRING,
+                'time_millis': 'i8', 'time': STRING},
+    'qualifying': {'race': 'i4', 'driver': 'i4', 'constructor': 'i4', 'number': STRING, 'position': 'i4',
+                   'q1': STRING, 'q2': STRING, 'q3': STRING},
+    'driver_standings': {'season': 'i4', 'round': 'i4', 'driver': 'i4', 'constructor': 'i4', 'position': 'i4',
+                         'position_text': STRING, 'points': 'f8', 'wins': 'i4'},
+    'constructor_standings': {'season': 'i4', 'round': 'i4', 'constructor': 'i4', 'position': 'i4',
+                              'position_text': STRING, 'points': 'f8', 'wins': 'i4'},
+    'laps': {'race': 'i4', 'driver': 'i4', 'lap': 'i4', 'position': 'i4', 'milliseconds': 'i4'},
+}
+
+
+def _int(value):
+    text = str(value) if value is not None else ''
+    return int(text) if text.lstrip('-').isdigit() else NULL
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _compact(fields):
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+def _number(value):
+    return None if value == NULL else str(value)
+
+
+def _points(value):
+    return None if value != value else f"{value:g}"
+
+
+class _Builder:
+    """Accumulates rows in Python lists and writes them as a snapshot directory"""
+
+    def __init__(self):
+        self.strings = {}
+        self.rows = {table: {column: [] for column in columns} for table, columns in SCHEMA.items()}
+        self.keys = {'races': {}, 'drivers': {}, 'constructors': {}}
+
+    def text(self, value):
+        if value is None:
+            return NULL
+        return self.strings.setdefault(str(value), len(self.strings))
+
+    def add(self, table, **values):
+        columns = self.rows[table]
+        for column, kind in SCHEMA[table].items():
+            value = values.get(column)
+            if kind == STRING:
+                value = self.text(value)
+            elif kind == 'f8':
+                value = _float(value)
+            else:
+                value = value if isinstance(value, int) else _int(value)
+            columns[column].append(value)
+        return len(next(iter(columns.values()))) - 1
+
+    def _entity(self, table, key, **values):
+        if key is None:
+            return NULL
+        index = self.keys[table].get(key)
+        if index is None:
+            index = self.keys[table][key] = self.add(table, **values)
+        return index
+
+    def driver(self, driver):
+        return self._entity('drivers', driver.get('driverId'),
+                            driver_id=driver.get('driverId'),
+                            number=driver.get('permanentNumber'),
+                            code=driver.get('code'),
+                            given_name=driver.get('givenName'),
+                            family_name=driver.get('familyName'),
+                            date_of_birth=driver.get('dateOfBirth'),
+                            nationality=driver.get('nationality'))
+
+    def constructor(self, constructor):
+        constructor = constructor or {}
+        return self._entity('constructors', constructor.get('constructorId'),
+                            constructor_id=constructor.get('constructorId'),
+                            name=constructor.get('name'),
+                            nationality=constructor.get('nationality'))
+
+    def race(self, race):
+        circuit = race.get('Circuit') or {}
+        location = circuit.get('Location') or {}
+        return self._entity('races', (int(race['season']), int(race['round'])),
+                            season=race['season'],
+                            round=race['round'],
+                            race_name=race.get('raceName'),
+                            circuit_id=circuit.get('circuitId'),
+                            circuit_name=circuit.get('circuitName'),
+                            locality=location.get('locality'),
+                            country=location.get('country'),
+                            date=race.get('date'),
+                            time=race.get('time'))
+
+    def write(self, path, seasons):
+        """Write every column and the manifest to a sibling directory, then swap it into place"""
+        import numpy as np
+        staging = f"{path.rstrip(os.sep)}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        encoded = [text.encode('utf-8') for text in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(text) for text in encoded])
+        np.save(os.path.join(staging, 'strings.npy'), np.frombuffer(b''.join(encoded) or b'\0', dtype=np.uint8))
+        np.save(os.path.join(staging, 'string_offsets.npy'), offsets)
+        for table, columns in SCHEMA.items():
+            for column, kind in columns.items():
+                dtype = 'i4' if kind == STRING else kind
+                np.save(os.path.join(staging, f"{table}.{column}.npy"),
+                        np.asarray(self.rows[table][column], dtype=dtype))
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'created_at': datetime.utcnow().isoformat(),
+            'seasons': sorted(seasons),
+            'rows': {table: len(next(iter(columns.values()))) for table, columns in self.rows.items()},
+            'strings': len(encoded),
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(staging, path)
+        return manifest
+
+
+def export_snapshot(path, seasons, include_laps=True):
+    """Pack whole seasons into a snapshot directory and return its manifest.
+
+    Data comes through the f1_data fetchers, so rounds already ingested or
+    cached are not fetched from Ergast again. Rounds without results (not
+    yet raced) are kept in the schedule only.
+    """
+    from f1_data import (
+        get_season_schedule, get_race_results, get_qualifying_results,
+        get_driver_standings, get_constructor_standings, iter_lap_timings,
+    )
+    builder = _Builder()
+    exported = []
+    for season in sorted(set(seasons)):
+        schedule = get_season_schedule(season)
+        if not schedule:
+            logging.warning(f"No schedule for {season}, skipping it")
+            continue
+        exported.append(season)
+        races = [(int(race['round']), builder.race(race)) for race in schedule]
+
+        for round_number, race_row in races:
+            results = get_race_results(season, round_number)
+            if not results or not results.get('Results'):
+                continue
+            for result in results['Results']:
+                builder.add('results',
+                            race=race_row,
+                            driver=builder.driver(result['Driver']),
+                            constructor=builder.constructor(result.get('Constructor')),
+                            number=result.get('number'),
+                            grid=result.get('grid'),
+                            position=result.get('position'),
+                            position_text=result.get('positionText'),
+                            points=result.get('points'),
+                            laps=result.get('laps'),
+                            status=result.get('status'),
+                            time_millis=(result.get('Time') or {}).get('millis'),
+                            time=(result.get('Time') or {}).get('time'))
+
+            qualifying = get_qualifying_results(season, round_number)
+            for entry in (qualifying or {}).get('QualifyingResults', []):
+                builder.add('qualifying',
+                            race=race_row,
+                            driver=builder.driver(entry['Driver']),
+                            constructor=builder.constructor(entry.get('Constructor')),
+                            number=entry.get('number'),
+                            position=entry.get('position'),
+                            q1=entry.get('Q1'),
+                            q2=entry.get('Q2'),
+                            q3=entry.get('Q3'))
+
+            for entry in get_driver_standings(season, round_number):
+                constructors = entry.get('Constructors') or [None]
+                builder.add('driver_standings',
+                            season=season,
+                            round=round_number,
+                            driver=builder.driver(entry['Driver']),
+                            constructor=builder.constructor(constructors[-1]),
+                            position=entry.get('position'),
+                            position_text=entry.get('positionText'),
+                            points=entry.get('points'),
+                            wins=entry.get('wins'))
+            for entry in get_constructor_standings(season, round_number):
+                builder.add('constructor_standings',
+                            season=season,
+                            round=round_number,
+                            constructor=builder.constructor(entry.get('Constructor')),
+                            position=entry.get('position'),
+                            position_text=entry.get('positionText'),
+                            points=entry.get('points'),
+                            wins=entry.get('wins'))
+
+            if include_laps:
+                for driver_id, lap, position, milliseconds in iter_lap_timings(season, round_number):
+                    builder.add('laps',
+                                race=race_row,
+                                driver=builder.driver({'driverId': driver_id}),
+                                lap=lap,
+                                position=position if position is not None else NULL,
+                                milliseconds=milliseconds if milliseconds is not None else NULL)
+
+    return builder.write(path, exported)
+
+
+def _map(path):
+    import numpy as np
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Zero-length arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot directory that answers Ergast URLs"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format')} in {path}")
+        self.path = path
+        self.tables = {
+            table: {column: _map(os.path.join(path, f"{table}.{column}.npy")) for column in columns}
+            for table, columns in SCHEMA.items()
+        }
+        self._blob = _map(os.path.join(path, 'strings.npy'))
+        self._offsets = _map(os.path.join(path, 'string_offsets.npy'))
+        self._strings = {}
+        self._strings_lock = threading.Lock()
+
+        races = self.tables['races']
+        self._races = {(season, round_number): row for row, (season, round_number)
+                       in enumerate(zip(races['season'].tolist(), races['round'].tolist()))}
+        self._drivers = {self.text(code): row for row, code in enumerate(self.tables['drivers']['driver_id'].tolist())}
+
+    def text(self, code):
+        code = int(code)
+        if code == NULL:
+            return None
+        with self._strings_lock:
+            value = self._strings.get(code)
+        if value is None:
+            start, end = self._offsets[code], self._offsets[code + 1]
+            value = self._blob[start:end].tobytes().decode('utf-8')
+            with self._strings_lock:
+                self._strings[code] = value
+        return value
+
+    def _rows(self, table, start, end):
+        """Copy rows [start, end) of a table out of the mapping as lists, decoding strings"""
+        rows = {}
+        for column, kind in SCHEMA[table].items():
+            values = self.tables[table][column][start:end].tolist()
+            rows[column] = [self.text(value) for value in values] if kind == STRING else values
+        return [dict(zip(rows, values)) for values in zip(*rows.values())]
+
+    def _bounds(self, column, value, start=0, end=None):
+        import numpy as np
+        column = column[start:end]
+        return (start + int(np.searchsorted(column, value, 'left')),
+                start + int(np.searchsorted(column, value, 'right')))
+
+    def _race(self, row):
+        race = self._rows('races', row, row + 1)[0]
+        return _compact({
+            'season': str(race['season']),
+            'round': str(race['round']),
+            'raceName': race['race_name'],
+            'Circuit': {
+                'circuitId': race['circuit_id'],
+                'circuitName': race['circuit_name'],
+                'Location': _compact({'locality': race['locality'], 'country': race['country']}),
+            },
+            'date': race['date'],
+            'time': race['time'],
+        })
+
+    def _driver(self, row):
+        if row == NULL:
+            return None
+        driver = self._rows('drivers', row, row + 1)[0]
+        return _compact({
+            'driverId': driver['driver_id'],
+            'permanentNumber': driver['number'],
+            'code': driver['code'],
+            'givenName': driver['given_name'],
+            'familyName': driver['family_name'],
+            'dateOfBirth': driver['date_of_birth'],
+            'nationality': driver['nationality'],
+        })
+
+    def _constructor(self, row):
+        if row == NULL:
+            return None
+        constructor = self._rows('constructors', row, row + 1)[0]
+        return _compact({
+            'constructorId': constructor['constructor_id'],
+            'name': constructor['name'],
+            'nationality': constructor['nationality'],
+        })
+
+    def _result(self, row):
+        result = {
+            'number': row['number'],
+            'position': _number(row['position']),
+            'positionText': row['position_text'],
+            'points': _points(row['points']),
+            'Driver': self._driver(row['driver']),
+            'Constructor': self._constructor(row['constructor']),
+            'grid': _number(row['grid']),
+            'laps': _number(row['laps']),
+            'status': row['status'],
+        }
+        if row['time_millis'] != NULL:
+            result['Time'] = _compact({'millis': str(row['time_millis']), 'time': row['time']})
+        return _compact(result)
+
+    def _race_table(self, races, total, limit=ERGAST_DEFAULT_LIMIT, offset=0, **table):
+        return {'MRData': {'limit': str(limit), 'offset': str(offset), 'total': str(total),
+                           'RaceTable': dict(table, Races=races)}}
+
+    def schedule(self, season):
+        if season not in self.manifest['seasons']:
+            return None
+        start, end = self._bounds(self.tables['races']['season'], season)
+        races = [self._race(row) for row in range(start, end)]
+        return self._race_table(races, len(races), season=str(season))
+
+    def results(self, race_row):
+        start, end = self._bounds(self.tables['results']['race'], race_row)
+        if start == end:
+            return None
+        race = dict(self._race(race_row), Results=[self._result(row) for row in self._rows('results', start, end)])
+        return self._race_table([race], end - start)
+
+    def qualifying(self, race_row):
+        start, end = self._bounds(self.tables['qualifying']['race'], race_row)
+        if start == end:
+            return None
+        entries = [_compact({
+            'number': row['number'],
+            'position': _number(row['position']),
+            'Driver': self._driver(row['driver']),
+            'Constructor': self._constructor(row['constructor']),
+            'Q1': row['q1'],
+            'Q2': row['q2'],
+            'Q3': row['q3'],
+        }) for row in self._rows('qualifying', start, end)]
+        return self._race_table([dict(self._race(race_row), QualifyingResults=entries)], end - start)
+
+    def standings(self, kind, season, round_number=None):
+        """Standings after a round, or after the latest exported round of the season"""
+        table = {'driverStandings': 'driver_standings', 'constructorStandings': 'constructor_standings'}[kind]
+        columns = self.tables[table]
+        season_start, season_end = self._bounds(columns['season'], season)
+        if season_start == season_end:
+            return None
+        if round_number is None:
+            round_number = int(columns['round'][season_end - 1])
+        start, end = self._bounds(columns['round'], round_number, season_start, season_end)
+        if start == end:
+            return None
+
+        entries = []
+        for row in self._rows(table, start, end):
+            entry = {
+                'position': _number(row['position']),
+                'positionText': row['position_text'],
+                'points': _points(row['points']),
+                'wins': _number(row['wins']),
+            }
+            if table == 'driver_standings':
+                entry['Driver'] = self._driver(row['driver'])
+                entry['Constructors'] = [self._constructor(row['constructor'])] if row['constructor'] != NULL else []
+            else:
+                entry['Constructor'] = self._constructor(row['constructor'])
+            entries.append(_compact(entry))
+        key = 'DriverStandings' if table == 'driver_standings' else 'ConstructorStandings'
+        standings_list = {'season': str(season), 'round': str(round_number), key: entries}
+        return {'MRData': {'total': str(len(entries)), 'StandingsTable': {
+            'season': str(season), 'round': str(round_number), 'StandingsLists': [standings_list]}}}
+
+    def laps(self, race_row, lap_number=None, limit=ERGAST_DEFAULT_LIMIT, offset=0):
+        """Lap timings paginated by timing like Ergast, grouped into laps"""
+        from f1_data import format_lap_time
+        start, end = self._bounds(self.tables['laps']['race'], race_row)
+        if start == end:
+            return None
+        if lap_number is not None:
+            start, end = self._bounds(self.tables['laps']['lap'], lap_number, start, end)
+        total = end - start
+        laps = {}
+        drivers = self.tables['drivers']['driver_id']
+        for row in self._rows('laps', start + min(offset, total), start + min(offset + limit, total)):
+            laps.setdefault(row['lap'], []).append(_compact({
+                'driverId': self.text(drivers[row['driver']]),
+                'position': _number(row['position']),
+                'time': format_lap_time(row['milliseconds'] if row['milliseconds'] != NULL else None),
+            }))
+        race = dict(self._race(race_row), Laps=[{'number': str(number), 'Timings': timings}
+                                                for number, timings in laps.items()])
+        return self._race_table([race], total, limit, offset)
+
+    def driver_results(self, driver_id, limit=ERGAST_DEFAULT_LIMIT, offset=0):
+        """Every exported result of one driver, one race per entry, paginated by result"""
+        driver = self._drivers.get(driver_id)
+        if driver is None:
+            return None
+        import numpy as np
+        rows = np.flatnonzero(np.asarray(self.tables['results']['driver']) == driver)
+        races = []
+        for row in rows[offset:offset + limit].tolist():
+            result = self._rows('results', row, row + 1)[0]
+            races.append(dict(self._race(result['race']), Results=[self._result(result)]))
+        return self._race_table(races, len(rows), limit, offset, driverId=driver_id)
+
+    def payload(self, url):
+        """Ergast-shaped JSON for an Ergast URL, or None when the snapshot cannot answer it"""
+        parsed = urlparse(url)
+        path = parsed.path.split('/f1/', 1)[1] if '/f1/' in parsed.path else parsed.path
+        segments = [segment for segment in path.strip('/').split('/') if segment]
+        if not segments:
+            return None
+        segments[-1] = segments[-1].rsplit('.json', 1)[0]
+        query = parse_qs(parsed.query)
+        limit = int(query.get('limit', [ERGAST_DEFAULT_LIMIT])[0])
+        offset = int(query.get('offset', [0])[0])
+
+        if segments[0] == 'drivers' and len(segments) == 3 and segments[2] == 'results':
+            return self.driver_results(segments[1], limit, offset)
+        if not segments[0].isdigit():
+            return None
+        season = int(segments[0])
+        if len(segments) == 1:
+            return self.schedule(season)
+        if len(segments) == 2 and segments[1] in ('driverStandings', 'constructorStandings'):
+            return self.standings(segments[1], season)
+        if len(segments) < 3 or not segments[1].isdigit():
+            return None
+
+        round_number, kind = int(segments[1]), segments[2]
+        if kind in ('driverStandings', 'constructorStandings'):
+            return self.standings(kind, season, round_number)
+        race_row = self._races.get((season, round_number))
+        if race_row is None:
+            return None
+        if kind == 'results':
+            return self.results(race_row)
+        if kind == 'qualifying':
+            return self.qualifying(race_row)
+        if kind == 'laps':
+            lap_number = int(segments[3]) if len(segments) > 3 and segments[3].isdigit() else None
+            return self.laps(race_row, lap_number, limit, offset)
+        return None
+
+
+_active = None
+_mode = SNAPSHOT_MODE
+
+
+def load_snapshot(path=None, mode=None):
+    """Map a snapshot and make the Ergast cache serve from it; returns the Snapshot"""
+    global _active, _mode
+    mode = mode or SNAPSHOT_MODE
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"F1_SNAPSHOT_MODE must be one of {', '.join(SNAPSHOT_MODES)}")
+    snapshot = Snapshot(path or SNAPSHOT_PATH)
+    _active, _mode = snapshot, mode
+    logging.info(f"Loaded Ergast snapshot {snapshot.path} ({mode}) with seasons {snapshot.manifest['seasons']}")
+    return snapshot
+
+
+def load_configured_snapshot():
+    """Map the snapshot named by F1_SNAPSHOT_PATH, if any; logs instead of raising"""
+    if not SNAPSHOT_PATH:
+        return None
+    try:
+        return load_snapshot()
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Failed to load Ergast snapshot {SNAPSHOT_PATH}: {e}")
+        return None
+
+
+def offline():
+    """True when a snapshot is loaded in offline mode and Ergast must not be called"""
+    return _active is not None and _mode == 'offline'
+
+
+def snapshot_payload(url):
+    snapshot = _active
+    if snapshot is None:
+        return None
+    try:
+        return snapshot.payload(url)
+    except Exception as e:
+        logging.error(f"Error reading snapshot for {url}: {e}")
+        return None
+
+
+def snapshot_status():
+    snapshot = _active
+    if snapshot is None:
+        return None
+    return {
+        'path': snapshot.path,
+        'mode': _mode,
+        'seasons': snapshot.manifest['seasons'],
+        'created_at': snapshot.manifest.get('created_at'),
+        'rows': snapshot.manifest.get('rows'),
+    }
@@ -182,7 +182,6 @@ function createFeedbackElement(input) {
 // Dashboard data loading
 function loadDashboardData() {
     if (document.querySelector('.analytics-dashboard')) {
-        loadTelemetryData();
         loadRaceData();
         startDataRefresh();
     }
@@ -326,10 +325,77 @@ function updateRaceDisplay(raceData) {
     }
 }
 
+// Telemetry stream: one EventSource per page, shared by every subscriber
+const telemetryListeners = [];
+let telemetrySource = null;
+let telemetryFrame = null;
+let telemetryPollTimer = null;
+
+function mergeTelemetryDelta(target, delta) {
+    Object.keys(delta).forEach(key => {
+        const value = delta[key];
+        if (value && typeof value === 'object' && !Array.isArray(value) &&
+            target[key] && typeof target[key] === 'object') {
+            mergeTelemetryDelta(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    });
+    return target;
+}
+
+function notifyTelemetry(frame) {
+    telemetryFrame = frame;
+    telemetryListeners.forEach(listener => listener(frame));
+}
+
+// Fallback for browsers or proxies that cannot hold an event stream open
+function startTelemetryPolling() {
+    if (telemetryPollTimer) return;
+    
+    const poll = () => fetch('/api/telemetry-data')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.error) notifyTelemetry(data);
+        })
+        .catch(error => console.error('Error polling telemetry:', error));
+    
+    poll();
+    telemetryPollTimer = setInterval(poll, 2000);
+}
+
+function subscribeTelemetry(listener) {
+    telemetryListeners.push(listener);
+    if (telemetryFrame) listener(telemetryFrame);
+    if (telemetrySource || telemetryPollTimer) return;
+    
+    if (!window.EventSource) {
+        startTelemetryPolling();
+        return;
+    }
+    
+    telemetrySource = new EventSource('/api/telemetry-stream');
+    telemetrySource.addEventListener('keyframe', event => {
+        notifyTelemetry(JSON.parse(event.data));
+    });
+    telemetrySource.addEventListener('delta', event => {
+        if (telemetryFrame) {
+            notifyTelemetry(mergeTelemetryDelta(telemetryFrame, JSON.parse(event.data)));
+        }
+    });
+    telemetrySource.onerror = () => {
+        // EventSource reconnects on its own; only a refused stream falls back to polling
+        if (telemetrySource.readyState === EventSource.CLOSED) {
+            telemetrySource = null;
+            startTelemetryPolling();
+        }
+    };
+}
+
 // Start automatic data refresh
 function startDataRefresh() {
-    // Refresh telemetry data every 2 seconds
-    setInterval(loadTelemetryData, 2000);
+    // Telemetry is pushed by the server as it changes
+    subscribeTelemetry(updateTelemetryGauges);
     
     // Refresh race data every 30 seconds
     setInterval(loadRaceData, 30000);
@@ -395,6 +461,7 @@ window.F1Analytics = {
     updateGauge,
     updateGearIndicator,
     loadTelemetryData,
+    subscribeTelemetry,
     loadRaceData,
     validateApiKey
 };
@@ -0,0 +1,193 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+import telemetry_engine
+from f1_data import generate_sample_telemetry
+from sse import format_event
+
+# Seconds between frames published to stream subscribers
+TELEMETRY_INTERVAL = float(os.environ.get("TELEMETRY_INTERVAL", "1.0"))
+# A full frame is sent every this many frames so clients can resynchronize
+KEYFRAME_EVERY = int(os.environ.get("TELEMETRY_KEYFRAME_EVERY", "30"))
+# Frames buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 4
+# The producer stops after this long without subscribers
+PRODUCER_IDLE_SECONDS = 30
+# A client's stream is closed after this long; EventSource reconnects and resumes with a keyframe
+STREAM_MAX_SECONDS = float(os.environ.get("TELEMETRY_STREAM_MAX_SECONDS", "300"))
+# Milliseconds the browser waits before reconnecting a closed stream
+STREAM_RETRY_MS = 1000
+
+
+def sample_frame(car=0):
+    """Build one telemetry frame of a car in the shape served by /api/telemetry-data"""
+    sample = generate_sample_telemetry(car)
+    return {
+        'timestamp': sample['timestamp'],
+        'engine_rpm': {
+            'current': sample['rpm'],
+            'min': 0,
+            'max': telemetry_engine.MAX_RPM,
+            'unit': 'RPM'
+        },
+        'gear': {
+            'current': sample['gear'],
+            'min': 0,
+            'max': 8
+        },
+        'speed': {
+            'current': round(sample['speed'], 1),
+            'min': 0,
+            'max': 350,
+            'unit': 'km/h'
+        },
+        'throttle': sample['throttle'],
+        'brake': sample['brake'],
+        'drs_open': sample['drs_open'],
+        'tire_temp': {corner: round(temp, 1) for corner, temp in sample['tire_temp'].items()},
+        'track_data': {
+            'lap': int(telemetry_engine.engine.laps()[car]),
+            'sector_times': [round(float(t), 3) for t in telemetry_engine.engine.sector_times()[car]],
+            'position_data': telemetry_engine.track_trail(car)
+        }
+    }
+
+
+def frame_delta(previous, current):
+    """Return the keys of current whose values differ from previous, recursing into dicts"""
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = frame_delta(old, value)
+            if nested:
+                delta[key] = nested
+        elif value != old:
+            delta[key] = value
+    return delta
+
+
+class TelemetryBroadcaster:
+    """Fan out telemetry frames from one shared producer thread to many subscribers.
+
+    Each subscriber has a small bounded queue; when a slow consumer falls
+    behind, its oldest frames are dropped rather than blocking the producer.
+    Frames carry a sequence number so a consumer that missed one can fall
+    back to a full frame instead of applying a delta to stale state.
+    """
+
+    def __init__(self, source=sample_frame, interval=TELEMETRY_INTERVAL):
+        self._source = source
+        self._interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._seq = 0
+        self._latest = None
+        self._dropped = 0
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._latest is not None:
+                # Start new clients from the current frame rather than waiting for the next tick
+                subscriber.put_nowait((*self._latest, None))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='f1-telemetry', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def latest(self):
+        """Return the most recent (seq, frame), producing one if the producer is idle"""
+        with self._lock:
+            if self._latest is not None and self._thread is not None and self._thread.is_alive():
+                return self._latest
+        return 0, self._source()
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'seq': self._seq, 'dropped_frames': self._dropped}
+
+    def _publish(self, seq, frame, delta):
+        with self._lock:
+            self._latest = (seq, frame)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((seq, frame, delta))
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                with self._lock:
+                    self._dropped += 1
+                try:
+                    subscriber.put_nowait((seq, frame, delta))
+                except queue.Full:
+                    pass
+
+    def _run(self):
+        previous = None
+        idle_since = None
+        while True:
+            with self._lock:
+                if self._subscribers:
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > PRODUCER_IDLE_SECONDS:
+                    self._thread = None
+                    self._latest = None
+                    return
+                self._seq += 1
+                seq = self._seq
+
+            try:
+                frame = self._source()
+                delta = frame_delta(previous, frame) if previous is not None else None
+                self._publish(seq, frame, delta)
+                previous = frame
+            except Exception as e:
+                logging.error(f"Error producing telemetry frame: {e}")
+            time.sleep(self._interval)
+
+
+broadcaster = TelemetryBroadcaster()
+
+
+def telemetry_events(keepalive=15, max_seconds=None):
+    """Yield SSE events for one client: a keyframe, then deltas.
+
+    A full 'keyframe' event is sent first, every KEYFRAME_EVERY frames, and
+    whenever frames were dropped for this client; otherwise only the changed
+    fields are sent as a 'delta' event. The stream ends after max_seconds
+    (STREAM_MAX_SECONDS by default) so no connection holds a server thread
+    indefinitely; the browser reconnects after STREAM_RETRY_MS.
+    """
+    deadline = time.monotonic() + (max_seconds if max_seconds is not None else STREAM_MAX_SECONDS)
+    subscriber = broadcaster.subscribe()
+    last_seq = None
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            try:
+                seq, frame, delta = subscriber.get(timeout=max(0.0, min(keepalive, deadline - time.monotonic())))
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if last_seq is None or delta is None or seq != last_seq + 1 or seq % KEYFRAME_EVERY == 0:
+                yield format_event('keyframe', dict(frame, seq=seq))
+            elif delta:
+                yield format_event('delta', dict(delta, seq=seq))
+            last_seq = seq
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,283 @@
+import os
+import math
+import time
+import threading
+from datetime import datetime
+
+import numpy as np
+
+TELEMETRY_CARS = int(os.environ.get("TELEMETRY_CARS", "20"))
+TELEMETRY_HZ = int(os.environ.get("TELEMETRY_HZ", "50"))
+# Seconds of history kept in the ring buffer
+TELEMETRY_HISTORY_SECONDS = int(os.environ.get("TELEMETRY_HISTORY_SECONDS", "120"))
+
+LAP_LENGTH = 5000.0  # metres
+SECTORS = 3
+MIN_SPEED, MAX_SPEED = 80.0, 330.0  # km/h
+GEAR_TOP_SPEEDS = np.array([90, 130, 165, 200, 235, 265, 295, 350], dtype=np.float32)
+GEAR_MIN_SPEEDS = np.concatenate(([0], GEAR_TOP_SPEEDS[:-1] * 0.8)).astype(np.float32)
+IDLE_RPM, MAX_RPM = 4000, 15000
+TRACK_WIDTH, TRACK_HEIGHT = 600, 400
+
+# One sample of one car; 24 bytes per record
+TELEMETRY_DTYPE = np.dtype([
+    ('distance', np.float32),   # metres into the current lap
+    ('speed', np.float16),      # km/h
+    ('rpm', np.uint16),
+    ('gear', np.uint8),
+    ('throttle', np.uint8),     # percent
+    ('brake', np.uint8),        # percent
+    ('drs', np.bool_),
+    ('tyre_temp', np.float16, (4,)),  # FL, FR, RL, RR in °C
+    ('g_lat', np.float16),
+    ('g_lon', np.float16),
+])
+CHANNELS = TELEMETRY_DTYPE.names
+TYRE_CORNERS = ('front_left', 'front_right', 'rear_left', 'rear_right')
+# Channels that are sampled rather than averaged when downsampling
+DISCRETE_CHANNELS = ('gear', 'drs', 'distance')
+
+
+def speed_profile(distance):
+    """Target speed (km/h) at a lap distance: straights near MAX_SPEED, corners near MIN_SPEED"""
+    phase = 2 * np.pi * distance / LAP_LENGTH
+    shape = 0.55 + 0.3 * np.sin(3 * phase) + 0.15 * np.sin(7 * phase + 1.3)
+    return MIN_SPEED + (MAX_SPEED - MIN_SPEED) * np.clip(shape, 0.0, 1.0)
+
+
+def track_position(distance):
+    """Map lap distance to x, y on the dashboard's 600x400 track canvas"""
+    phase = 2 * np.pi * np.asarray(distance) / LAP_LENGTH
+    x = TRACK_WIDTH / 2 + 240 * np.cos(phase) + 30 * np.cos(3 * phase)
+    y = TRACK_HEIGHT / 2 + 150 * np.sin(phase) + 20 * np.sin(2 * phase)
+    return x, y
+
+
+class TelemetryEngine:
+    """Simulate whole-grid telemetry at a fixed rate into a ring buffer.
+
+    Samples are generated lazily: each read advances the simulation to the
+    current wall-clock time in one vectorized block, so no thread is needed
+    and an idle engine costs nothing. Records are stored as a
+    (capacity, cars) structured array plus a float64 timestamp column.
+    """
+
+    def __init__(self, cars=TELEMETRY_CARS, hz=TELEMETRY_HZ, history_seconds=TELEMETRY_HISTORY_SECONDS, seed=None):
+        self.cars = cars
+        self.hz = hz
+        self.dt = 1.0 / hz
+        self.capacity = hz * history_seconds
+        self._records = np.zeros((self.capacity, cars), dtype=TELEMETRY_DTYPE)
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+
+        # Per-car simulation state
+        self._pace = self._rng.uniform(0.96, 1.0, cars).astype(np.float32)
+        self._distance = np.linspace(0, LAP_LENGTH, cars, endpoint=False, dtype=np.float64)[::-1].copy()
+        self._laps = np.ones(cars, dtype=np.int32)
+        self._speed = speed_profile(self._distance).astype(np.float32) * self._pace
+        self._tyre_temp = np.full((cars, 4), 90.0, dtype=np.float32)
+        self._sector_start = np.zeros(cars, dtype=np.float64)
+        self._sector_times = np.zeros((cars, SECTORS), dtype=np.float32)
+        self._clock = None
+
+    def _simulate(self, steps, start_time):
+        """Generate `steps` samples for every car, returning (times, records)"""
+        times = start_time + self.dt * np.arange(1, steps + 1)
+        distance = np.empty((steps, self.cars), dtype=np.float64)
+        speed = np.empty((steps, self.cars), dtype=np.float32)
+
+        # Integrate position step by step (vectorized across cars)
+        d, v = self._distance, self._speed
+        start_speed = v
+        sector_length = LAP_LENGTH / SECTORS
+        for step in range(steps):
+            target = speed_profile(d) * self._pace
+            # Cars accelerate more slowly than they brake
+            rate = np.where(target > v, 0.08, 0.25)
+            v = np.maximum(v + (target - v) * rate + self._rng.normal(0, 0.6, self.cars), 0)
+            previous_sector = (d // sector_length).astype(np.int8)
+            d = d + v / 3.6 * self.dt
+            wrapped = d >= LAP_LENGTH
+            d = np.where(wrapped, d - LAP_LENGTH, d)
+            self._laps += wrapped
+            crossed = (d // sector_length).astype(np.int8) != previous_sector
+            if crossed.any():
+                now = times[step]
+                self._sector_times[crossed, previous_sector[crossed]] = now - self._sector_start[crossed]
+                self._sector_start[crossed] = now
+            distance[step], speed[step] = d, v
+        self._distance, self._speed = d, v.astype(np.float32)
+
+        # Derive every other channel for the whole block at once
+        accel = np.diff(speed, axis=0, prepend=start_speed[None, :]) / 3.6 / self.dt  # m/s^2
+        throttle = np.clip(60 + accel * 12, 0, 100)
+        brake = np.clip(-accel * 4, 0, 100)
+        throttle[brake > 5] = 0
+        gear = np.searchsorted(GEAR_TOP_SPEEDS, speed).clip(0, 7)
+        gear_low, gear_high = GEAR_MIN_SPEEDS[gear], GEAR_TOP_SPEEDS[gear]
+        rpm = IDLE_RPM + (MAX_RPM - IDLE_RPM) * np.clip((speed - gear_low) / (gear_high - gear_low), 0, 1)
+        g_lon = accel / 9.81
+        # Lateral load peaks in medium-speed corners
+        cornering = 1 - (speed - MIN_SPEED) / (MAX_SPEED - MIN_SPEED)
+        g_lat = np.clip(cornering, 0, 1) * 5.0 * np.sin(2 * np.pi * distance / LAP_LENGTH * 5)
+
+        # Tyres relax toward a load-dependent temperature
+        load = 85 + 6 * np.abs(g_lat) + 0.15 * brake
+        tyre_temp = np.empty((steps, self.cars, 4), dtype=np.float32)
+        temp = self._tyre_temp
+        alpha = 0.02
+        for step in range(steps):
+            temp = temp + alpha * (load[step, :, None] - temp)
+            tyre_temp[step] = temp
+        self._tyre_temp = temp
+
+        records = np.empty((steps, self.cars), dtype=TELEMETRY_DTYPE)
+        records['distance'] = distance
+        records['speed'] = speed
+        records['rpm'] = rpm
+        records['gear'] = gear + 1
+        records['throttle'] = throttle
+        records['brake'] = brake
+        records['drs'] = (speed > 280) & (throttle > 95)
+        records['tyre_temp'] = tyre_temp + self._rng.normal(0, 0.3, tyre_temp.shape)
+        records['g_lat'] = g_lat
+        records['g_lon'] = g_lon
+        return times, records
+
+    def _write(self, times, records):
+        steps = len(times)
+        if steps >= self.capacity:
+            times, records = times[-self.capacity:], records[-self.capacity:]
+            steps = self.capacity
+        first = min(steps, self.capacity - self._head)
+        self._times[self._head:self._head + first] = times[:first]
+        self._records[self._head:self._head + first] = records[:first]
+        if first < steps:
+            self._times[:steps - first] = times[first:]
+            self._records[:steps - first] = records[first:]
+        self._head = (self._head + steps) % self.capacity
+        self._count = min(self._count + steps, self.capacity)
+
+    def advance(self, now=None):
+        """Bring the buffer up to the given (or current) time"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._clock is None:
+                # Start with a second of history so the first read has data
+                self._clock = now - 1.0
+                self._sector_start[:] = self._clock
+            steps = int((now - self._clock) * self.hz + 1e-6)
+            if steps <= 0:
+                return
+            # After a long idle period only the most recent history is simulated
+            skipped = max(0, steps - self.capacity)
+            times, records = self._simulate(steps - skipped, self._clock + skipped * self.dt)
+            self._write(times, records)
+            self._clock = times[-1]
+
+    def _ordered(self, samples):
+        """Return the newest `samples` (times, records) in chronological order"""
+        samples = min(samples, self._count)
+        index = (self._head - samples + np.arange(samples)) % self.capacity
+        return self._times[index], self._records[index]
+
+    def latest(self):
+        """Return (timestamp, records) of the newest sample for every car"""
+        self.advance()
+        with self._lock:
+            newest = (self._head - 1) % self.capacity
+            return float(self._times[newest]), self._records[newest].copy()
+
+    def window(self, seconds=10.0, car=None, channels=None, max_points=None):
+        """Return the last `seconds` of samples as (times, {channel: array}).
+
+        Arrays have shape (samples, cars), or (samples,) when a car is given.
+        With max_points the window is downsampled by averaging fixed-size
+        buckets (discrete channels take the last value of each bucket).
+        """
+        self.advance()
+        with self._lock:
+            times, records = self._ordered(int(seconds * self.hz))
+        if car is not None:
+            records = records[:, car]
+        channels = [channel for channel in (channels or CHANNELS) if channel in CHANNELS]
+
+        stride = max(1, math.ceil(len(times) / max_points)) if max_points else 1
+        if stride == 1:
+            return times, {channel: records[channel] for channel in channels}
+
+        usable = len(times) // stride * stride
+        start = len(times) - usable
+        times = times[start + stride - 1::stride]
+        columns = {}
+        for channel in channels:
+            values = records[channel][start:]
+            if channel in DISCRETE_CHANNELS:
+                columns[channel] = values[stride - 1::stride]
+            else:
+                bucketed = values.reshape(usable // stride, stride, *values.shape[1:])
+                columns[channel] = bucketed.astype(np.float32).mean(axis=1)
+        return times, columns
+
+    def laps(self):
+        with self._lock:
+            return self._laps.copy()
+
+    def sector_times(self):
+        with self._lock:
+            return self._sector_times.copy()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cars': self.cars,
+                'hz': self.hz,
+                'capacity': self.capacity,
+                'samples': self._count,
+                'record_bytes': TELEMETRY_DTYPE.itemsize,
+                'buffer_bytes': self._records.nbytes + self._times.nbytes,
+            }
+
+
+engine = TelemetryEngine()
+
+
+def window_to_columns(times, columns, precision=2):
+    """Convert a window to JSON-ready column lists"""
+    result = {'t': np.round(times, 3).tolist()}
+    for channel, values in columns.items():
+        if values.dtype.kind == 'f':
+            values = np.round(values.astype(np.float64), precision)
+        result[channel] = values.tolist()
+    return result
+
+
+def car_sample(car=0):
+    """Return the newest sample of one car in the shape of generate_sample_telemetry"""
+    timestamp, records = engine.latest()
+    record = records[car]
+    return {
+        'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+        'speed': float(record['speed']),
+        'rpm': int(record['rpm']),
+        'gear': int(record['gear']),
+        'throttle': int(record['throttle']),
+        'brake': int(record['brake']),
+        'drs_open': bool(record['drs']),
+        'tire_temp': {corner: float(temp) for corner, temp in zip(TYRE_CORNERS, record['tyre_temp'])},
+        'g_force': {
+            'lateral': float(record['g_lat']),
+            'longitudinal': float(record['g_lon']),
+        },
+    }
+
+
+def track_trail(car=0, seconds=5.0, points=5):
+    """Recent x, y positions of a car on the track canvas, oldest first"""
+    times, columns = engine.window(seconds, car=car, channels=['distance'], max_points=points)
+    x, y = track_position(columns['distance'])
+    return [{'x': round(float(px), 1), 'y': round(float(py), 1)} for px, py in zip(x, y)]